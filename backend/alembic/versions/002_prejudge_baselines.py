@@ -0,0 +1,42 @@
+"""Pre-judge baselines and run stats
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('test_case_baselines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('test_case_id', sa.Integer(), nullable=False),
+        sa.Column('output', sa.Text(), nullable=False),
+        sa.Column('output_hash', sa.String(), nullable=False),
+        sa.Column('normalized_hash', sa.String(), nullable=False),
+        sa.Column('test_run_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ),
+        sa.ForeignKeyConstraint(['test_run_id'], ['test_runs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('test_case_id')
+    )
+    op.create_index(op.f('ix_test_case_baselines_id'), 'test_case_baselines', ['id'], unique=False)
+
+    op.add_column('test_runs', sa.Column('stats', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('test_runs', 'stats')
+    op.drop_index(op.f('ix_test_case_baselines_id'), table_name='test_case_baselines')
+    op.drop_table('test_case_baselines')
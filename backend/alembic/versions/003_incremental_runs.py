@@ -0,0 +1,44 @@
+"""Snapshots for incremental runs
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('test_case_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('test_case_id', sa.Integer(), nullable=False),
+        sa.Column('git_branch', sa.String(), nullable=False),
+        sa.Column('llm_model', sa.String(), nullable=False),
+        sa.Column('input_hash', sa.String(), nullable=False),
+        sa.Column('result_id', sa.Integer(), nullable=False),
+        sa.Column('test_run_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['test_case_id'], ['test_cases.id'], ),
+        sa.ForeignKeyConstraint(['test_run_id'], ['test_runs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('test_case_id', 'git_branch', 'llm_model', name='uq_test_case_snapshots_case_branch_model')
+    )
+    op.create_index(op.f('ix_test_case_snapshots_id'), 'test_case_snapshots', ['id'], unique=False)
+
+    op.add_column('test_results', sa.Column('input_hash', sa.String(), nullable=True))
+    op.add_column('test_results', sa.Column('carried_from_result_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('test_results', 'carried_from_result_id')
+    op.drop_column('test_results', 'input_hash')
+    op.drop_index(op.f('ix_test_case_snapshots_id'), table_name='test_case_snapshots')
+    op.drop_table('test_case_snapshots')
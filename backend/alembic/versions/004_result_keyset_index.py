@@ -0,0 +1,23 @@
+"""Index for paging results within a run
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_test_results_test_run_id_id', 'test_results', ['test_run_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_test_results_test_run_id_id', table_name='test_results')
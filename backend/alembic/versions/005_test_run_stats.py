@@ -0,0 +1,62 @@
+"""Materialized run summaries
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import os
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# Same setting as app.core.config; results without a severity count as failed
+PASS_SEVERITY_THRESHOLD = float(os.getenv("PASS_SEVERITY_THRESHOLD", "0.3"))
+
+# (dimension, value expression, join) used to backfill existing runs
+BACKFILL = [
+    ("'total'", "'all'", ""),
+    ("'severity_label'", "COALESCE(r.severity_label, 'unknown')", ""),
+    ("'change_type'", "COALESCE(r.change_type, 'unknown')", ""),
+    ("'category'", "COALESCE(c.category, 'unknown')", "JOIN test_cases c ON c.id = r.test_case_id"),
+]
+
+
+def upgrade() -> None:
+    op.create_table('test_run_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('test_run_id', sa.Integer(), nullable=False),
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.Column('result_count', sa.Integer(), nullable=False),
+        sa.Column('passed_count', sa.Integer(), nullable=False),
+        sa.Column('regression_count', sa.Integer(), nullable=False),
+        sa.Column('total_cost', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['test_run_id'], ['test_runs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('test_run_id', 'dimension', 'value', name='uq_test_run_stats_run_dimension_value')
+    )
+    op.create_index(op.f('ix_test_run_stats_id'), 'test_run_stats', ['id'], unique=False)
+
+    for dimension, value, join in BACKFILL:
+        op.execute(f"""
+            INSERT INTO test_run_stats
+                (test_run_id, dimension, value, result_count, passed_count, regression_count, total_cost)
+            SELECT r.test_run_id, {dimension}, {value}, COUNT(r.id),
+                   SUM(CASE WHEN r.severity_score < {PASS_SEVERITY_THRESHOLD} THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN r.is_regression THEN 1 ELSE 0 END),
+                   COALESCE(SUM(r.judge_cost), 0)
+            FROM test_results r {join}
+            GROUP BY r.test_run_id, {value}
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_test_run_stats_id'), table_name='test_run_stats')
+    op.drop_table('test_run_stats')
@@ -0,0 +1,105 @@
+"""Composite indexes and monthly partitions for test_results
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 00:00:00.000000
+
+On PostgreSQL, test_results becomes a table range-partitioned by month on
+created_at, with a default partition for anything outside the created ranges.
+The primary key becomes (id, created_at), since a partitioned table's keys must
+include the partition column; ids keep coming from the same sequence. Other
+databases only get the indexes.
+
+"""
+from alembic import op
+from datetime import datetime, timezone
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+# Existing indexes, recreated on the partitioned table
+EXISTING_INDEXES = [
+    ('ix_test_results_id', ['id']),
+    ('ix_test_results_diff_hash', ['diff_hash']),
+    ('ix_test_results_test_run_id_id', ['test_run_id', 'id']),
+]
+NEW_INDEXES = [
+    ('ix_test_results_test_case_id_created_at', ['test_case_id', 'created_at']),  # Per-case history
+    ('ix_test_results_test_case_id_test_run_id', ['test_case_id', 'test_run_id']),  # Latest result per case
+]
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_month_partition(month: datetime):
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS test_results_p{month:%Y%m} PARTITION OF test_results "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+    )
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, columns in NEW_INDEXES:
+            op.create_index(name, 'test_results', columns, unique=False)
+        return
+
+    op.execute("UPDATE test_results SET created_at = now() WHERE created_at IS NULL")
+    op.execute("ALTER TABLE test_results RENAME TO test_results_unpartitioned")
+    op.execute("""
+        CREATE TABLE test_results (LIKE test_results_unpartitioned INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER TABLE test_results ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE test_results ADD CONSTRAINT test_results_pkey_partitioned PRIMARY KEY (id, created_at)")
+    op.execute("ALTER TABLE test_results ADD FOREIGN KEY (test_run_id) REFERENCES test_runs (id)")
+    op.execute("ALTER TABLE test_results ADD FOREIGN KEY (test_case_id) REFERENCES test_cases (id)")
+    # Keep the id sequence when the old table is dropped
+    op.execute("ALTER SEQUENCE test_results_id_seq OWNED BY test_results.id")
+
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM test_results_unpartitioned")).scalar()
+    this_month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = oldest.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0) \
+        if oldest else this_month
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        _create_month_partition(month)
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE test_results_default PARTITION OF test_results DEFAULT")
+
+    op.execute("INSERT INTO test_results SELECT * FROM test_results_unpartitioned")
+    op.execute("DROP TABLE test_results_unpartitioned")
+
+    # Indexes on the parent are created on every partition, including future ones
+    for name, columns in EXISTING_INDEXES + NEW_INDEXES:
+        op.create_index(name, 'test_results', columns, unique=False)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, columns in NEW_INDEXES:
+            op.drop_index(name, table_name='test_results')
+        return
+
+    op.execute("ALTER TABLE test_results RENAME TO test_results_partitioned")
+    for name, columns in EXISTING_INDEXES + NEW_INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_partitioned")
+    op.execute("CREATE TABLE test_results (LIKE test_results_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE test_results ALTER COLUMN created_at DROP NOT NULL")
+    op.execute("ALTER TABLE test_results ADD PRIMARY KEY (id)")
+    op.execute("ALTER TABLE test_results ADD FOREIGN KEY (test_run_id) REFERENCES test_runs (id)")
+    op.execute("ALTER TABLE test_results ADD FOREIGN KEY (test_case_id) REFERENCES test_cases (id)")
+    op.execute("ALTER SEQUENCE test_results_id_seq OWNED BY test_results.id")
+    op.execute("INSERT INTO test_results SELECT * FROM test_results_partitioned")
+    op.execute("DROP TABLE test_results_partitioned CASCADE")
+
+    for name, columns in EXISTING_INDEXES:
+        op.create_index(name, 'test_results', columns, unique=False)
@@ -0,0 +1,23 @@
+"""Per-stage timings on test results
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('test_results', sa.Column('stage_timings', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('test_results', 'stage_timings')
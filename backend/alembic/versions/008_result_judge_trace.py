@@ -0,0 +1,23 @@
+"""Judge cascade trace on test results
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('test_results', sa.Column('judge_trace', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('test_results', 'judge_trace')
@@ -0,0 +1,159 @@
+"""Content-addressed blobs for result texts
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 00:00:00.000000
+
+Each distinct prompt, expected behavior and output moves to content_blobs, keyed
+by the sha256 of its UTF-8 text, and test_results keeps only the hashes. The
+backfill stores existing texts uncompressed (PostgreSQL still compresses large
+values on its own); new blobs are compressed as CONTENT_BLOB_COMPRESSION says.
+
+"""
+from alembic import op
+from datetime import datetime, timezone
+import hashlib
+import sqlalchemy as sa
+import zlib
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+TEXT_COLUMNS = ['input_prompt', 'expected_behavior', 'actual_output']
+BATCH_SIZE = 5000
+
+content_blobs = sa.table(
+    'content_blobs',
+    sa.column('hash', sa.String), sa.column('encoding', sa.String), sa.column('data', sa.LargeBinary),
+    sa.column('size', sa.Integer), sa.column('created_at', sa.DateTime(timezone=True))
+)
+
+
+def upgrade() -> None:
+    op.create_table('content_blobs',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('encoding', sa.String(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+    for name in TEXT_COLUMNS:
+        op.add_column('test_results', sa.Column(f'{name}_hash', sa.String(length=64), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        _backfill_postgresql()
+    else:
+        _backfill_batches()
+
+    with op.batch_alter_table('test_results') as batch_op:
+        batch_op.alter_column('input_prompt_hash', existing_type=sa.String(length=64), nullable=False)
+        for name in TEXT_COLUMNS:
+            batch_op.drop_column(name)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('test_results') as batch_op:
+        for name in TEXT_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.Text(), nullable=True))
+
+    # Blobs may be compressed, so texts are restored in batches here rather than in SQL
+    bind = op.get_bind()
+    cursor = 0
+    while True:
+        rows = bind.execute(sa.text(
+            f"SELECT id, {', '.join(f'{name}_hash' for name in TEXT_COLUMNS)} FROM test_results "
+            f"WHERE id > :cursor ORDER BY id LIMIT {BATCH_SIZE}"
+        ), {"cursor": cursor}).mappings().all()
+        if not rows:
+            break
+        hashes = list({row[f'{name}_hash'] for row in rows for name in TEXT_COLUMNS} - {None})
+        texts = {
+            blob.hash: _decode(blob.encoding, blob.data) for blob in bind.execute(
+                sa.select(content_blobs.c.hash, content_blobs.c.encoding, content_blobs.c.data)
+                .where(content_blobs.c.hash.in_(hashes))
+            )
+        }
+        bind.execute(sa.text(
+            f"UPDATE test_results SET {', '.join(f'{name} = :{name}' for name in TEXT_COLUMNS)} WHERE id = :row_id"
+        ), [
+            dict({name: texts.get(row[f'{name}_hash']) for name in TEXT_COLUMNS}, row_id=row['id'])
+            for row in rows
+        ])
+        cursor = rows[-1]['id']
+
+    with op.batch_alter_table('test_results') as batch_op:
+        batch_op.alter_column('input_prompt', existing_type=sa.Text(), nullable=False)
+        for name in TEXT_COLUMNS:
+            batch_op.drop_column(f'{name}_hash')
+    op.drop_table('content_blobs')
+
+
+def _backfill_postgresql():
+    op.execute(f"""
+        INSERT INTO content_blobs (hash, encoding, data, size)
+        SELECT encode(sha256(data), 'hex'), 'utf-8', data, octet_length(data)
+        FROM (
+            SELECT convert_to(text, 'UTF8') AS data FROM (
+                {' UNION '.join(f'SELECT {name} AS text FROM test_results' for name in TEXT_COLUMNS)}
+            ) texts
+            WHERE text IS NOT NULL
+        ) blobs
+        ON CONFLICT (hash) DO NOTHING
+    """)
+    op.execute(
+        "UPDATE test_results SET " + ", ".join(
+            f"{name}_hash = encode(sha256(convert_to({name}, 'UTF8')), 'hex')" for name in TEXT_COLUMNS
+        )
+    )
+
+
+def _backfill_batches():
+    bind = op.get_bind()
+    cursor = 0
+    while True:
+        rows = bind.execute(sa.text(
+            f"SELECT id, {', '.join(TEXT_COLUMNS)} FROM test_results "
+            f"WHERE id > :cursor ORDER BY id LIMIT {BATCH_SIZE}"
+        ), {"cursor": cursor}).mappings().all()
+        if not rows:
+            break
+
+        blobs, updates = {}, []
+        for row in rows:
+            update = {"row_id": row['id']}
+            for name in TEXT_COLUMNS:
+                data = row[name].encode('utf-8') if row[name] is not None else None
+                update[f'{name}_hash'] = hashlib.sha256(data).hexdigest() if data is not None else None
+                if data is not None:
+                    blobs[update[f'{name}_hash']] = data
+            updates.append(update)
+
+        existing = set(bind.execute(
+            sa.select(content_blobs.c.hash).where(content_blobs.c.hash.in_(list(blobs)))
+        ).scalars())
+        now = datetime.now(timezone.utc)
+        new_blobs = [
+            {"hash": content_hash, "encoding": "utf-8", "data": data, "size": len(data), "created_at": now}
+            for content_hash, data in blobs.items() if content_hash not in existing
+        ]
+        if new_blobs:
+            bind.execute(content_blobs.insert(), new_blobs)
+        bind.execute(sa.text(
+            "UPDATE test_results SET "
+            + ", ".join(f"{name}_hash = :{name}_hash" for name in TEXT_COLUMNS)
+            + " WHERE id = :row_id"
+        ), updates)
+        cursor = rows[-1]['id']
+
+
+def _decode(encoding: str, data: bytes) -> str:
+    if encoding == 'zstd':
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == 'zlib':
+        data = zlib.decompress(data)
+    return bytes(data).decode('utf-8')
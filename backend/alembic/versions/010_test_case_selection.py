@@ -0,0 +1,35 @@
+"""Indexes for selecting test cases, and run selections
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 00:00:00.000000
+
+On PostgreSQL, tag selectors use a GIN index on the metadata "tags" list and
+name globs a pattern index on name, since the unique index on name cannot
+serve LIKE prefixes under non-C collations.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_test_cases_category'), 'test_cases', ['category'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE INDEX ix_test_cases_tags ON test_cases USING gin (((metadata::jsonb) -> 'tags'))")
+        op.execute("CREATE INDEX ix_test_cases_name_pattern ON test_cases (name varchar_pattern_ops)")
+    op.add_column('test_runs', sa.Column('selection', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('test_runs', 'selection')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_test_cases_name_pattern")
+        op.execute("DROP INDEX ix_test_cases_tags")
+    op.drop_index(op.f('ix_test_cases_category'), table_name='test_cases')
@@ -0,0 +1,25 @@
+"""Schedule name of scheduled test runs
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('test_runs', sa.Column('schedule_name', sa.String(), nullable=True))
+    op.create_index(op.f('ix_test_runs_schedule_name'), 'test_runs', ['schedule_name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_test_runs_schedule_name'), table_name='test_runs')
+    op.drop_column('test_runs', 'schedule_name')
@@ -0,0 +1,29 @@
+"""Embedding index for result and test case texts
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('text_embeddings',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('text_embeddings')
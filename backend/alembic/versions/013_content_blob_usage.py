@@ -0,0 +1,35 @@
+"""Last use of content blobs and indexes on the result hash columns
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18 00:00:00.000000
+
+Pruning goes by when a blob was last used rather than created, so a run reusing
+an old blob keeps it. The hash indexes serve the pruning anti-join and joins by
+content; on PostgreSQL they are created on every partition.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+HASH_COLUMNS = ['input_prompt_hash', 'expected_behavior_hash', 'actual_output_hash']
+
+
+def upgrade() -> None:
+    op.add_column('content_blobs', sa.Column('last_used_at', sa.DateTime(timezone=True),
+                                             server_default=sa.text('now()'), nullable=True))
+    op.execute("UPDATE content_blobs SET last_used_at = created_at")
+    for column in HASH_COLUMNS:
+        op.create_index(f'ix_test_results_{column}', 'test_results', [column], unique=False)
+
+
+def downgrade() -> None:
+    for column in HASH_COLUMNS:
+        op.drop_index(f'ix_test_results_{column}', table_name='test_results')
+    op.drop_column('content_blobs', 'last_used_at')
@@ -1,3 +1,12 @@
+from .datasets import router as datasets_router
+from .metrics import router as metrics_router
+from .schedules import router as schedules_router
+from .similarity import router as similarity_router
 from .test_execution import router as test_execution_router
+from .test_run_compare import router as test_run_compare_router
+from .test_run_stream import router as test_run_stream_router
 
-__all__ = ["test_execution_router"]
\ No newline at end of file
+__all__ = [
+    "datasets_router", "metrics_router", "schedules_router", "similarity_router", "test_execution_router",
+    "test_run_compare_router", "test_run_stream_router"
+]
\ No newline at end of file
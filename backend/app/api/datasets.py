@@ -0,0 +1,103 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Callable, Iterator, List, Tuple
+from app.core.database import SessionLocal
+from app.services.datasets import (
+    FORMATS, MEDIA_TYPES, TEST_CASE_COLUMNS, RESULT_COLUMNS, encode_rows, import_test_cases, iter_file_records,
+    iter_result_rows, iter_test_case_rows
+)
+from sqlalchemy.orm import Session
+from datetime import datetime
+import os
+import tempfile
+
+router = APIRouter()
+
+FORMAT_PATTERN = f"^({'|'.join(FORMATS)})$"
+RowSource = Callable[[Session], Iterator[Dict[str, Any]]]  # Rows to export, read on the streaming session
+
+
+@router.post("/test-cases/import", response_model=Dict[str, Any])
+async def import_test_case_dataset(
+        request: Request,
+        format: str = Query("jsonl", pattern=FORMAT_PATTERN),
+        dry_run: bool = False
+):
+    """
+    Bulk-import test cases from the request body as JSONL, CSV or Parquet
+
+    Rows are validated like single test cases and upserted by name in batches,
+    one commit per batch. The body is spooled to disk as it arrives rather than
+    held in memory. Returns counts of created, updated and invalid rows with the
+    first errors by row number; dry_run=true only validates.
+    """
+    handle, path = tempfile.mkstemp(suffix=f".{format}")
+    try:
+        with os.fdopen(handle, "wb") as spool:
+            async for chunk in request.stream():
+                spool.write(chunk)
+        return await run_in_threadpool(_import_file, path, format, dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(path)
+
+
+@router.get("/test-cases/export")
+def export_test_case_dataset(
+        format: str = Query("jsonl", pattern=FORMAT_PATTERN),
+        category: str = None,
+        active_only: bool = False
+):
+    """
+    Export test cases as JSONL, CSV or Parquet, in a form the import accepts
+    """
+    return _export(lambda db: iter_test_case_rows(db, category, active_only), TEST_CASE_COLUMNS, format,
+                   "test_cases")
+
+
+@router.get("/test-results/export")
+def export_test_result_history(
+        format: str = Query("jsonl", pattern=FORMAT_PATTERN),
+        test_run_id: int = None,
+        test_case_id: int = None,
+        since: datetime = None
+):
+    """
+    Export result history with prompts and outputs as JSONL, CSV or Parquet,
+    optionally for one run, one test case or results created since `since`
+    """
+    return _export(lambda db: iter_result_rows(db, test_run_id, test_case_id, since), RESULT_COLUMNS, format,
+                   "test_results")
+
+
+def _import_file(path: str, format: str, dry_run: bool) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return import_test_cases(db, iter_file_records(path, format), dry_run=dry_run)
+    finally:
+        db.close()
+
+
+def _export(rows: RowSource, columns: List[Tuple[str, str]], format: str, name: str) -> StreamingResponse:
+    if format == "parquet":
+        # Fail before the response starts when pyarrow is missing
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet needs the pyarrow package, which is not installed")
+    return StreamingResponse(
+        _stream_export(rows, columns, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    )
+
+
+def _stream_export(rows: RowSource, columns: List[Tuple[str, str]], format: str) -> Iterator[bytes]:
+    # Streamed after the request returns, so the body uses its own session
+    db = SessionLocal()
+    try:
+        yield from encode_rows(rows(db), columns, format)
+    finally:
+        db.close()
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.services.metrics import latest_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Prometheus scrape endpoint: stage latency histograms, test case outcomes, judge
+    cache hits, judge tokens and cost, LLM retries, in-flight requests and queue depth
+    """
+    return Response(latest_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any
+from app.core.database import get_async_db
+from app.models.test_run import TestRun
+from app.services.run_scheduler import load_schedules
+from datetime import datetime, timezone
+
+router = APIRouter()
+
+LAST_RUN_COLUMNS = [TestRun.id, TestRun.name, TestRun.status, TestRun.total_tests, TestRun.failed_tests,
+                    TestRun.created_at, TestRun.completed_at]
+
+
+@router.get("/schedules", response_model=Dict[str, Any])
+async def list_schedules(db: AsyncSession = Depends(get_async_db)):
+    """
+    The configured run schedules with their next start time (UTC, offset included)
+    and their latest run
+    """
+    try:
+        schedules = load_schedules()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    now = datetime.now(timezone.utc)
+    described = []
+    for schedule in schedules:
+        last_run = (await db.execute(
+            select(*LAST_RUN_COLUMNS).where(TestRun.schedule_name == schedule.name).order_by(TestRun.id.desc()).limit(1)
+        )).mappings().first()
+        described.append(dict(
+            schedule.describe(),
+            next_run_at=schedule.next_run_after(now),
+            last_run=dict(last_run) if last_run else None
+        ))
+    return {"schedules": described}
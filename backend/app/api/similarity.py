@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Dict, Any
+from app.core.config import CLUSTER_SIMILARITY_THRESHOLD, CLUSTER_REASONING_WEIGHT, NEAR_DUPLICATE_THRESHOLD
+from app.core.database import get_db
+from app.models.test_run import TestRun
+from app.services.similarity import cluster_regressions, near_duplicate_groups, similar_test_cases
+
+router = APIRouter()
+
+# Sync endpoints: they compute and store missing embeddings, which FastAPI runs in its threadpool
+
+
+@router.get("/test-runs/{test_run_id}/regression-clusters", response_model=Dict[str, Any])
+def get_regression_clusters(
+        test_run_id: int,
+        threshold: float = Query(CLUSTER_SIMILARITY_THRESHOLD, ge=0, le=1),
+        reasoning_weight: float = Query(CLUSTER_REASONING_WEIGHT, ge=0, le=1),
+        by_change_type: bool = True,
+        limit: int = Query(50, ge=1),
+        members: int = Query(20, ge=1),
+        db: Session = Depends(get_db)
+):
+    """
+    A run's regressions grouped into clusters of similar failures, largest first,
+    each with a representative regression to triage instead of every member
+    """
+    if db.execute(select(TestRun.id).where(TestRun.id == test_run_id)).scalar() is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return cluster_regressions(db, test_run_id, threshold=threshold, reasoning_weight=reasoning_weight,
+                               by_change_type=by_change_type, limit=limit, members=members)
+
+
+@router.get("/test-cases/near-duplicates", response_model=Dict[str, Any])
+def get_near_duplicate_test_cases(
+        threshold: float = Query(NEAR_DUPLICATE_THRESHOLD, ge=0, le=1),
+        category: str = None,
+        limit: int = Query(100, ge=1),
+        db: Session = Depends(get_db)
+):
+    """
+    Groups of active test cases with near-duplicate prompts, each keeping its
+    oldest case, so the golden dataset can be deduplicated
+    """
+    return near_duplicate_groups(db, threshold=threshold, category=category, limit=limit)
+
+
+@router.get("/test-cases/{test_case_id}/similar", response_model=Dict[str, Any])
+def get_similar_test_cases(
+        test_case_id: int,
+        limit: int = Query(10, ge=1, le=100),
+        min_similarity: float = Query(0.0, ge=0, le=1),
+        db: Session = Depends(get_db)
+):
+    """
+    The active test cases whose prompts are most similar to this test case's
+    """
+    similar = similar_test_cases(db, test_case_id, limit=limit, min_similarity=min_similarity)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Test case not found")
+    return {"test_case_id": test_case_id, "similar": similar}
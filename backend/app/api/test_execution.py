@@ -1,88 +1,195 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from app.core.database import get_db
-from app.models.test_case import TestCase
+from typing import List, Dict, Any, Iterator, Optional
+from app.core.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_BATCH_SIZE
+from app.core.database import get_db, get_async_db, SessionLocal
 from app.models.test_run import TestRun
 from app.models.test_result import TestResult
-from app.services.test_executor import TestExecutor
+from app.services.content_blobs import resolve_texts, text_column
+from app.services.pagination import parse_fields, keyset_select, next_cursor, iter_keyset, ndjson_lines
+from app.services.run_dispatcher import create_test_run, dispatch_test_run
+from app.services.run_stats import get_run_summary, rebuild_run_stats, run_summary_query, summarize_run_stats
+from app.services.target_llm import check_target
+from app.services.test_selection import parse_list, select_test_case_ids
 import uuid
-from datetime import datetime
 
 router = APIRouter()
 
+# Columns that can be requested with `fields`; large texts are only read from content_blobs when asked for
+RESULT_FIELDS = {
+    column.key: column for column in [
+        TestResult.id, TestResult.test_run_id, TestResult.test_case_id, text_column("input_prompt"),
+        text_column("actual_output"), text_column("expected_behavior"), TestResult.severity_score,
+        TestResult.severity_label, TestResult.change_type, TestResult.reasoning, TestResult.is_regression,
+        TestResult.judge_cost, TestResult.processing_time, TestResult.stage_timings, TestResult.judge_trace,
+        TestResult.diff_hash, TestResult.input_prompt_hash, TestResult.actual_output_hash,
+        TestResult.expected_behavior_hash, TestResult.carried_from_result_id, TestResult.created_at
+    ]
+}
+DEFAULT_RESULT_FIELDS = [
+    "id", "test_case_id", "severity_score", "severity_label", "change_type", "reasoning",
+    "is_regression", "judge_cost", "created_at"
+]
+
+RUN_FIELDS = {
+    column.key: column for column in [
+        TestRun.id, TestRun.name, TestRun.status, TestRun.trigger_source, TestRun.git_commit,
+        TestRun.git_branch, TestRun.selection, TestRun.schedule_name, TestRun.total_tests, TestRun.passed_tests,
+        TestRun.failed_tests, TestRun.total_cost, TestRun.judge_model_used, TestRun.stats, TestRun.created_at,
+        TestRun.completed_at
+    ]
+}
+DEFAULT_RUN_FIELDS = [
+    "id", "name", "status", "total_tests", "passed_tests", "failed_tests", "total_cost",
+    "created_at", "completed_at"
+]
+
 
 @router.post("/test-runs/execute", response_model=Dict[str, Any])
-async def execute_test_run(
+def execute_test_run(
         background_tasks: BackgroundTasks,
         run_name: str = None,
         git_commit: str = None,
         git_branch: str = None,
+        concurrency: int = None,
+        incremental: bool = False,
+        model_version: str = None,
+        target_provider: str = None,
+        target_model: str = None,
+        replay_run_id: int = None,
+        max_cost: float = None,
+        stop_after_critical: int = Query(None, ge=1),
+        sprt: str = Query(None, pattern="^(fail|both)$"),
+        category: str = None,
+        tags: str = None,
+        name: str = None,
+        shard_index: int = None,
+        shard_count: int = None,
+        sample_size: int = None,
+        seed: int = None,
         db: Session = Depends(get_db)
 ):
     """
     Execute a test run with all active test cases
+
+    concurrency overrides EXECUTOR_CONCURRENCY; 1 runs the cases sequentially.
+    incremental=true only re-executes cases whose prompt, expected behavior, model
+    or model_version changed since their last run on git_branch, and carries the
+    rest forward.
+    target_provider and target_model override the TARGET_LLM_* settings for the
+    model under test; replay_run_id replays the outputs recorded by an earlier run.
+    max_cost overrides MAX_COST_PER_RUN, the judge budget in USD.
+
+    Fail-fast: stop_after_critical stops the run after that many critical
+    regressions, and sprt=fail stops it as soon as a sequential test on the
+    regression rate (over the cases in random order) shows it fails, sprt=both
+    also once it shows it passes. A run stopped early ends up "aborted", with the
+    summary of the cases executed so far and the decision in stats.early_stop.
+
+    Selectors narrow the run to part of the active test cases: category and tags
+    (comma-separated, any of), name (a glob such as "smoke_*"), shard_index of
+    shard_count (by test case id modulo, so parallel jobs get disjoint shards) and
+    a random sample_size stratified by category, repeatable with seed.
     """
     print(f"Received test run request: {run_name}")
 
-    # Get all active test cases
-    test_cases = db.query(TestCase).filter(TestCase.is_active == True).all()
+    target = {"provider": target_provider, "model": target_model, "replay_run_id": replay_run_id}
+    if replay_run_id:
+        target["provider"] = "replay"
+    try:
+        check_target(db, target)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if not test_cases:
-        raise HTTPException(status_code=400, detail="No active test cases found")
+    selection = {
+        "categories": parse_list(category),
+        "tags": parse_list(tags),
+        "name_glob": name,
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+        "sample_size": sample_size,
+        "seed": seed
+    }
+    selection = {key: value for key, value in selection.items() if value not in (None, [])}
 
-    print(f"Found {len(test_cases)} active test cases")
+    # Get the selected active test cases; workers load the cases themselves
+    try:
+        test_case_ids = select_test_case_ids(db, selection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Create test run record
-    test_run = TestRun(
-        name=run_name or f"Test Run {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-        status="running",
-        trigger_source="api",
-        git_commit=git_commit,
-        git_branch=git_branch,
-        total_tests=len(test_cases)
-    )
+    if not test_case_ids:
+        raise HTTPException(status_code=400, detail="No active test cases found" + (
+            " for the selection" if selection else ""
+        ))
 
-    db.add(test_run)
-    db.commit()
-    db.refresh(test_run)
+    print(f"Found {len(test_case_ids)} active test cases")
 
-    print(f"Created test run with ID: {test_run.id}")
+    test_run = create_test_run(db, test_case_ids, run_name, git_commit=git_commit, git_branch=git_branch,
+                               selection=selection)
 
-    # Execute tests in background
-    background_tasks.add_task(
-        execute_tests_background,
-        db,
-        test_run.id,
-        test_cases
-    )
+    # Execute tests in background or on the worker queue
+    dispatch = dispatch_test_run(test_run.id, test_case_ids, background_tasks, {
+        "concurrency": concurrency,
+        "incremental": incremental,
+        "model_version": model_version,
+        "max_cost": max_cost,
+        "stop_after_critical": stop_after_critical,
+        "sprt": sprt,
+        "target": {key: value for key, value in target.items() if value is not None}
+    })
 
     return {
         "test_run_id": test_run.id,
         "status": "started",
-        "total_tests": len(test_cases),
+        "total_tests": len(test_case_ids),
+        "selection": selection,
+        "execution_backend": dispatch["backend"],
+        "shards": dispatch["shards"],
         "message": "Test execution started in background"
     }
 
 
 @router.get("/test-runs/{test_run_id}/results", response_model=Dict[str, Any])
-async def get_test_run_results(test_run_id: int, db: Session = Depends(get_db)):
+async def get_test_run_results(
+        test_run_id: int,
+        fields: str = None,
+        cursor: int = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+        db: AsyncSession = Depends(get_async_db)
+):
     """
     Get results for a specific test run
+
+    Results are paged by id: pass the returned next_cursor as `cursor` to get the
+    next page. `fields` is a comma-separated list of result columns to return, and
+    only those columns are read. format=ndjson streams every result after `cursor`
+    as one JSON object per line instead of returning a page.
     """
-    test_run = db.query(TestRun).filter(TestRun.id == test_run_id).first()
+    test_run = await db.get(TestRun, test_run_id)
     if not test_run:
         raise HTTPException(status_code=404, detail="Test run not found")
 
-    test_results = db.query(TestResult).filter(TestResult.test_run_id == test_run_id).all()
+    try:
+        names = parse_fields(fields, RESULT_FIELDS, DEFAULT_RESULT_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    columns = [RESULT_FIELDS[name] for name in names]
 
-    # Calculate summary
-    severity_counts = {}
-    for result in test_results:
-        severity = result.severity_label or "unknown"
-        severity_counts[severity] = severity_counts.get(severity, 0) + 1
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_results(test_run_id, names, cursor), media_type="application/x-ndjson"
+        )
 
-    return {
+    results = [dict(row) for row in (await db.execute(keyset_select(
+        select(*columns).where(TestResult.test_run_id == test_run_id), TestResult.id, cursor, limit
+    ))).mappings()]
+    await db.run_sync(lambda session: resolve_texts(session, results, names))
+    response = {
         "test_run": {
             "id": test_run.id,
             "name": test_run.name,
@@ -94,96 +201,98 @@ async def get_test_run_results(test_run_id: int, db: Session = Depends(get_db)):
             "created_at": test_run.created_at,
             "completed_at": test_run.completed_at
         },
-        "results": [
-            {
-                "id": result.id,
-                "test_case_id": result.test_case_id,
-                "severity_score": result.severity_score,
-                "severity_label": result.severity_label,
-                "change_type": result.change_type,
-                "reasoning": result.reasoning,
-                "is_regression": result.is_regression,
-                "judge_cost": result.judge_cost,
-                "created_at": result.created_at
-            }
-            for result in test_results
-        ],
-        "summary": {
-            "severity_counts": severity_counts,
-            "regression_count": len([r for r in test_results if r.is_regression])
-        }
+        "results": results,
+        "next_cursor": next_cursor(results, limit)
     }
 
+    # The run summary comes from the stats maintained as results are written
+    if cursor is None:
+        response["summary"] = summarize_run_stats((await db.execute(run_summary_query(test_run_id))).all())
+    return response
 
-@router.get("/test-runs/", response_model=List[Dict[str, Any]])
-async def get_all_test_runs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+
+@router.get("/test-runs/{test_run_id}/summary", response_model=Dict[str, Any])
+async def get_test_run_summary(test_run_id: int, db: AsyncSession = Depends(get_async_db)):
     """
-    Get all test runs
+    Get a run's totals plus severity, change type and category breakdowns with
+    counts, passes, regressions and cost, without reading its results
     """
-    test_runs = db.query(TestRun).order_by(TestRun.created_at.desc()).offset(skip).limit(limit).all()
-
-    return [
-        {
-            "id": run.id,
-            "name": run.name,
-            "status": run.status,
-            "total_tests": run.total_tests,
-            "passed_tests": run.passed_tests,
-            "failed_tests": run.failed_tests,
-            "total_cost": run.total_cost,
-            "created_at": run.created_at,
-            "completed_at": run.completed_at
-        }
-        for run in test_runs
-    ]
+    if not (await db.execute(select(TestRun.id).where(TestRun.id == test_run_id))).first():
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return summarize_run_stats((await db.execute(run_summary_query(test_run_id))).all())
 
 
-# Background task function
-def execute_tests_background(db: Session, test_run_id: int, test_cases: List[TestCase]):
+@router.post("/test-runs/{test_run_id}/summary/rebuild", response_model=Dict[str, Any])
+def rebuild_test_run_summary(test_run_id: int, db: Session = Depends(get_db)):
     """
-    Execute tests in background and update test run
+    Recompute a run's summary from its results with SQL GROUP BY
     """
-    print(f"Starting background test execution for run {test_run_id} with {len(test_cases)} test cases")
+    if not db.query(TestRun.id).filter(TestRun.id == test_run_id).first():
+        raise HTTPException(status_code=404, detail="Test run not found")
+    rebuild_run_stats(db, test_run_id)
+    return get_run_summary(db, test_run_id)
+
 
+@router.get("/test-runs/", response_model=List[Dict[str, Any]])
+async def get_all_test_runs(
+        response: Response,
+        fields: str = None,
+        cursor: int = None,
+        skip: int = Query(None, ge=0, deprecated=True),
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get all test runs, newest first
+
+    Runs are paged by id: the X-Next-Cursor response header holds the `cursor` for
+    the next page and is absent on the last one. `fields` and format=ndjson work as
+    for run results. The deprecated `skip` offset still works in place of `cursor`.
+    """
+    if skip is not None and cursor is not None:
+        raise HTTPException(status_code=400, detail="Pass either cursor or the deprecated skip, not both")
     try:
-        executor = TestExecutor()
-        print("✓ TestExecutor created")
-
-        # Mock LLM client for now
-        llm_client = None
-
-        # Execute tests
-        print("Starting test execution...")
-        results = executor.execute_test_suite(
-            db=db,
-            test_cases=test_cases,
-            test_run_id=test_run_id,
-            llm_client=llm_client
-        )
-        print(f"✓ Test execution completed: {results['summary']}")
-
-        # Update test run with results
-        test_run = db.query(TestRun).filter(TestRun.id == test_run_id).first()
-        if test_run:
-            test_run.status = "completed"
-            test_run.passed_tests = results["summary"]["passed_tests"]
-            test_run.failed_tests = results["summary"]["failed_tests"]
-            test_run.total_cost = results["summary"]["total_cost"]
-            test_run.completed_at = datetime.now()
-
-            db.commit()
-            print(f"✓ Test run {test_run_id} updated in database")
-
-        print(f"Test run {test_run_id} completed successfully: {results['summary']}")
-
-    except Exception as e:
-        print(f"✗ Test run {test_run_id} failed with error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-        # Update test run as failed
-        test_run = db.query(TestRun).filter(TestRun.id == test_run_id).first()
-        if test_run:
-            test_run.status = "failed"
-            db.commit()
-            print(f"✓ Test run {test_run_id} marked as failed in database")
\ No newline at end of file
+        names = parse_fields(fields, RUN_FIELDS, DEFAULT_RUN_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    columns = [RUN_FIELDS[name] for name in names]
+
+    if skip:
+        # Start after the skip-th newest run; past the last run, from an id no run has
+        cursor = (await db.execute(
+            select(TestRun.id).order_by(TestRun.id.desc()).offset(skip - 1).limit(1)
+        )).scalar() or 0
+
+    if format == "ndjson":
+        return StreamingResponse(_stream_runs(columns, cursor), media_type="application/x-ndjson")
+
+    test_runs = [dict(row) for row in (await db.execute(
+        keyset_select(select(*columns), TestRun.id, cursor, limit, descending=True)
+    )).mappings()]
+    following = next_cursor(test_runs, limit)
+    if following is not None:
+        response.headers["X-Next-Cursor"] = str(following)
+    return test_runs
+
+
+def _stream_results(test_run_id: int, names: List[str], cursor: Optional[int]) -> Iterator[str]:
+    # The request's session is closed before the body is streamed, so use our own
+    db = SessionLocal()
+    try:
+        yield from ndjson_lines(iter_keyset(
+            db, select(*[RESULT_FIELDS[name] for name in names]).where(TestResult.test_run_id == test_run_id),
+            TestResult.id, cursor, STREAM_BATCH_SIZE, page=lambda rows: resolve_texts(db, rows, names)
+        ))
+    finally:
+        db.close()
+
+
+def _stream_runs(columns: List[Any], cursor: Optional[int]) -> Iterator[str]:
+    db = SessionLocal()
+    try:
+        yield from ndjson_lines(iter_keyset(
+            db, select(*columns), TestRun.id, cursor, STREAM_BATCH_SIZE, descending=True
+        ))
+    finally:
+        db.close()
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, Iterator, List, Optional
+from app.core.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, COMPARE_MIN_SEVERITY_DELTA
+from app.core.database import get_async_db, SessionLocal
+from app.models.test_run import TestRun
+from app.services.pagination import keyset_select, next_cursor, iter_keyset, ndjson_lines
+from app.services.run_compare import (
+    COMPARE_STATUSES, DEFAULT_COMPARE_STATUSES, compare_page_select, compare_summary_queries, summarize_comparison
+)
+
+router = APIRouter()
+
+RUN_COLUMNS = [TestRun.id, TestRun.name, TestRun.status, TestRun.git_commit, TestRun.git_branch, TestRun.created_at]
+
+
+@router.get("/test-runs/{base_run_id}/compare/{head_run_id}", response_model=Dict[str, Any])
+async def compare_test_runs(
+        base_run_id: int,
+        head_run_id: int,
+        status: str = None,
+        min_severity_delta: float = Query(COMPARE_MIN_SEVERITY_DELTA, ge=0),
+        cursor: int = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Compare the head run's results with the base run's, test case by test case
+
+    `status` is a comma-separated list of regressed, fixed, severity_changed and
+    unchanged; by default every case that changed is listed. Cases are paged by
+    the head run's result id: pass the returned next_cursor as `cursor`. The first
+    page also has a summary over all compared cases: counts per status, mean
+    severity delta, change type shifts and the cases only one run has.
+    format=ndjson streams every matching case after `cursor` instead.
+    """
+    runs = {row.id: dict(row._mapping) for row in (await db.execute(
+        select(*RUN_COLUMNS).where(TestRun.id.in_([base_run_id, head_run_id]))
+    ))}
+    for run_id in (base_run_id, head_run_id):
+        if run_id not in runs:
+            raise HTTPException(status_code=404, detail=f"Test run {run_id} not found")
+
+    statuses = DEFAULT_COMPARE_STATUSES
+    if status:
+        statuses = [name.strip() for name in status.split(",") if name.strip()]
+        unknown = [name for name in statuses if name not in COMPARE_STATUSES]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown status: {', '.join(unknown)}. Available: {', '.join(COMPARE_STATUSES)}"
+            )
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_comparison(base_run_id, head_run_id, statuses, min_severity_delta, cursor),
+            media_type="application/x-ndjson"
+        )
+
+    statement = compare_page_select(base_run_id, head_run_id, statuses, min_severity_delta)
+    cases = [dict(row) for row in (await db.execute(
+        keyset_select(statement, statement.selected_columns.id, cursor, limit)
+    )).mappings()]
+    response = {
+        "base_run": runs[base_run_id],
+        "head_run": runs[head_run_id],
+        "cases": cases,
+        "next_cursor": next_cursor(cases, limit)
+    }
+
+    if cursor is None:
+        queries = compare_summary_queries(base_run_id, head_run_id, min_severity_delta)
+        response["summary"] = summarize_comparison(
+            (await db.execute(queries["totals"])).one(),
+            (await db.execute(queries["transitions"])).all(),
+            (await db.execute(queries["only_in_base"])).scalar(),
+            (await db.execute(queries["only_in_head"])).scalar()
+        )
+    return response
+
+
+def _stream_comparison(base_run_id: int, head_run_id: int, statuses: List[str], min_severity_delta: float,
+                       cursor: Optional[int]) -> Iterator[str]:
+    # The request's session is closed before the body is streamed, so use our own
+    db = SessionLocal()
+    try:
+        statement = compare_page_select(base_run_id, head_run_id, statuses, min_severity_delta)
+        yield from ndjson_lines(iter_keyset(
+            db, statement, statement.selected_columns.id, cursor, STREAM_BATCH_SIZE
+        ))
+    finally:
+        db.close()
@@ -0,0 +1,191 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, AsyncIterator, Optional, Set
+from app.core.config import STREAM_POLL_INTERVAL, STREAM_BATCH_SIZE, PASS_SEVERITY_THRESHOLD
+from app.core.database import SessionLocal
+from app.models.test_run import TestRun
+from app.models.test_result import TestResult
+from collections import deque
+import asyncio
+import json
+import time
+
+router = APIRouter()
+
+HEARTBEAT_INTERVAL = 15.0
+COMMIT_WINDOW = 30.0  # Seconds a result id can take to commit; older ids are no longer rechecked
+
+RESULT_COLUMNS = [
+    TestResult.id,
+    TestResult.test_case_id,
+    TestResult.severity_score,
+    TestResult.severity_label,
+    TestResult.change_type,
+    TestResult.reasoning,
+    TestResult.is_regression,
+    TestResult.judge_cost,
+    TestResult.created_at
+]
+
+
+@router.get("/test-runs/{test_run_id}/stream")
+def stream_test_run_results(test_run_id: int, after_id: Optional[int] = None,
+                            last_event_id: Optional[str] = Header(None)):
+    """
+    Stream a run's results as Server-Sent Events as soon as they are written.
+
+    Each result is a "result" event whose id is the result id, followed by a
+    "progress" event with running pass/fail/regression/cost counters. The stream
+    ends with a "complete" event once the run has finished. Reconnecting clients
+    resume after `after_id` or the standard Last-Event-ID header.
+    """
+    db = SessionLocal()
+    try:
+        if not db.query(TestRun.id).filter(TestRun.id == test_run_id).first():
+            raise HTTPException(status_code=404, detail="Test run not found")
+    finally:
+        db.close()
+
+    cursor = after_id
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+
+    return StreamingResponse(
+        _result_events(test_run_id, cursor or 0),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _result_events(test_run_id: int, cursor: int) -> AsyncIterator[str]:
+    """
+    Tail test_results by id, so each poll reads only the rows written since the last one.
+
+    Concurrent shards commit id ranges out of order, so a result can become
+    visible after results with higher ids were sent; each poll also sends those.
+    Only ids above `floor` are rechecked: it trails the cursor by COMMIT_WINDOW,
+    after which every lower id has committed, so the recheck covers the results
+    of that window and not the whole run. Queries run in the threadpool so
+    polling never blocks the event loop.
+    """
+    db = SessionLocal()
+    try:
+        floor, sent_ids = cursor, set()
+        # (time of a poll, cursor after it): every id up to that cursor was taken before that time
+        checkpoints = deque()
+        counters = await run_in_threadpool(_counters_up_to, db, test_run_id, cursor)
+        yield _event("progress", counters)
+        last_sent = time.monotonic()
+
+        while True:
+            polled = time.monotonic()
+            status, total_tests, rows = await run_in_threadpool(_poll, db, test_run_id, floor, cursor, sent_ids)
+            for row in rows:
+                result = dict(row._mapping)
+                _count_result(counters, result)
+                sent_ids.add(result["id"])
+                # Event ids stay at the highest id sent, which is where a reconnecting client resumes
+                cursor = max(cursor, result["id"])
+                yield _event("result", result, event_id=cursor)
+
+            if rows:
+                counters["total_tests"] = total_tests
+                counters["status"] = status
+                yield _event("progress", counters, event_id=cursor)
+                last_sent = time.monotonic()
+
+            if len(rows) == STREAM_BATCH_SIZE:
+                continue
+
+            # This poll has sent every visible result, so ids taken over COMMIT_WINDOW ago are done with
+            checkpoints.append((polled, cursor))
+            if checkpoints[0][0] <= polled - COMMIT_WINDOW:
+                while checkpoints and checkpoints[0][0] <= polled - COMMIT_WINDOW:
+                    floor = checkpoints.popleft()[1]
+                sent_ids = {result_id for result_id in sent_ids if result_id > floor}
+            if status != "running" and not rows:
+                counters["total_tests"] = total_tests
+                counters["status"] = status
+                yield _event("complete", counters, event_id=cursor)
+                return
+
+            if time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+                yield ": heartbeat\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+    finally:
+        db.close()
+
+
+def _poll(db: Session, test_run_id: int, floor: int, cursor: int, sent_ids: Set[int]):
+    """
+    The run's status and size, and up to STREAM_BATCH_SIZE results to send: first
+    any committed at or below the cursor after it passed them, found by counting
+    the run's results above the floor, then the ones after the cursor
+    """
+    try:
+        status, total_tests = db.query(TestRun.status, TestRun.total_tests).filter(TestRun.id == test_run_id).one()
+        rows: List[Any] = []
+        in_range = [TestResult.test_run_id == test_run_id, TestResult.id > floor, TestResult.id <= cursor]
+        if db.query(func.count(TestResult.id)).filter(*in_range).scalar() > len(sent_ids):
+            missed = [result_id for (result_id,) in db.query(TestResult.id).filter(*in_range)
+                      if result_id not in sent_ids][:STREAM_BATCH_SIZE]
+            rows = (
+                db.query(*RESULT_COLUMNS)
+                .filter(TestResult.test_run_id == test_run_id, TestResult.id.in_(missed))
+                .order_by(TestResult.id)
+                .all()
+            )
+        if len(rows) < STREAM_BATCH_SIZE:
+            rows += (
+                db.query(*RESULT_COLUMNS)
+                .filter(TestResult.test_run_id == test_run_id, TestResult.id > cursor)
+                .order_by(TestResult.id)
+                .limit(STREAM_BATCH_SIZE - len(rows))
+                .all()
+            )
+        return status, total_tests, rows
+    finally:
+        # End the read transaction so the next poll sees newly committed rows
+        db.rollback()
+
+
+def _counters_up_to(db: Session, test_run_id: int, cursor: int) -> Dict[str, Any]:
+    """Counters for the results a resuming client has already seen, in one aggregate query"""
+    row = db.query(
+        func.count(TestResult.id),
+        func.sum(case((TestResult.severity_score < PASS_SEVERITY_THRESHOLD, 1), else_=0)),
+        func.sum(case((TestResult.is_regression == True, 1), else_=0)),
+        func.sum(TestResult.judge_cost)
+    ).filter(TestResult.test_run_id == test_run_id, TestResult.id <= cursor).one()
+    completed, passed, regressions, cost = row
+
+    return {
+        "completed_tests": completed or 0,
+        "passed_tests": passed or 0,
+        "failed_tests": (completed or 0) - (passed or 0),
+        "regression_count": regressions or 0,
+        "total_cost": cost or 0.0,
+        "last_result_id": cursor
+    }
+
+
+def _count_result(counters: Dict[str, Any], result: Dict[str, Any]):
+    counters["completed_tests"] += 1
+    # Unscored results count as failed, as in _counters_up_to
+    if result["severity_score"] is not None and result["severity_score"] < PASS_SEVERITY_THRESHOLD:
+        counters["passed_tests"] += 1
+    else:
+        counters["failed_tests"] += 1
+    if result["is_regression"]:
+        counters["regression_count"] += 1
+    counters["total_cost"] += result["judge_cost"] or 0.0
+    counters["last_result_id"] = max(counters["last_result_id"], result["id"])
+
+
+def _event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return message + f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
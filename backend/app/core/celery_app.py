@@ -0,0 +1,40 @@
+from celery import Celery
+from celery.signals import worker_process_shutdown
+from .config import REDIS_URL, CELERY_BROKER_URL, CELERY_RESULT_BACKEND, PROMETHEUS_MULTIPROC_DIR
+
+# Workers: celery -A app.core.celery_app worker --loglevel=info
+# Scheduled maintenance: celery -A app.core.celery_app beat --loglevel=info
+celery_app = Celery(
+    "canary",
+    broker=CELERY_BROKER_URL or REDIS_URL,
+    backend=CELERY_RESULT_BACKEND or REDIS_URL,
+    include=["app.tasks.test_runs", "app.tasks.maintenance"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    # A shard is long-running: hand them out one at a time and only ack once done,
+    # so a worker crash puts its shard back on the queue; the redelivered shard skips
+    # the cases that already have results (see execute_test_cases)
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    result_expires=86400
+)
+
+celery_app.conf.beat_schedule = {
+    "maintain-result-history": {
+        "task": "canary.maintain_result_history",
+        "schedule": 86400
+    }
+}
+
+
+@worker_process_shutdown.connect
+def remove_live_metrics(pid=None, **kwargs):
+    """Drop an exiting worker's in-flight and queue gauges from the shared metrics"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -1,17 +1,83 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from .config import DATABASE_URL
+from typing import AsyncIterator
+from .config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE
+)
+
+# Async drivers for the sync URLs we support
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def _pool_options(url: str) -> dict:
+    # SQLite uses a single-file pool that doesn't take these settings
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+
+def async_database_url() -> str:
+    if ASYNC_DATABASE_URL:
+        return ASYNC_DATABASE_URL
+    url = make_url(DATABASE_URL)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)) \
+        .render_as_string(hide_password=False)
+
 
 # Create database engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL))
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers, created on first use so workers that only
+# need the sync engine don't require the async driver
+_async_engine = None
+AsyncSessionLocal = async_sessionmaker(expire_on_commit=False, class_=AsyncSession)
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        url = make_url(async_database_url())
+        connect_args = {}
+        if url.drivername == "postgresql+asyncpg":
+            # SQLAlchemy's prepared statement cache and asyncpg's own; both must be 0 behind PgBouncer
+            url = url.update_query_dict({"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)})
+            connect_args["statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        _async_engine = create_async_engine(url, connect_args=connect_args, **_pool_options(str(url)))
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+
+async def dispose_async_engine():
+    """Close the async engine's connections, if a request ever created it"""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Dependency to get an async database session, for handlers that run on the event loop
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
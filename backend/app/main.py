@@ -1,10 +1,19 @@
 ﻿from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_db, get_async_db, dispose_async_engine
 from app.models.test_case import TestCase
 from app.models.test_run import TestRun
-from app.api import test_execution_router
+from app.core.config import SCHEDULER_ENABLED
+from app.api import (
+    datasets_router, metrics_router, schedules_router, similarity_router, test_execution_router,
+    test_run_compare_router, test_run_stream_router
+)
+from app.services.result_history import ensure_upcoming_partitions
+from app.services.run_scheduler import RunScheduler, load_schedules
 
 app = FastAPI(
     title='Canary',
@@ -25,21 +34,52 @@ app.add_middleware(
 async def root():
     return {'message': 'Canary API', 'version': '0.1.0'}
 
+@app.on_event('startup')
+async def create_result_partitions():
+    def create():
+        db = SessionLocal()
+        try:
+            ensure_upcoming_partitions(db)
+        finally:
+            db.close()
+    await run_in_threadpool(create)
+
+@app.on_event('startup')
+async def start_run_scheduler():
+    if SCHEDULER_ENABLED:
+        app.state.run_scheduler = RunScheduler(load_schedules())
+        app.state.run_scheduler.start()
+
+@app.on_event('shutdown')
+async def stop_run_scheduler():
+    if getattr(app.state, 'run_scheduler', None):
+        await app.state.run_scheduler.stop()
+
+@app.on_event('shutdown')
+async def close_database_pools():
+    await dispose_async_engine()
+
 @app.get('/health')
 async def health_check():
     return {'status': 'healthy'}
 
 # Include API routers
 app.include_router(test_execution_router, prefix="/api/v1", tags=["test-execution"])
+app.include_router(test_run_stream_router, prefix="/api/v1", tags=["test-execution"])
+app.include_router(test_run_compare_router, prefix="/api/v1", tags=["test-execution"])
+app.include_router(datasets_router, prefix="/api/v1", tags=["datasets"])
+app.include_router(schedules_router, prefix="/api/v1", tags=["schedules"])
+app.include_router(similarity_router, prefix="/api/v1", tags=["triage"])
+app.include_router(metrics_router, tags=["monitoring"])
 
 # Basic test case management (keep these for now)
 @app.get('/api/v1/test-cases/')
-async def get_test_cases(db: Session = Depends(get_db)):
-    test_cases = db.query(TestCase).all()
+async def get_test_cases(db: AsyncSession = Depends(get_async_db)):
+    test_cases = (await db.execute(select(TestCase))).scalars().all()
     return {'test_cases': test_cases}
 
 @app.post('/api/v1/test-cases/')
-async def create_test_case(test_case_data: dict, db: Session = Depends(get_db)):
+def create_test_case(test_case_data: dict, db: Session = Depends(get_db)):
     test_case = TestCase(**test_case_data)
     db.add(test_case)
     db.commit()
@@ -47,8 +87,8 @@ async def create_test_case(test_case_data: dict, db: Session = Depends(get_db)):
     return test_case
 
 @app.get('/api/v1/test-runs/')
-async def get_test_runs(db: Session = Depends(get_db)):
-    test_runs = db.query(TestRun).all()
+async def get_test_runs(db: AsyncSession = Depends(get_async_db)):
+    test_runs = (await db.execute(select(TestRun))).scalars().all()
     return {'test_runs': test_runs}
 
 if __name__ == '__main__':
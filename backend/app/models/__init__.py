@@ -2,5 +2,13 @@
 from .test_case import TestCase
 from .test_run import TestRun
 from .test_result import TestResult
+from .test_case_baseline import TestCaseBaseline
+from .test_case_snapshot import TestCaseSnapshot
+from .test_run_stat import TestRunStat
+from .content_blob import ContentBlob
+from .text_embedding import TextEmbedding
 
-__all__ = ["TestCase", "TestRun", "TestResult"]
\ No newline at end of file
+__all__ = [
+    "TestCase", "TestRun", "TestResult", "TestCaseBaseline", "TestCaseSnapshot", "TestRunStat", "ContentBlob",
+    "TextEmbedding"
+]
\ No newline at end of file
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+
+    # Each distinct prompt, expected behavior or output is stored once, keyed by its content
+    hash = Column(String(64), primary_key=True)  # sha256 hex of the UTF-8 text
+    encoding = Column(String, nullable=False)  # utf-8, zlib or zstd
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # Bytes of UTF-8 text before compression
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())  # Refreshed on reuse; pruning goes by it
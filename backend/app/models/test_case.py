@@ -11,10 +11,10 @@ class TestCase(Base):
     description = Column(Text)
     input_prompt = Column(Text, nullable=False)
     expected_behavior = Column(Text, nullable=False)  # Semantic description of expected output
-    category = Column(String)  # e.g., "factual", "creative", "safety"
+    category = Column(String, index=True)  # e.g., "factual", "creative", "safety"
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Metadata for cost tracking and analysis
-    metadata_ = Column("metadata", JSON)  # Additional flexible data
\ No newline at end of file
+    metadata_ = Column("metadata", JSON)  # Additional flexible data; a "tags" list is used to select test cases
\ No newline at end of file
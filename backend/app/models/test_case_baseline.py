@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class TestCaseBaseline(Base):
+    __tablename__ = "test_case_baselines"
+
+    id = Column(Integer, primary_key=True, index=True)
+    test_case_id = Column(Integer, ForeignKey("test_cases.id"), unique=True, nullable=False)
+
+    # Last output the judge accepted for this test case
+    output = Column(Text, nullable=False)
+    output_hash = Column(String, nullable=False)
+    normalized_hash = Column(String, nullable=False)  # Hash after case/whitespace/punctuation folding
+    test_run_id = Column(Integer, ForeignKey("test_runs.id"))  # Run that produced the output
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
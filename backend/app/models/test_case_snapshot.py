@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class TestCaseSnapshot(Base):
+    __tablename__ = "test_case_snapshots"
+    __table_args__ = (
+        UniqueConstraint("test_case_id", "git_branch", "llm_model", name="uq_test_case_snapshots_case_branch_model"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    test_case_id = Column(Integer, ForeignKey("test_cases.id"), nullable=False)
+    git_branch = Column(String, nullable=False, default="")  # "" for runs without a branch
+    llm_model = Column(String, nullable=False)
+
+    # Fingerprint of input_prompt, expected_behavior and model when the result was produced
+    input_hash = Column(String, nullable=False)
+    result_id = Column(Integer, nullable=False)  # Latest executed test_results row for these inputs
+    test_run_id = Column(Integer, ForeignKey("test_runs.id"))
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, JSON, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -6,6 +6,16 @@ from .base import Base
 
 class TestResult(Base):
     __tablename__ = "test_results"
+    # On PostgreSQL the table is partitioned by month on created_at (see migration 006)
+    __table_args__ = (
+        Index("ix_test_results_test_run_id_id", "test_run_id", "id"),  # Keyset pagination within a run
+        Index("ix_test_results_test_case_id_created_at", "test_case_id", "created_at"),  # Per-case history
+        Index("ix_test_results_test_case_id_test_run_id", "test_case_id", "test_run_id"),  # Latest result per case
+        # Joins by content and the blob pruning anti-join
+        Index("ix_test_results_input_prompt_hash", "input_prompt_hash"),
+        Index("ix_test_results_expected_behavior_hash", "expected_behavior_hash"),
+        Index("ix_test_results_actual_output_hash", "actual_output_hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -13,10 +23,10 @@ class TestResult(Base):
     test_run_id = Column(Integer, ForeignKey("test_runs.id"), nullable=False)
     test_case_id = Column(Integer, ForeignKey("test_cases.id"), nullable=False)
 
-    # Test execution data
-    input_prompt = Column(Text, nullable=False)
-    actual_output = Column(Text)
-    expected_behavior = Column(Text)
+    # Test execution data, stored once per distinct text in content_blobs (see app.services.content_blobs)
+    input_prompt_hash = Column(String(64), nullable=False)
+    actual_output_hash = Column(String(64))  # Equal hashes mean identical outputs
+    expected_behavior_hash = Column(String(64))
 
     # Judge evaluation results
     severity_score = Column(Float)  # 0-1, higher = more severe
@@ -24,14 +34,20 @@ class TestResult(Base):
     change_type = Column(String)  # factual_error, style_change, refusal, etc.
     reasoning = Column(Text)  # AI judge's explanation
     is_regression = Column(Boolean, default=False)
+    judge_trace = Column(JSON)  # Each judge stage's verdict, cost and decision (accept, escalate, skipped_budget)
 
     # Cost and performance
     judge_cost = Column(Float, default=0.0)
     processing_time = Column(Float)  # seconds
+    stage_timings = Column(JSON)  # Seconds per stage: queued, generation, prejudge, cache_lookup, judge
 
     # Caching
     diff_hash = Column(String, index=True)  # For caching identical diffs
 
+    # Incremental runs
+    input_hash = Column(String)  # Fingerprint of the prompt, expected behavior and model
+    carried_from_result_id = Column(Integer)  # Set when reused from an earlier run instead of re-executed
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
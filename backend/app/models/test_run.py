@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -9,10 +9,12 @@ class TestRun(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    status = Column(String, default="running")  # running, completed, failed
+    status = Column(String, default="running")  # running, completed, failed, aborted (stopped early)
     trigger_source = Column(String)  # ci, manual, scheduled
     git_commit = Column(String)
     git_branch = Column(String)
+    selection = Column(JSON)  # Test case selectors of a targeted run: categories, tags, name_glob, shard, sample
+    schedule_name = Column(String, index=True)  # Schedule that started a scheduled run
 
     # Cost tracking
     total_cost = Column(Float, default=0.0)
@@ -22,6 +24,7 @@ class TestRun(Base):
     total_tests = Column(Integer, default=0)
     passed_tests = Column(Integer, default=0)
     failed_tests = Column(Integer, default=0)
+    stats = Column(JSON)  # Execution statistics, e.g. pre-judge skip rate and judge cache hits
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class TestRunStat(Base):
+    __tablename__ = "test_run_stats"
+    __table_args__ = (
+        UniqueConstraint("test_run_id", "dimension", "value", name="uq_test_run_stats_run_dimension_value"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    test_run_id = Column(Integer, ForeignKey("test_runs.id"), nullable=False)
+
+    # One row per value of a breakdown, e.g. ("severity_label", "high"); ("total", "all") covers the run
+    dimension = Column(String, nullable=False)  # total, severity_label, change_type, category
+    value = Column(String, nullable=False)
+
+    # Running aggregates, incremented as results are written
+    result_count = Column(Integer, nullable=False, default=0)
+    passed_count = Column(Integer, nullable=False, default=0)
+    regression_count = Column(Integer, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime, LargeBinary
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class TextEmbedding(Base):
+    __tablename__ = "text_embeddings"
+
+    # Embeddings of prompts, outputs and judge reasoning, keyed like content_blobs by the text's sha256
+    hash = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)  # Embedding model and size; other models' vectors are recomputed
+    vector = Column(LargeBinary, nullable=False)  # Little-endian float16
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
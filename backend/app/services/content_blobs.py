@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from app.core.config import CONTENT_BLOB_COMPRESSION, CONTENT_BLOB_COMPRESS_MIN_BYTES, CONTENT_BLOB_CACHE_SIZE
+from app.models.content_blob import ContentBlob
+from app.models.test_result import TestResult
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import hashlib
+import threading
+import zlib
+
+# Result texts, each stored in content_blobs and referenced from test_results.<name>_hash
+TEXT_COLUMNS = ["input_prompt", "expected_behavior", "actual_output"]
+HASH_COLUMNS = [getattr(TestResult, f"{name}_hash") for name in TEXT_COLUMNS]
+
+ZSTD_LEVEL = 3
+CHUNK_SIZE = 1000
+BLOB_TOUCH_INTERVAL = timedelta(days=1)  # How old last_used_at may get before a reuse refreshes it
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def text_column(name: str):
+    """A result's hash column labelled with the text's name, for queries whose rows go through resolve_texts"""
+    return getattr(TestResult, f"{name}_hash").label(name)
+
+
+def _zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def encode_text(text: str, compression: str = CONTENT_BLOB_COMPRESSION,
+                min_bytes: int = CONTENT_BLOB_COMPRESS_MIN_BYTES) -> Tuple[str, bytes]:
+    """The encoding and stored bytes for `text`; compression is only kept when it saves space"""
+    raw = text.encode("utf-8")
+    if compression == "none" or len(raw) < min_bytes:
+        return "utf-8", raw
+    zstandard = _zstandard() if compression == "zstd" else None
+    if zstandard:
+        encoding, data = "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        encoding, data = "zlib", zlib.compress(raw, 6)
+    return (encoding, data) if len(data) < len(raw) else ("utf-8", raw)
+
+
+def decode_blob(encoding: str, data: bytes) -> str:
+    if encoding == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("Content blob is zstd-compressed but the zstandard package is not installed")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+
+class _TextCache:
+    """Decoded blob texts by hash; blobs never change, so entries never go stale"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._texts: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for key in hashes:
+                if key in self._texts:
+                    self._texts.move_to_end(key)
+                    found[key] = self._texts[key]
+        return found
+
+    def set_many(self, texts: Dict[str, str]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for key, text in texts.items():
+                self._texts[key] = text
+                self._texts.move_to_end(key)
+            while len(self._texts) > self.max_size:
+                self._texts.popitem(last=False)
+
+
+_cache = _TextCache(CONTENT_BLOB_CACHE_SIZE)
+
+
+def store_texts(db: Session, texts: List[Optional[str]]) -> List[Optional[str]]:
+    """
+    Make sure every text has a blob and return their hashes in order; None stays None.
+
+    Texts already stored, by this or any earlier run, are only looked up by hash,
+    so a prompt or an unchanged output is written once however many runs use it.
+    Reused blobs get their last_used_at refreshed when it is over
+    BLOB_TOUCH_INTERVAL old, which keeps prune_blobs from deleting them before the
+    results referring to them are committed; blobs a prune deleted in the meantime
+    are written again. All of it happens in the caller's transaction.
+    """
+    hashes = [content_hash(text) if text is not None else None for text in texts]
+    distinct = {key: text for key, text in zip(hashes, texts) if key is not None}
+    pending = list(distinct)
+
+    existing, stale = set(), []
+    touch_before = datetime.now(timezone.utc) - BLOB_TOUCH_INTERVAL
+    for start in range(0, len(pending), CHUNK_SIZE):
+        for row in db.execute(
+            select(ContentBlob.hash, ContentBlob.last_used_at)
+            .where(ContentBlob.hash.in_(pending[start:start + CHUNK_SIZE]))
+        ):
+            existing.add(row.hash)
+            if _as_utc(row.last_used_at) < touch_before:
+                stale.append(row.hash)
+    for start in range(0, len(stale), CHUNK_SIZE):
+        # Waits for a prune deleting these rows; the ones it deleted are not returned
+        chunk = stale[start:start + CHUNK_SIZE]
+        touched = set(db.execute(
+            update(ContentBlob).where(ContentBlob.hash.in_(chunk)).values(last_used_at=func.now())
+            .returning(ContentBlob.hash)
+        ).scalars())
+        existing.difference_update(set(chunk) - touched)
+
+    rows = []
+    for key in pending:
+        if key in existing:
+            continue
+        encoding, data = encode_text(distinct[key])
+        rows.append({"hash": key, "encoding": encoding, "data": data,
+                     "size": len(distinct[key].encode("utf-8"))})
+    if rows:
+        # Concurrent runs may store the same text at the same time
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        db.execute(dialect.insert(ContentBlob).on_conflict_do_nothing(index_elements=["hash"]), rows)
+    return hashes
+
+
+def _as_utc(moment: Optional[datetime]) -> datetime:
+    if moment is None:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    # SQLite returns naive datetimes, in UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def load_texts(db: Session, hashes: Iterable[Optional[str]]) -> Dict[str, str]:
+    """Texts by hash; hashes without a blob are left out"""
+    wanted = list(dict.fromkeys(key for key in hashes if key))
+    texts = _cache.get_many(wanted)
+    missing = [key for key in wanted if key not in texts]
+    for start in range(0, len(missing), CHUNK_SIZE):
+        loaded = {
+            row.hash: decode_blob(row.encoding, row.data) for row in db.execute(
+                select(ContentBlob.hash, ContentBlob.encoding, ContentBlob.data)
+                .where(ContentBlob.hash.in_(missing[start:start + CHUNK_SIZE]))
+            )
+        }
+        _cache.set_many(loaded)
+        texts.update(loaded)
+    return texts
+
+
+def resolve_texts(db: Session, rows: List[Dict[str, Any]],
+                  names: Iterable[str] = TEXT_COLUMNS) -> List[Dict[str, Any]]:
+    """
+    Replace the hashes under `names` in each row with their texts, in place, with
+    one blob lookup for all rows. Rows select the hashes with text_column.
+    """
+    names = [name for name in names if name in TEXT_COLUMNS]
+    if not rows or not names:
+        return rows
+    texts = load_texts(db, (row.get(name) for row in rows for name in names))
+    for row in rows:
+        for name in names:
+            if row.get(name) is not None:
+                row[name] = texts.get(row[name])
+    return rows
+
+
+def prune_blobs(db: Session, before: datetime) -> int:
+    """
+    Delete blobs no result has used since `before` and no result refers to any
+    more, e.g. after expired results were removed.
+
+    A run reusing a blob refreshes its last_used_at first (see store_texts), and a
+    DELETE that waited for that update re-checks it, so a blob is never deleted
+    under a result about to be committed. `before` is kept at least
+    BLOB_TOUCH_INTERVAL in the past for that to hold.
+    """
+    before = min(before, datetime.now(timezone.utc) - BLOB_TOUCH_INTERVAL)
+    deleted = db.query(ContentBlob).filter(
+        ContentBlob.last_used_at < before,
+        *[~exists().where(column == ContentBlob.hash) for column in HASH_COLUMNS]
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,306 @@
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from app.core.config import DATASET_IMPORT_BATCH_SIZE, STREAM_BATCH_SIZE
+from app.models.test_case import TestCase
+from app.models.test_result import TestResult
+from app.schemas.test_case import TestCaseCreate
+from app.services.content_blobs import resolve_texts, text_column
+from app.services.pagination import iter_keyset
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import datetime
+import codecs
+import csv
+import io
+import json
+import os
+import tempfile
+
+FORMATS = ["jsonl", "csv", "parquet"]
+EXTENSIONS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".parquet": "parquet"}
+MEDIA_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+MAX_REPORTED_ERRORS = 100
+
+# Exported columns with their Parquet types; JSON columns are written as JSON strings
+TEST_CASE_COLUMNS = [
+    ("id", "int64"), ("name", "string"), ("description", "string"), ("input_prompt", "string"),
+    ("expected_behavior", "string"), ("category", "string"), ("is_active", "bool_"), ("metadata", "string"),
+    ("created_at", "timestamp"), ("updated_at", "timestamp")
+]
+RESULT_COLUMNS = [
+    ("id", "int64"), ("test_run_id", "int64"), ("test_case_id", "int64"), ("input_prompt", "string"),
+    ("expected_behavior", "string"), ("actual_output", "string"), ("severity_score", "float64"),
+    ("severity_label", "string"), ("change_type", "string"), ("reasoning", "string"), ("is_regression", "bool_"),
+    ("judge_cost", "float64"), ("processing_time", "float64"), ("diff_hash", "string"),
+    ("carried_from_result_id", "int64"), ("created_at", "timestamp")
+]
+JSON_COLUMNS = {"metadata"}
+
+
+def format_for_path(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"Cannot tell the format of {path}; use one of {', '.join(EXTENSIONS)}")
+    return EXTENSIONS[extension]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ValueError("Parquet needs the pyarrow package, which is not installed")
+
+
+# Reading
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Text lines, newlines included, from a stream of byte chunks"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(chunks: Iterable[bytes], format: str) -> Iterator[Tuple[int, Any]]:
+    """
+    (row number, record) pairs from JSONL or CSV bytes, read as they arrive.
+    A line that is not valid JSON is yielded as its error message instead.
+    """
+    if format == "jsonl":
+        for number, line in enumerate(_lines(chunks), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, f"Invalid JSON: {str(e)}"
+    elif format == "csv":
+        # Row 1 is the header
+        for number, record in enumerate(csv.DictReader(_lines(chunks)), start=2):
+            yield number, _from_csv(record)
+    else:
+        raise ValueError(f"Streaming is not supported for {format}")
+
+
+def iter_parquet_records(path: str, batch_size: int = DATASET_IMPORT_BATCH_SIZE) -> Iterator[Tuple[int, Any]]:
+    """(row number, record) pairs from a Parquet file, one row group batch in memory at a time"""
+    pyarrow = _pyarrow()
+    number = 0
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+        for record in batch.to_pylist():
+            number += 1
+            # Null cells are missing values, as empty CSV cells are
+            record = {key: value for key, value in record.items() if value is not None}
+            if isinstance(record.get("metadata"), str):
+                record["metadata"] = _json_or_text(record["metadata"])
+            yield number, record
+
+
+def iter_file_records(path: str, format: Optional[str] = None) -> Iterator[Tuple[int, Any]]:
+    format = format or format_for_path(path)
+    if format == "parquet":
+        yield from iter_parquet_records(path)
+        return
+    with open(path, "rb") as source:
+        yield from iter_records(iter(lambda: source.read(1 << 16), b""), format)
+
+
+def _from_csv(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Empty CSV cells are missing values; metadata holds JSON"""
+    record = {key: value for key, value in record.items() if key is not None and value != ""}
+    if "metadata" in record:
+        record["metadata"] = _json_or_text(record["metadata"])
+    return record
+
+
+def _json_or_text(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+# Importing
+
+def import_test_cases(db: Session, records: Iterable[Tuple[int, Any]], batch_size: int = DATASET_IMPORT_BATCH_SIZE,
+                      dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Validate records with TestCaseCreate and upsert them by name, one INSERT ...
+    ON CONFLICT and one commit per batch. An existing test case only has the
+    fields a row sets replaced. Invalid rows are skipped and reported with their
+    row number; with dry_run nothing is written.
+    """
+    report = {"rows": 0, "created": 0, "updated": 0, "invalid": 0, "errors": []}
+    batch: Dict[str, Dict[str, Any]] = {}
+
+    for number, record in records:
+        report["rows"] += 1
+        try:
+            if not isinstance(record, dict):
+                raise ValueError(record if isinstance(record, str) else "Row is not an object")
+            test_case = TestCaseCreate(**record)
+        except ValidationError as e:
+            _reject(report, number, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            ))
+            continue
+        except (ValueError, TypeError) as e:
+            _reject(report, number, str(e))
+            continue
+
+        # Only the columns a row sets are written, so omitted ones keep their stored values
+        values = test_case.model_dump(exclude_unset=True)
+        if "metadata" in values:
+            values["metadata_"] = values.pop("metadata")
+        # The last row wins when a name repeats
+        batch.pop(values["name"], None)
+        batch[values["name"]] = values
+        if len(batch) >= batch_size:
+            _upsert(db, list(batch.values()), report, dry_run)
+            batch = {}
+
+    if batch:
+        _upsert(db, list(batch.values()), report, dry_run)
+    return report
+
+
+def _reject(report: Dict[str, Any], number: int, error: str):
+    report["invalid"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": number, "error": error})
+
+
+def _upsert(db: Session, rows: List[Dict[str, Any]], report: Dict[str, Any], dry_run: bool):
+    names = [row["name"] for row in rows]
+    existing = set(db.execute(select(TestCase.name).where(TestCase.name.in_(names))).scalars())
+    report["created"] += len(rows) - len(existing)
+    report["updated"] += len(existing)
+    if dry_run:
+        return
+
+    # One statement per set of columns, since rows of a batch may set different ones
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    for columns, group in groups.items():
+        statement = dialect.insert(TestCase)
+        updates = {
+            column: getattr(statement.excluded, column) for column in
+            ["description", "input_prompt", "expected_behavior", "category", "is_active"] if column in columns
+        }
+        if "metadata_" in columns:
+            updates["metadata"] = statement.excluded.metadata
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["name"], set_=dict(updates, updated_at=func.now())
+        ), group)
+    db.commit()
+
+
+# Exporting
+
+def iter_test_case_rows(db: Session, category: Optional[str] = None,
+                        active_only: bool = False) -> Iterator[Dict[str, Any]]:
+    statement = select(*[
+        TestCase.metadata_.label("metadata") if name == "metadata" else getattr(TestCase, name)
+        for name, _ in TEST_CASE_COLUMNS
+    ])
+    if category:
+        statement = statement.where(TestCase.category == category)
+    if active_only:
+        statement = statement.where(TestCase.is_active == True)
+    return iter_keyset(db, statement, TestCase.id, None, STREAM_BATCH_SIZE)
+
+
+def iter_result_rows(db: Session, test_run_id: Optional[int] = None, test_case_id: Optional[int] = None,
+                     since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Result history with its texts, read one keyset page and one blob lookup at a time"""
+    statement = select(*[
+        text_column(name) if name in ("input_prompt", "expected_behavior", "actual_output")
+        else getattr(TestResult, name)
+        for name, _ in RESULT_COLUMNS
+    ])
+    if test_run_id is not None:
+        statement = statement.where(TestResult.test_run_id == test_run_id)
+    if test_case_id is not None:
+        statement = statement.where(TestResult.test_case_id == test_case_id)
+    if since is not None:
+        statement = statement.where(TestResult.created_at >= since)
+    return iter_keyset(db, statement, TestResult.id, None, STREAM_BATCH_SIZE,
+                       page=lambda rows: resolve_texts(db, rows))
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]], format: str) -> Iterator[bytes]:
+    """Export rows as JSONL, CSV or Parquet bytes, a batch at a time"""
+    names = [name for name, _ in columns]
+    if format == "jsonl":
+        for row in rows:
+            yield (json.dumps(row, default=str) + "\n").encode("utf-8")
+    elif format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=names)
+        writer.writeheader()
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(_to_flat(row))
+            if count % STREAM_BATCH_SIZE == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+    elif format == "parquet":
+        yield from _encode_parquet(rows, columns)
+    else:
+        raise ValueError(f"Unknown format {format}; use one of {', '.join(FORMATS)}")
+
+
+def _to_flat(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: json.dumps(value) if key in JSON_COLUMNS and value is not None else value
+        for key, value in row.items()
+    }
+
+
+def _encode_parquet(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Parquet's footer is written last, so the file is built on disk one row group
+    per batch and then streamed
+    """
+    pyarrow = _pyarrow()
+    schema = pyarrow.schema([
+        (name, pyarrow.timestamp("us", tz="UTC") if kind == "timestamp" else getattr(pyarrow, kind)())
+        for name, kind in columns
+    ])
+    handle, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(handle)
+    try:
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            batch = []
+            for row in rows:
+                batch.append(_to_flat(row))
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                    batch = []
+            if batch:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+        with open(path, "rb") as source:
+            yield from iter(lambda: source.read(1 << 16), b"")
+    finally:
+        os.remove(path)
+
+
+def export_to_file(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]], path: str,
+                   format: Optional[str] = None):
+    with open(path, "wb") as target:
+        for chunk in encode_rows(rows, columns, format or format_for_path(path)):
+            target.write(chunk)
@@ -0,0 +1,131 @@
+from typing import List, Dict, Any, Optional
+from app.core.config import (
+    REDIS_URL, REDIS_SOCKET_TIMEOUT, FAIL_FAST_CRITICAL_SEVERITY,
+    SPRT_ACCEPTABLE_REGRESSION_RATE, SPRT_FAILING_REGRESSION_RATE, SPRT_ALPHA, SPRT_BETA, SPRT_MIN_CASES
+)
+from app.services.judge_budget import UNJUDGED_CHANGE_TYPES
+from app.services.redis_breaker import RedisCircuitBreaker
+import json
+import math
+import redis
+
+SPRT_MODES = ["fail", "both"]  # Stop only once the run fails, or also once it passes
+COUNTERS = ["executed", "judged", "regressions", "critical"]
+# Verdicts that say nothing about the regression rate, left out of the sequential test
+UNTESTED_CHANGE_TYPES = UNJUDGED_CHANGE_TYPES + ("generation_error",)
+
+
+def sprt_log_likelihood_ratio(cases: int, regressions: int, acceptable_rate: float, failing_rate: float) -> float:
+    """Log-likelihood ratio of `regressions` in `cases` at the failing against the acceptable regression rate"""
+    return (regressions * math.log(failing_rate / acceptable_rate)
+            + (cases - regressions) * math.log((1 - failing_rate) / (1 - acceptable_rate)))
+
+
+def validate_early_stop(stop_after_critical: Optional[int] = None, sprt: Optional[str] = None):
+    """Raise ValueError for fail-fast options that cannot be applied"""
+    if stop_after_critical is not None and stop_after_critical < 1:
+        raise ValueError("stop_after_critical must be at least 1")
+    if sprt is not None and sprt not in SPRT_MODES:
+        raise ValueError(f"sprt must be one of {SPRT_MODES}")
+    if sprt and not 0 < SPRT_ACCEPTABLE_REGRESSION_RATE < SPRT_FAILING_REGRESSION_RATE < 1:
+        raise ValueError("SPRT needs 0 < SPRT_ACCEPTABLE_REGRESSION_RATE < SPRT_FAILING_REGRESSION_RATE < 1")
+
+
+class EarlyStop:
+    """
+    Decides when a run can stop before all of its cases are executed.
+
+    stop_after_critical stops it after that many critical regressions, those with
+    a severity of at least FAIL_FAST_CRITICAL_SEVERITY. sprt runs Wald's sequential
+    probability ratio test on the regression rate: SPRT_ACCEPTABLE_REGRESSION_RATE
+    passes, SPRT_FAILING_REGRESSION_RATE fails, and SPRT_ALPHA and SPRT_BETA bound
+    the chance of a wrong decision either way. "fail" stops once the run is shown
+    to fail and "both" also once it is shown to pass. The test assumes the cases
+    come in random order, so the executor shuffles them when it is on.
+
+    Counts are kept in Redis, so every shard of a run adds to the same test and the
+    first decision stops all of them; while Redis is unreachable a shard decides
+    on its own counts. Only executed cases count, not carried-forward results, and
+    the sequential test only counts judged ones: heuristic and over-budget
+    verdicts are never regressions, so counting them would push it toward a pass.
+    """
+
+    def __init__(self, test_run_id: int, stop_after_critical: Optional[int] = None, sprt: Optional[str] = None,
+                 redis_client=None):
+        validate_early_stop(stop_after_critical, sprt)
+        self.stop_after_critical = stop_after_critical
+        self.sprt = sprt
+        self.key = f"canary:early_stop:run:{test_run_id}"
+        self.counters = {counter: 0 for counter in COUNTERS}
+        self.decision: Optional[Dict[str, Any]] = None
+        self._breaker = RedisCircuitBreaker("Early stop", "deciding on this process's counts only")
+        self.redis_client = None
+        if self.enabled:
+            self.redis_client = redis_client or redis.from_url(
+                REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.stop_after_critical or self.sprt)
+
+    def observe(self, evaluations: List[Dict[str, Any]]) -> bool:
+        """Count a chunk of verdicts and return whether the run should stop"""
+        if not self.enabled:
+            return False
+        judged = [evaluation for evaluation in evaluations if evaluation["change_type"] not in UNTESTED_CHANGE_TYPES]
+        added = {
+            "executed": len(evaluations),
+            "judged": len(judged),
+            "regressions": sum(1 for evaluation in judged if evaluation["is_regression"]),
+            "critical": sum(
+                1 for evaluation in evaluations
+                if evaluation["is_regression"] and evaluation["severity_score"] >= FAIL_FAST_CRITICAL_SEVERITY
+            )
+        }
+        for counter, count in added.items():
+            self.counters[counter] += count
+        if self.decision:
+            return True
+
+        shared = self._call_redis(lambda: self._add_shared(added))
+        totals, decision = shared if shared else (dict(self.counters), None)
+        if decision is None:
+            decision = self._decide(totals)
+            if decision:
+                self._call_redis(lambda: self.redis_client.hsetnx(self.key, "decision", json.dumps(decision)))
+        if decision:
+            self.decision = decision
+        return self.decision is not None
+
+    def stats(self) -> Dict[str, Any]:
+        """This process's counters, so shard summaries add up, and the decision if there is one"""
+        return dict(self.counters, stopped=self.decision is not None, **(self.decision or {}))
+
+    def _decide(self, totals: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        if self.stop_after_critical and totals["critical"] >= self.stop_after_critical:
+            return {"outcome": "fail", "reason": "critical_regressions"}
+        if self.sprt and totals["judged"] >= SPRT_MIN_CASES:
+            ratio = sprt_log_likelihood_ratio(
+                totals["judged"], totals["regressions"], SPRT_ACCEPTABLE_REGRESSION_RATE, SPRT_FAILING_REGRESSION_RATE
+            )
+            if ratio >= math.log((1 - SPRT_BETA) / SPRT_ALPHA):
+                return {"outcome": "fail", "reason": "sprt"}
+            if self.sprt == "both" and ratio <= math.log(SPRT_BETA / (1 - SPRT_ALPHA)):
+                return {"outcome": "pass", "reason": "sprt"}
+        return None
+
+    def _add_shared(self, added: Dict[str, int]):
+        """Add to the run's shared counts and return the totals and any decision already made"""
+        pipeline = self.redis_client.pipeline()
+        for counter in COUNTERS:
+            pipeline.hincrby(self.key, counter, added[counter])
+        pipeline.hget(self.key, "decision")
+        pipeline.expire(self.key, 7 * 86400)
+        values = pipeline.execute()
+        totals = dict(zip(COUNTERS, (int(value) for value in values[:len(COUNTERS)])))
+        decision = values[len(COUNTERS)]
+        return totals, json.loads(decision) if decision else None
+
+    def _call_redis(self, operation):
+        return self._breaker.call(operation)
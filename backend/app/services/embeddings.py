@@ -0,0 +1,85 @@
+from typing import List, Dict, Optional, Iterable
+from app.core.config import EMBEDDING_DIMS
+from app.models.text_embedding import TextEmbedding
+from app.services.content_blobs import load_texts
+from app.services.prejudge import NGRAM_SIZE, hashed_ngram_vectors, normalize_text
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import datetime
+import numpy as np
+
+# Stored vectors of any other model or size are recomputed on their next use
+EMBEDDING_MODEL = f"hashed-char{NGRAM_SIZE}-signed-{EMBEDDING_DIMS}"
+CHUNK_SIZE = 1000
+
+
+def embed_texts(texts: Iterable[str]) -> np.ndarray:
+    """
+    Unit-length embeddings of normalized texts, one row each: signed hashed
+    character n-gram counts, so no model has to be downloaded or fitted. They
+    capture shared wording rather than meaning, which is what near-identical
+    prompts and regressions with the same judge explanation have in common.
+    """
+    return hashed_ngram_vectors((normalize_text(text) for text in texts), dims=EMBEDDING_DIMS, signed=True)
+
+
+def _encode(vector: np.ndarray) -> bytes:
+    return vector.astype("<f2").tobytes()
+
+
+def _decode(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<f2").astype(np.float32)
+
+
+def get_embeddings(db: Session, hashes: List[Optional[str]], texts: Optional[Dict[str, str]] = None) -> np.ndarray:
+    """
+    Embeddings of the texts with the given content hashes, one row per hash in order.
+
+    Stored embeddings are read from text_embeddings; the others are computed from
+    `texts`, or from the content blobs for hashes not in it, then stored and
+    committed. Rows for None or unknown hashes are zero.
+    """
+    wanted = list(dict.fromkeys(key for key in hashes if key))
+    found: Dict[str, np.ndarray] = {}
+    for start in range(0, len(wanted), CHUNK_SIZE):
+        found.update((row.hash, _decode(row.vector)) for row in db.execute(
+            select(TextEmbedding.hash, TextEmbedding.vector).where(
+                TextEmbedding.hash.in_(wanted[start:start + CHUNK_SIZE]), TextEmbedding.model == EMBEDDING_MODEL
+            )
+        ))
+
+    missing = [key for key in wanted if key not in found]
+    known = {key: texts[key] for key in missing if texts and key in texts}
+    known.update(load_texts(db, [key for key in missing if key not in known]))
+    missing = [key for key in missing if key in known]
+    if missing:
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        for start in range(0, len(missing), CHUNK_SIZE):
+            chunk = missing[start:start + CHUNK_SIZE]
+            rows = [
+                {"hash": key, "model": EMBEDDING_MODEL, "vector": _encode(vector)}
+                for key, vector in zip(chunk, embed_texts(known[key] for key in chunk))
+            ]
+            statement = dialect.insert(TextEmbedding)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=["hash"],
+                set_={"model": statement.excluded.model, "vector": statement.excluded.vector, "created_at": func.now()}
+            ), rows)
+            db.commit()
+            # Read back through float16 like stored vectors, so results do not depend on the cache state
+            found.update((row["hash"], _decode(row["vector"])) for row in rows)
+        print(f"Computed {len(missing)} text embeddings")
+
+    matrix = np.zeros((len(hashes), EMBEDDING_DIMS), dtype=np.float32)
+    for index, key in enumerate(hashes):
+        if key in found:
+            matrix[index] = found[key]
+    return matrix
+
+
+def prune_embeddings(db: Session, before: datetime) -> int:
+    """Delete embeddings created before `before`; they are recomputed when needed again"""
+    deleted = db.query(TextEmbedding).filter(TextEmbedding.created_at < before).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,230 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import (
+    REDIS_URL, REDIS_SOCKET_TIMEOUT, JUDGE_MODEL, JUDGE_COST_PER_1K_TOKENS,
+    JUDGE_ECONOMY_MODEL, JUDGE_ECONOMY_COST_PER_1K_TOKENS, JUDGE_ECONOMY_BELOW, MAX_COST_PER_RUN, MAX_COST_PER_DAY,
+    JUDGE_PRIORITY_CATEGORIES, JUDGE_PRIORITY_HISTORY_DAYS
+)
+from app.models.test_result import TestResult
+from app.services.redis_breaker import RedisCircuitBreaker
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+import math
+import redis
+import threading
+
+# Judge tiers, best first. "heuristic" needs no judge call: the verdict is estimated
+# locally from the case's accepted baseline (see PreJudge.estimate).
+JUDGE_TIERS = {
+    "primary": {"model": JUDGE_MODEL, "cost_per_1k_tokens": JUDGE_COST_PER_1K_TOKENS},
+    "economy": {"model": JUDGE_ECONOMY_MODEL, "cost_per_1k_tokens": JUDGE_ECONOMY_COST_PER_1K_TOKENS},
+}
+HEURISTIC_TIER = "heuristic"
+UNJUDGED_CHANGE_TYPES = ("heuristic_estimate", "budget_exceeded")  # Verdicts of the heuristic tier
+
+CHARS_PER_TOKEN = 4
+PROMPT_OVERHEAD_TOKENS = 250  # Instructions and JSON template of one judge request
+VERDICT_TOKENS = 80  # Response tokens per judged case
+
+
+def available_tiers() -> List[str]:
+    return [tier for tier, settings in JUDGE_TIERS.items() if settings["model"]]
+
+
+def estimate_judge_tokens(items: List[Dict[str, str]], batch_size: int = 1) -> int:
+    """Estimated prompt plus response tokens for judging `items` in requests of `batch_size`"""
+    text = sum(len(item["prompt"]) + len(item["expected_behavior"]) + len(item["actual_output"] or "")
+               for item in items)
+    requests = math.ceil(len(items) / max(1, batch_size))
+    return text // CHARS_PER_TOKEN + requests * PROMPT_OVERHEAD_TOKENS + len(items) * VERDICT_TOKENS
+
+
+def judge_cost(tokens: int, tier: str = "primary") -> float:
+    return tokens * JUDGE_TIERS[tier]["cost_per_1k_tokens"] / 1000
+
+
+def budget_is_limited(run_limit: Optional[float] = None) -> bool:
+    """Whether a run with `run_limit`, MAX_COST_PER_RUN when None, has a judge budget that can run out"""
+    return bool((MAX_COST_PER_RUN if run_limit is None else run_limit) or MAX_COST_PER_DAY)
+
+
+class JudgeBudget:
+    """
+    Per-run and per-day limits on judge spend in USD.
+
+    Each judge call reserves its estimated cost before it is sent and is settled
+    with its actual cost afterwards, so concurrent calls cannot overshoot the
+    limit by more than their estimates are off. Spend is kept in Redis, so every
+    shard of a run and every run on the same day share the limits; while Redis is
+    unreachable this process falls back to counting its own spend on top of the
+    day's recorded judge costs.
+
+    choose_tier picks the best tier whose estimate still fits: the economy judge
+    takes over once less than `economy_below` of a budget is left, and cases that
+    fit no tier get a heuristic verdict instead of a judge call.
+    """
+
+    def __init__(self, db: Session, test_run_id: int, run_limit: Optional[float] = None,
+                 daily_limit: Optional[float] = None, economy_below: float = JUDGE_ECONOMY_BELOW,
+                 redis_client=None):
+        self.run_limit = MAX_COST_PER_RUN if run_limit is None else run_limit
+        self.daily_limit = MAX_COST_PER_DAY if daily_limit is None else daily_limit
+        self.economy_below = economy_below
+        self.tiers = available_tiers()
+        day = datetime.now(timezone.utc).date()
+        self.run_key = f"canary:judge_spend:run:{test_run_id}"
+        self.day_key = f"canary:judge_spend:day:{day.isoformat()}"
+        self.counters = {"reserved": 0.0, "spent": 0.0, "refused": 0}
+        self.cases = {tier: 0 for tier in self.tiers + [HEURISTIC_TIER]}
+        self._lock = threading.Lock()
+        self._breaker = RedisCircuitBreaker("Judge budget", "counting this process's spend only")
+        self._local = {"run": 0.0, "day": 0.0}
+        self.redis_client = None
+
+        if self.limited:
+            self.redis_client = redis_client or redis.from_url(
+                REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+            )
+            # Judge costs already recorded today count against the daily limit
+            self._local["day"] = self._recorded_spend(db, day, test_run_id) if self.daily_limit else 0.0
+            self._call_redis(lambda: self.redis_client.set(self.day_key, self._local["day"], nx=True, ex=2 * 86400))
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.run_limit or self.daily_limit)
+
+    def choose_tier(self, costs: Dict[str, float]) -> Tuple[str, float]:
+        """
+        Reserve the best tier for a judge call given each tier's estimated cost.
+        Returns the tier and the amount reserved, to be passed to settle.
+        """
+        tiers = [tier for tier in self.tiers if tier in costs]
+        if not self.limited:
+            return (tiers[0], 0.0) if tiers else (HEURISTIC_TIER, 0.0)
+
+        for tier in tiers:
+            if tier == "primary" and len(tiers) > 1 and self._remaining_fraction(costs[tier]) < self.economy_below:
+                continue
+            if self._reserve(costs[tier]):
+                return tier, costs[tier]
+        with self._lock:
+            self.counters["refused"] += 1
+        return HEURISTIC_TIER, 0.0
+
+    def reserve(self, amount: float) -> bool:
+        """Reserve `amount` if it fits every budget"""
+        if not self.limited:
+            with self._lock:
+                self.counters["reserved"] += amount
+            return True
+        if self._reserve(amount):
+            return True
+        with self._lock:
+            self.counters["refused"] += 1
+        return False
+
+    def settle(self, reserved: float, actual: float):
+        """Replace a reservation with the call's actual cost"""
+        with self._lock:
+            self.counters["reserved"] -= reserved
+            self.counters["spent"] += actual
+        if self.limited and actual != reserved:
+            self._add(actual - reserved)
+
+    def count_cases(self, tier: str, count: int):
+        with self._lock:
+            self.cases[tier] = self.cases.get(tier, 0) + count
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters only, so shard summaries add up"""
+        with self._lock:
+            return dict(
+                {f"{tier}_cases": count for tier, count in self.cases.items()},
+                spent=self.counters["spent"],
+                refused_calls=self.counters["refused"]
+            )
+
+    def _remaining_fraction(self, amount: float) -> float:
+        """The smallest fraction of any budget that would be left after spending `amount`"""
+        run_total, day_total = self._totals()
+        fractions = []
+        if self.run_limit:
+            fractions.append((self.run_limit - run_total - amount) / self.run_limit)
+        if self.daily_limit:
+            fractions.append((self.daily_limit - day_total - amount) / self.daily_limit)
+        return min(fractions)
+
+    def _reserve(self, amount: float) -> bool:
+        run_total, day_total = self._add(amount)
+        if (self.run_limit and run_total > self.run_limit) or (self.daily_limit and day_total > self.daily_limit):
+            self._add(-amount)
+            return False
+        with self._lock:
+            self.counters["reserved"] += amount
+        return True
+
+    def _add(self, amount: float) -> Tuple[float, float]:
+        """Add to the run's and the day's spend and return both new totals"""
+        with self._lock:
+            self._local["run"] += amount
+            self._local["day"] += amount
+            local = (self._local["run"], self._local["day"])
+
+        def increment():
+            pipeline = self.redis_client.pipeline()
+            pipeline.incrbyfloat(self.run_key, amount)
+            pipeline.expire(self.run_key, 7 * 86400)
+            pipeline.incrbyfloat(self.day_key, amount)
+            pipeline.expire(self.day_key, 2 * 86400)
+            run_total, _, day_total, _ = pipeline.execute()
+            return float(run_total), float(day_total)
+
+        return self._call_redis(increment) or local
+
+    def _totals(self) -> Tuple[float, float]:
+        values = self._call_redis(lambda: self.redis_client.mget([self.run_key, self.day_key]))
+        if values:
+            return float(values[0] or 0.0), float(values[1] or 0.0)
+        with self._lock:
+            return self._local["run"], self._local["day"]
+
+    def _call_redis(self, operation):
+        return self._breaker.call(operation)
+
+    def _recorded_spend(self, db: Session, day, test_run_id: int) -> float:
+        start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+        return db.query(func.coalesce(func.sum(TestResult.judge_cost), 0.0)).filter(
+            TestResult.created_at >= start, TestResult.test_run_id != test_run_id
+        ).scalar() or 0.0
+
+
+def regression_rates(db: Session, test_case_ids: List[int], days: int = JUDGE_PRIORITY_HISTORY_DAYS,
+                     chunk_size: int = 1000) -> Dict[int, float]:
+    """Share of each test case's results in the last `days` days that were regressions"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    rates = {}
+    for start in range(0, len(test_case_ids), chunk_size):
+        query = db.query(
+            TestResult.test_case_id,
+            func.avg(case((TestResult.is_regression == True, 1.0), else_=0.0)).label("rate")
+        ).filter(
+            TestResult.test_case_id.in_(test_case_ids[start:start + chunk_size]), TestResult.created_at >= since
+        ).group_by(TestResult.test_case_id)
+        rates.update({row.test_case_id: float(row.rate or 0.0) for row in query})
+    return rates
+
+
+def prioritize(db: Session, test_cases: List[Dict[str, Any]], categories: List[str] = JUDGE_PRIORITY_CATEGORIES,
+               history_days: int = JUDGE_PRIORITY_HISTORY_DAYS) -> List[Dict[str, Any]]:
+    """
+    Order test cases so the likeliest regressions are judged first: priority
+    categories in their configured order, then by recent regression rate.
+    Ties keep their original order.
+    """
+    if len(test_cases) < 2 or not (categories or history_days):
+        return test_cases
+    rank = {category: position for position, category in enumerate(categories)}
+    rates = regression_rates(db, [test_case["id"] for test_case in test_cases], history_days) if history_days else {}
+    return sorted(test_cases, key=lambda test_case: (
+        rank.get(test_case["category"], len(rank)), -rates.get(test_case["id"], 0.0)
+    ))
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from app.core.config import (
+    REDIS_URL, JUDGE_CACHE_MAX_ENTRIES, JUDGE_CACHE_LOCAL_TTL_SECONDS, JUDGE_CACHE_TTL_SECONDS,
+    REDIS_SOCKET_TIMEOUT, REDIS_CIRCUIT_BREAKER_COOLDOWN
+)
+from app.services.metrics import JUDGE_CACHE_EVENTS
+from app.services.redis_breaker import RedisCircuitBreaker
+import json
+import redis
+import threading
+import time
+
+COUNTERS = ["local_hits", "redis_hits", "misses", "redis_calls", "redis_errors", "redis_skipped", "prefetched"]
+
+
+class JudgeCache:
+    """
+    Two-tier cache for judge verdicts: a bounded in-process LRU with a TTL in front of Redis.
+
+    Redis failures open a circuit breaker, and Redis is skipped entirely until the
+    cooldown passes, so an outage costs one failed call instead of one per lookup.
+    """
+
+    def __init__(self, redis_client=None, max_entries: int = JUDGE_CACHE_MAX_ENTRIES,
+                 local_ttl: float = JUDGE_CACHE_LOCAL_TTL_SECONDS, redis_ttl: int = JUDGE_CACHE_TTL_SECONDS,
+                 breaker_cooldown: float = REDIS_CIRCUIT_BREAKER_COOLDOWN):
+        self.redis_client = redis_client or redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self._breaker = RedisCircuitBreaker(
+            "Judge cache", f"skipping it for {breaker_cooldown}s", breaker_cooldown, self._count_redis_error
+        )
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._counters = {name: 0 for name in COUNTERS}
+        self._redis_latency = 0.0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached verdict, checking the local tier before Redis"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get cached verdicts for many keys with at most one Redis MGET"""
+        found = {}
+        remote_keys = []
+        for key in dict.fromkeys(keys):
+            value = self._get_local(key)
+            if value is not None:
+                found[key] = value
+                self._count("local_hits")
+            else:
+                remote_keys.append(key)
+
+        remote_found = self._get_remote(remote_keys)
+        for key, value in remote_found.items():
+            self._set_local(key, value)
+            found[key] = dict(value)
+
+        self._count("redis_hits", len(remote_found))
+        self._count("misses", len(remote_keys) - len(remote_found))
+        return found
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a verdict in both tiers"""
+        self._set_local(key, value)
+        if self._redis_available():
+            self._call_redis(lambda: self.redis_client.setex(key, self.redis_ttl, json.dumps(value)))
+
+    def prefetch(self, keys: List[str]) -> int:
+        """Load verdicts for keys a run is likely to need into the local tier in one MGET"""
+        with self._lock:
+            missing = [key for key in dict.fromkeys(keys) if key not in self._entries]
+        loaded = self._get_remote(missing)
+        for key, value in loaded.items():
+            self._set_local(key, value)
+        self._count("prefetched", len(loaded))
+        return len(loaded)
+
+    def stats(self, since: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Hit, miss and Redis latency counters, optionally relative to an earlier snapshot"""
+        with self._lock:
+            counters = dict(self._counters)
+            redis_latency = self._redis_latency
+            counters["local_entries"] = len(self._entries)
+
+        if since:
+            for name in COUNTERS:
+                counters[name] -= since.get(name, 0)
+            redis_latency -= since.get("redis_latency_total_ms", 0.0) / 1000
+
+        lookups = counters["local_hits"] + counters["redis_hits"] + counters["misses"]
+        counters["hit_rate"] = (counters["local_hits"] + counters["redis_hits"]) / lookups if lookups else 0.0
+        counters["redis_latency_total_ms"] = redis_latency * 1000
+        counters["redis_latency_avg_ms"] = redis_latency * 1000 / counters["redis_calls"] if counters["redis_calls"] else 0.0
+        counters["circuit_open"] = self._breaker.open
+        return counters
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(value)
+
+    def _set_local(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_remote(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not keys or not self._redis_available():
+            return {}
+        values = self._call_redis(lambda: self.redis_client.mget(keys))
+        if not values:
+            return {}
+
+        found = {}
+        for key, value in zip(keys, values):
+            if value:
+                try:
+                    found[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return found
+
+    def _redis_available(self) -> bool:
+        if not self._breaker.open:
+            return True
+        self._count("redis_skipped")
+        return False
+
+    def _call_redis(self, operation):
+        started = time.perf_counter()
+        try:
+            return self._breaker.call(operation)
+        finally:
+            with self._lock:
+                self._counters["redis_calls"] += 1
+                self._redis_latency += time.perf_counter() - started
+
+    def _count_redis_error(self, error: Exception):
+        self._count("redis_errors")
+        JUDGE_CACHE_EVENTS.labels("redis_errors").inc()
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+        if amount:
+            JUDGE_CACHE_EVENTS.labels(name).inc(amount)
+
+
+_judge_cache: Optional[JudgeCache] = None
+_judge_cache_lock = threading.Lock()
+
+
+def get_judge_cache() -> JudgeCache:
+    """Process-wide judge cache, shared so warm entries survive between runs"""
+    global _judge_cache
+    with _judge_cache_lock:
+        if _judge_cache is None:
+            _judge_cache = JudgeCache()
+        return _judge_cache
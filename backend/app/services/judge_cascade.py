@@ -0,0 +1,153 @@
+from typing import Dict, Any, List, Optional
+from app.core.config import (
+    JUDGE_CASCADE, JUDGE_ESCALATE_SEVERITY_MIN, JUDGE_ESCALATE_SEVERITY_MAX, JUDGE_ESCALATE_CHANGE_TYPES
+)
+from app.services.judge_budget import (
+    JudgeBudget, HEURISTIC_TIER, JUDGE_TIERS, available_tiers, estimate_judge_tokens, judge_cost
+)
+from app.services.judge_service import JudgeService
+from app.services.metrics import JUDGE_CASCADE_DECISIONS, JUDGE_TIER_CASES
+from app.services.prejudge import PreJudge, same_facts
+import time
+
+
+def trace_entry(stage: str, verdict: Dict[str, Any], decision: str, seconds: float = 0.0) -> Dict[str, Any]:
+    """One judge_trace step: what a stage decided about a case and what it cost"""
+    return {
+        "stage": stage,
+        "model": JUDGE_TIERS[stage]["model"] if stage in JUDGE_TIERS else None,
+        "severity_score": verdict.get("severity_score"),
+        "change_type": verdict.get("change_type"),
+        "cached": verdict.get("cached", False),
+        "cost": verdict.get("judge_cost", 0.0),
+        "seconds": seconds,
+        "decision": decision
+    }
+
+
+class JudgeCascade:
+    """
+    Judges a chunk of cases in stages, cheapest first, sending only unsettled
+    verdicts on to the next stage.
+
+    A verdict is unsettled when its severity falls inside the uncertainty band or
+    its change type is high-stakes, e.g. safety_issue; the last stage's verdicts
+    are final. The "heuristic" stage compares outputs with their accepted
+    baselines and can only clear a case, never fail it: outputs that are not
+    clearly close to their baseline always reach a judge model. Every stage is
+    recorded in the verdict's judge_trace, and the verdict's judge_cost is the
+    sum over its stages.
+    """
+
+    def __init__(self, judge_service: JudgeService, stages: Optional[List[str]] = None,
+                 severity_min: float = JUDGE_ESCALATE_SEVERITY_MIN, severity_max: float = JUDGE_ESCALATE_SEVERITY_MAX,
+                 high_stakes: Optional[List[str]] = None):
+        self.judge_service = judge_service
+        configured = JUDGE_CASCADE if stages is None else stages
+        tiers = available_tiers()
+        # Tiers without a model configured are left out
+        self.stages = [stage for stage in configured if stage == HEURISTIC_TIER or stage in tiers]
+        if self.stages and self.stages[-1] == HEURISTIC_TIER:
+            self.stages.append(tiers[0])
+        self.severity_min = severity_min
+        self.severity_max = severity_max
+        self.high_stakes = set(JUDGE_ESCALATE_CHANGE_TYPES if high_stakes is None else high_stakes)
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.stages) > 1
+
+    def is_settled(self, verdict: Dict[str, Any]) -> bool:
+        return (
+            not self.severity_min <= verdict["severity_score"] <= self.severity_max
+            and verdict["change_type"] not in self.high_stakes
+            and verdict["change_type"] != "evaluation_error"
+        )
+
+    def judge(self, cases: List[Dict[str, Any]], judge_batch_size: int, budget: JudgeBudget,
+              prejudge: PreJudge) -> List[Dict[str, Any]]:
+        """Verdicts for `cases` in order, each with its judge_trace, timings and total judge_cost"""
+        verdicts: List[Optional[Dict[str, Any]]] = [None] * len(cases)
+        best: List[Optional[Dict[str, Any]]] = [None] * len(cases)
+        traces: List[List[Dict[str, Any]]] = [[] for _ in cases]
+        timings = [{"cache_lookup": 0.0, "judge": 0.0} for _ in cases]
+        pending = list(range(len(cases)))
+
+        for position, stage in enumerate(self.stages):
+            if not pending:
+                break
+            final = position == len(self.stages) - 1
+            escalated = []
+
+            if stage == HEURISTIC_TIER:
+                estimates = prejudge.estimate([cases[index]["test_case_id"] for index in pending],
+                                              [cases[index]["actual_output"] for index in pending])
+                for index, estimate in zip(pending, estimates):
+                    baseline = prejudge.baselines.get(cases[index]["test_case_id"])
+                    clear = (estimate["change_type"] == "heuristic_estimate"
+                             and estimate["severity_score"] < self.severity_min
+                             and same_facts(cases[index]["actual_output"], baseline["output"]))
+                    self._decide(stage, index, estimate, clear, verdicts, traces, escalated)
+                budget.count_cases(stage, len(pending))
+                JUDGE_TIER_CASES.labels(stage).inc(len(pending))
+                pending = escalated
+                continue
+
+            items = [cases[index] for index in pending]
+            reserved = judge_cost(estimate_judge_tokens(items, judge_batch_size), stage)
+            if not budget.reserve(reserved):
+                # Out of budget: keep the best verdict so far, or estimate one
+                for index in pending:
+                    verdict = best[index] or prejudge.estimate(
+                        [cases[index]["test_case_id"]], [cases[index]["actual_output"]]
+                    )[0]
+                    traces[index].append(trace_entry(stage, {}, "skipped_budget"))
+                    JUDGE_CASCADE_DECISIONS.labels(stage, "skipped_budget").inc()
+                    verdicts[index] = verdict
+                budget.count_cases(HEURISTIC_TIER, len(pending))
+                pending = []
+                break
+
+            started = time.perf_counter()
+            if len(items) == 1:
+                results = [self.judge_service.evaluate_diff(
+                    items[0]["prompt"], items[0]["expected_behavior"], items[0]["actual_output"], stage
+                )]
+            else:
+                results = self.judge_service.evaluate_diffs_batch(items, judge_batch_size, stage)
+            seconds = time.perf_counter() - started
+            budget.settle(reserved, sum(result.get("judge_cost", 0.0) for result in results))
+            budget.count_cases(stage, len(items))
+            JUDGE_TIER_CASES.labels(stage).inc(len(items))
+
+            for index, result in zip(pending, results):
+                for name, value in result.pop("timings", {}).items():
+                    timings[index][name] = timings[index].get(name, 0.0) + value
+                # A cached verdict from a later stage needs no further confirmation
+                settled = final or self.is_settled(result) or self._from_later_stage(result, position)
+                self._decide(stage, index, result, settled, verdicts, traces, escalated, seconds)
+                best[index] = result
+            pending = escalated
+
+        for index, verdict in enumerate(verdicts):
+            verdict = dict(verdict)
+            verdict["judge_cost"] = sum(entry["cost"] for entry in traces[index])
+            verdict["judge_trace"] = traces[index]
+            verdict["timings"] = timings[index]
+            verdicts[index] = verdict
+        return verdicts
+
+    def _decide(self, stage: str, index: int, verdict: Dict[str, Any], settled: bool,
+                verdicts: List[Optional[Dict[str, Any]]], traces: List[List[Dict[str, Any]]],
+                escalated: List[int], seconds: float = 0.0):
+        decision = "accept" if settled else "escalate"
+        traces[index].append(trace_entry(stage, verdict, decision, seconds))
+        JUDGE_CASCADE_DECISIONS.labels(stage, decision).inc()
+        if settled:
+            verdicts[index] = verdict
+        else:
+            escalated.append(index)
+
+    def _from_later_stage(self, verdict: Dict[str, Any], position: int) -> bool:
+        tier = verdict.get("judge_tier")
+        return tier in self.stages and self.stages.index(tier) > position
@@ -1,48 +1,78 @@
-import openai
-from app.core.config import OPENAI_API_KEY
-import json
-from typing import Dict, Any
+from app.core.config import JUDGE_BATCH_SIZE, JUDGE_BASE_URL
+from app.services.judge_budget import JUDGE_TIERS, judge_cost
+from app.services.judge_cache import get_judge_cache
+from app.services.llm_clients import get_openai_client, get_rate_limiter, call_with_retries
+from app.services.metrics import JUDGE_REQUESTS, JUDGE_TOKENS, JUDGE_COST
+from typing import Dict, Any, List, Optional, Tuple
 import hashlib
-import redis
 import json
+import time
+
+SEVERITY_LABELS = ["none", "low", "medium", "high", "critical"]
+CHANGE_TYPES = ["factual_error", "style_change", "refusal", "hallucination", "safety_issue", "format_change",
+                "content_omission", "content_addition"]
+
+JUDGE_SYSTEM_PROMPT = "You are a precise AI evaluation judge. Always respond with valid JSON."
 
 
 class JudgeService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        self.redis_client = redis.from_url("redis://localhost:6379/0")
+        self.client = get_openai_client(JUDGE_BASE_URL)
+        self.rate_limiter = get_rate_limiter("judge")
+        self.cache = get_judge_cache()
 
     def _get_cache_key(self, prompt: str, expected: str, actual: str) -> str:
         """Generate cache key for identical diffs"""
         content = f"{prompt}|{expected}|{actual}"
         return hashlib.md5(content.encode()).hexdigest()
 
-    def _get_cached_result(self, cache_key: str) -> Dict[str, Any]:
-        """Get cached judge result"""
-        try:
-            cached = self.redis_client.get(cache_key)
-            if cached:
-                return json.loads(cached)
-        except Exception:
-            pass
-        return None
+    def _tier_cache_key(self, cache_key: str, tier: str) -> str:
+        """Cheaper tiers cache their verdicts apart, so they never stand in for the primary judge"""
+        return cache_key if tier == "primary" else f"{cache_key}:{tier}"
+
+    def _get_cached_result(self, cache_key: str, tier: str = "primary") -> Optional[Dict[str, Any]]:
+        """Get cached judge result; a lower tier also accepts the primary judge's verdict"""
+        keys = list(dict.fromkeys([cache_key, self._tier_cache_key(cache_key, tier)]))
+        found = self.cache.get_many(keys)
+        return next((found[key] for key in keys if key in found), None)
 
     def _set_cached_result(self, cache_key: str, result: Dict[str, Any]):
-        """Cache judge result for 24 hours"""
-        try:
-            self.redis_client.setex(cache_key, 86400, json.dumps(result))
-        except Exception:
-            pass
+        """Cache judge result (24 hours in Redis)"""
+        self.cache.set(cache_key, result)
+
+    def prefetch_cached_results(self, cache_keys: List[str]) -> int:
+        """Warm the local cache tier with one Redis round-trip before a run"""
+        return self.cache.prefetch(cache_keys)
+
+    def _is_valid_evaluation(self, result: Any) -> bool:
+        """Check that a judge verdict has every field with a usable value"""
+        if not isinstance(result, dict):
+            return False
+        score = result.get("severity_score")
+        return (
+            isinstance(score, (int, float)) and not isinstance(score, bool) and 0 <= score <= 1
+            and result.get("severity_label") in SEVERITY_LABELS
+            and isinstance(result.get("change_type"), str)
+            and isinstance(result.get("reasoning"), str)
+            and isinstance(result.get("is_regression"), bool)
+        )
 
-    def evaluate_diff(self, prompt: str, expected_behavior: str, actual_output: str) -> Dict[str, Any]:
+    def evaluate_diff(self, prompt: str, expected_behavior: str, actual_output: str,
+                      tier: str = "primary") -> Dict[str, Any]:
         """
-        Evaluate the semantic difference between expected and actual outputs
+        Evaluate the semantic difference between expected and actual outputs with the
+        judge model of `tier` (see JUDGE_TIERS). The verdict's "timings" hold the
+        seconds spent on the cache lookup and the judge.
         """
         # Check cache first
         cache_key = self._get_cache_key(prompt, expected_behavior, actual_output)
-        cached_result = self._get_cached_result(cache_key)
+        started = time.perf_counter()
+        cached_result = self._get_cached_result(cache_key, tier)
+        lookup_seconds = time.perf_counter() - started
         if cached_result:
             cached_result["cached"] = True
+            cached_result["judge_cost"] = 0.0
+            cached_result["timings"] = {"cache_lookup": lookup_seconds}
             return cached_result
 
         # AI evaluation prompt
@@ -58,49 +88,221 @@ class JudgeService:
         Analyze the difference and provide:
         1. severity_score: 0-1 (0=no issue, 1=critical regression)
         2. severity_label: "none", "low", "medium", "high", "critical"
-        3. change_type: one of ["factual_error", "style_change", "refusal", "hallucination", "safety_issue", "format_change", "content_omission", "content_addition"]
+        3. change_type: one of {json.dumps(CHANGE_TYPES)}
         4. reasoning: brief explanation of the issue
         5. is_regression: true/false
 
         Respond with JSON only:
         {{
             "severity_score": 0.8,
-            "severity_label": "high", 
+            "severity_label": "high",
             "change_type": "factual_error",
             "reasoning": "The response contains factual inaccuracies",
             "is_regression": true
         }}
         """
 
+        started = time.perf_counter()
+        cost = 0.0
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system",
-                     "content": "You are a precise AI evaluation judge. Always respond with valid JSON."},
-                    {"role": "user", "content": evaluation_prompt}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
+            response = self._complete(evaluation_prompt, "single", tier)
+            cost = self._response_cost(response, tier)
 
             result = json.loads(response.choices[0].message.content)
             result["cached"] = False
-            result["judge_cost"] = response.usage.total_tokens * 0.000002  # Approximate cost
+            result["judge_cost"] = cost
+            result["judge_tier"] = tier
 
             # Cache the result
-            self._set_cached_result(cache_key, result)
+            self._set_cached_result(self._tier_cache_key(cache_key, tier), result)
+
+        except Exception as e:
+            # Fallback evaluation, still charged for a response that could not be parsed
+            result = self._fallback_evaluation(e)
+            result["judge_cost"] = cost
+
+        result["timings"] = {"cache_lookup": lookup_seconds, "judge": time.perf_counter() - started}
+        return result
+
+    def evaluate_diffs_batch(self, items: List[Dict[str, str]], batch_size: Optional[int] = None,
+                             tier: str = "primary") -> List[Dict[str, Any]]:
+        """
+        Evaluate many diffs, packing up to batch_size of them into each judge request.
+
+        Each item needs prompt, expected_behavior and actual_output keys. Results come
+        back in item order. Cached items never reach the judge, and any item whose
+        verdict is missing or malformed is retried on its own through evaluate_diff.
+        """
+        batch_size = batch_size or JUDGE_BATCH_SIZE
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        started = time.perf_counter()
+
+        # Identical diffs in one call share a single verdict
+        cache_keys = [
+            self._get_cache_key(item["prompt"], item["expected_behavior"], item["actual_output"])
+            for item in items
+        ]
+        tier_keys = {self._tier_cache_key(cache_key, tier): cache_key for cache_key in cache_keys}
+        cached_results = self.cache.get_many(list(dict.fromkeys(cache_keys + list(tier_keys))))
+        for tier_key, cache_key in tier_keys.items():
+            if tier_key in cached_results and cache_key not in cached_results:
+                cached_results[cache_key] = cached_results[tier_key]
+        lookup_seconds = time.perf_counter() - started
+
+        pending: Dict[str, List[int]] = {}
+        for index, cache_key in enumerate(cache_keys):
+            if cache_key in cached_results:
+                results[index] = dict(cached_results[cache_key], cached=True, judge_cost=0.0,
+                                      timings={"cache_lookup": lookup_seconds})
+            else:
+                pending.setdefault(cache_key, []).append(index)
+
+        # Every item waits for its whole batch request, and for its retry if it needs one; a retried
+        # item is also charged its share of the batch request that did not return its verdict
+        judge_seconds = dict.fromkeys(pending, 0.0)
+        batch_costs = dict.fromkeys(pending, 0.0)
+
+        retry_keys = []
+        pending_keys = list(pending)
+        for start in range(0, len(pending_keys), batch_size):
+            chunk = pending_keys[start:start + batch_size]
+            if len(chunk) == 1:
+                retry_keys.extend(chunk)
+                continue
+
+            batch_started = time.perf_counter()
+            verdicts, cost = self._judge_batch(chunk, {key: items[pending[key][0]] for key in chunk}, tier)
+            batch_seconds = time.perf_counter() - batch_started
+            for cache_key in chunk:
+                judge_seconds[cache_key] += batch_seconds
+                batch_costs[cache_key] += cost / len(chunk)
+                verdict = verdicts.get(cache_key)
+                if verdict is None:
+                    retry_keys.append(cache_key)
+                    continue
+                self._set_cached_result(self._tier_cache_key(cache_key, tier), verdict)
+                timings = {"cache_lookup": lookup_seconds, "judge": judge_seconds[cache_key]}
+                self._share_verdict(results, pending[cache_key], verdict, timings, batch_costs[cache_key])
 
-            return result
+        for cache_key in retry_keys:
+            item = items[pending[cache_key][0]]
+            verdict = self.evaluate_diff(item["prompt"], item["expected_behavior"], item["actual_output"], tier)
+            timings = {
+                "cache_lookup": lookup_seconds + verdict["timings"]["cache_lookup"],
+                "judge": judge_seconds[cache_key] + verdict["timings"].get("judge", 0.0)
+            }
+            self._share_verdict(results, pending[cache_key], verdict, timings,
+                                batch_costs[cache_key] + verdict["judge_cost"])
 
+        return results
+
+    def _share_verdict(self, results: List[Optional[Dict[str, Any]]], indices: List[int], verdict: Dict[str, Any],
+                       timings: Dict[str, float], cost: float):
+        """Give identical diffs one verdict; the first is charged the judge cost and the others nothing"""
+        for position, index in enumerate(indices):
+            results[index] = dict(verdict, timings=timings, judge_cost=cost if position == 0 else 0.0)
+
+    def _judge_batch(self, cache_keys: List[str], items: Dict[str, Dict[str, str]],
+                     tier: str = "primary") -> Tuple[Dict[str, Dict[str, Any]], float]:
+        """
+        Send several diffs in one judge request and return the valid verdicts by cache
+        key with the request's cost, which is spent even when no verdict is usable
+        """
+        # A short prefix of the cache key is enough to tie each verdict back to its input
+        ids = {cache_key[:12]: cache_key for cache_key in cache_keys}
+        cases = [
+            {
+                "id": case_id,
+                "prompt": items[cache_key]["prompt"],
+                "expected_behavior": items[cache_key]["expected_behavior"],
+                "actual_output": items[cache_key]["actual_output"]
+            }
+            for case_id, cache_key in ids.items()
+        ]
+
+        evaluation_prompt = f"""
+        You are an AI quality assurance judge. Evaluate each of the cases below independently.
+        Every case has an id, a PROMPT, the EXPECTED BEHAVIOR and the ACTUAL OUTPUT.
+
+        For each case analyze the difference and provide:
+        1. id: the case id, copied exactly
+        2. severity_score: 0-1 (0=no issue, 1=critical regression)
+        3. severity_label: "none", "low", "medium", "high", "critical"
+        4. change_type: one of {json.dumps(CHANGE_TYPES)}
+        5. reasoning: brief explanation of the issue
+        6. is_regression: true/false
+
+        Respond with JSON only, one entry per case:
+        {{
+            "results": [
+                {{
+                    "id": "{cases[0]['id']}",
+                    "severity_score": 0.8,
+                    "severity_label": "high",
+                    "change_type": "factual_error",
+                    "reasoning": "The response contains factual inaccuracies",
+                    "is_regression": true
+                }}
+            ]
+        }}
+
+        CASES:
+        {json.dumps(cases)}
+        """
+
+        cost = 0.0
+        try:
+            response = self._complete(evaluation_prompt, "batch", tier)
+            cost = self._response_cost(response, tier)
+            entries = json.loads(response.choices[0].message.content).get("results")
         except Exception as e:
-            # Fallback evaluation
-            return {
-                "severity_score": 0.5,
-                "severity_label": "medium",
-                "change_type": "evaluation_error",
-                "reasoning": f"Judge evaluation failed: {str(e)}",
-                "is_regression": False,
-                "cached": False,
-                "judge_cost": 0.0
-            }
\ No newline at end of file
+            print(f"Batch judge evaluation failed, retrying {len(cache_keys)} items individually: {str(e)}")
+            return {}, cost
+
+        verdicts = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            entry_id = entry.pop("id", None)
+            # Ids of any other type cannot match, and lists or dicts would not even hash; those cases are retried
+            cache_key = ids.get(entry_id) if isinstance(entry_id, str) else None
+            if cache_key and cache_key not in verdicts and self._is_valid_evaluation(entry):
+                verdicts[cache_key] = entry
+
+        # The caller splits the cost over every item of the batch, retried ones included
+        for verdict in verdicts.values():
+            verdict["cached"] = False
+            verdict["judge_tier"] = tier
+
+        return verdicts, cost
+
+    def _complete(self, evaluation_prompt: str, kind: str, tier: str = "primary"):
+        """Send a single or batch judge request, throttled and retried through the shared client pool"""
+        response = call_with_retries(lambda: self.client.chat.completions.create(
+            model=JUDGE_TIERS[tier]["model"],
+            messages=[
+                {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+                {"role": "user", "content": evaluation_prompt}
+            ],
+            temperature=0.1,
+            response_format={"type": "json_object"}
+        ), self.rate_limiter)
+        JUDGE_REQUESTS.labels(kind, tier).inc()
+        if response.usage:
+            JUDGE_TOKENS.labels(tier).inc(response.usage.total_tokens)
+            JUDGE_COST.labels(tier).inc(judge_cost(response.usage.total_tokens, tier))
+        return response
+
+    def _response_cost(self, response, tier: str) -> float:
+        return judge_cost(response.usage.total_tokens, tier) if response.usage else 0.0
+
+    def _fallback_evaluation(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "severity_score": 0.5,
+            "severity_label": "medium",
+            "change_type": "evaluation_error",
+            "reasoning": f"Judge evaluation failed: {str(error)}",
+            "is_regression": False,
+            "cached": False,
+            "judge_cost": 0.0
+        }
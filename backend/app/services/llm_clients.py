@@ -0,0 +1,182 @@
+from typing import Dict, Any, Callable, Optional, Tuple, TypeVar
+from app.core.config import (
+    OPENAI_API_KEY, LLM_HTTP2, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS,
+    LLM_RATE_LIMIT_RPS, LLM_RATE_LIMIT_MIN_RPS, LLM_RATE_LIMIT_MAX_RPS
+)
+from app.services.metrics import LLM_REQUESTS, LLM_RATE_LIMIT
+import httpx
+import openai
+import random
+import threading
+import time
+
+T = TypeVar("T")
+
+# Errors worth another attempt; anything else (bad request, auth) fails straight away
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                    openai.InternalServerError)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to the provider's limit (AIMD).
+
+    Successes raise the rate by about `increase` requests/s each second; a 429 cuts
+    it by the `decrease` factor and pauses every caller for the Retry-After period,
+    so a burst converges on the rate the provider accepts instead of retrying in
+    lockstep. Requests already in flight when the limit is hit fail together, so
+    the rate is cut at most once per second.
+    """
+
+    def __init__(self, rate: float = LLM_RATE_LIMIT_RPS, min_rate: float = LLM_RATE_LIMIT_MIN_RPS,
+                 max_rate: float = LLM_RATE_LIMIT_MAX_RPS, increase: float = 1.0, decrease: float = 0.7,
+                 name: str = "default"):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.capacity = max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"acquired": 0, "throttled": 0, "rate_limited": 0, "wait_seconds": 0.0}
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.counters["acquired"] += 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+                self.counters["throttled"] += 1
+                self.counters["wait_seconds"] += wait
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            self.capacity = max(1.0, self.rate)
+        LLM_RATE_LIMIT.labels(self.name).set(self.rate)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self.counters["rate_limited"] += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._last_decrease < 1.0:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.capacity = max(1.0, self.rate)
+            self._tokens = min(self._tokens, self.capacity)
+        LLM_RATE_LIMIT.labels(self.name).set(self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, rate=self.rate)
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE_SECONDS, cap: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """Exponential backoff with full jitter, so retrying clients spread out"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def call_with_retries(operation: Callable[[], T], limiter: Optional[AdaptiveRateLimiter] = None,
+                      max_retries: int = LLM_MAX_RETRIES) -> T:
+    """
+    Run an LLM request through the rate limiter, retrying rate limits, timeouts,
+    connection errors and 5xx responses with backoff. The last error is re-raised.
+    """
+    upstream = limiter.name if limiter else "unthrottled"
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            result = operation()
+        except RETRYABLE_ERRORS as e:
+            retry_after = _retry_after(e)
+            if limiter and isinstance(e, openai.RateLimitError):
+                limiter.on_rate_limited(retry_after)
+            if attempt == max_retries:
+                LLM_REQUESTS.labels(upstream, "failed").inc()
+                raise
+            LLM_REQUESTS.labels(upstream, "retried").inc()
+            delay = max(retry_after or 0.0, backoff_delay(attempt))
+            print(f"LLM request failed ({type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+        except Exception:
+            LLM_REQUESTS.labels(upstream, "failed").inc()
+            raise
+        else:
+            LLM_REQUESTS.labels(upstream, "success").inc()
+            if limiter:
+                limiter.on_success()
+            return result
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], openai.OpenAI] = {}
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """A new keep-alive HTTP client with the shared pool settings, HTTP/2 when h2 is installed"""
+    http2 = LLM_HTTP2 and _http2_available()
+    if LLM_HTTP2 and not http2:
+        print("LLM clients: h2 is not installed, falling back to HTTP/1.1 keep-alive")
+    return httpx.Client(
+        http2=http2,
+        timeout=LLM_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS)
+    )
+
+
+def get_openai_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> openai.OpenAI:
+    """
+    Process-wide OpenAI-compatible client per endpoint, so every run reuses its
+    pooled connections. Retries are left to call_with_retries.
+    """
+    key = (base_url, api_key or OPENAI_API_KEY)
+    with _registry_lock:
+        if key not in _clients:
+            _clients[key] = openai.OpenAI(
+                api_key=key[1], base_url=base_url, max_retries=0, http_client=get_http_client()
+            )
+        return _clients[key]
+
+
+def get_rate_limiter(name: str) -> AdaptiveRateLimiter:
+    """Process-wide rate limiter per upstream, e.g. "judge" or a target model"""
+    with _registry_lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveRateLimiter(name=name)
+        return _limiters[name]
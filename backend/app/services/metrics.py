@@ -0,0 +1,83 @@
+from typing import Dict, Any
+from app.core.config import PROMETHEUS_MULTIPROC_DIR
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+
+# Seconds; wide enough for both a cache lookup and a slow streamed generation
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Per test case: generation, prejudge, cache_lookup, judge, queued and test_case (the whole case).
+# db_write is observed once per bulk INSERT.
+STAGE_SECONDS = Histogram(
+    "canary_stage_seconds", "Time spent in each stage of executing a test case", ["stage"], buckets=STAGE_BUCKETS
+)
+TEST_CASES = Counter("canary_test_cases_total", "Test cases executed, by outcome", ["outcome"])
+RESULTS_WRITTEN = Counter("canary_results_written_total", "Test result rows written")
+
+JUDGE_CACHE_EVENTS = Counter(
+    "canary_judge_cache_events_total", "Judge cache local_hits, redis_hits, misses and Redis errors", ["event"]
+)
+JUDGE_CACHE_HIT_RATIO = Gauge(
+    "canary_judge_cache_hit_ratio", "Judge cache hit rate of the last finished run", multiprocess_mode="mostrecent"
+)
+JUDGE_REQUESTS = Counter(
+    "canary_judge_requests_total", "Judge model requests, single or batch, by judge tier", ["kind", "tier"]
+)
+JUDGE_TOKENS = Counter("canary_judge_tokens_total", "Tokens used by the judge model", ["tier"])
+JUDGE_COST = Counter("canary_judge_cost_dollars_total", "Approximate judge model cost", ["tier"])
+JUDGE_TIER_CASES = Counter(
+    "canary_judge_tier_test_cases_total", "Test cases sent to each judge tier by the budget scheduler", ["tier"]
+)
+JUDGE_CASCADE_DECISIONS = Counter(
+    "canary_judge_cascade_decisions_total", "Judge cascade verdicts accepted or escalated, by stage",
+    ["stage", "decision"]
+)
+
+LLM_REQUESTS = Counter(
+    "canary_llm_requests_total", "LLM request attempts by upstream and outcome (success, retried, failed)",
+    ["upstream", "outcome"]
+)
+LLM_RATE_LIMIT = Gauge(
+    "canary_llm_rate_limit_rps", "Current adaptive rate limit per upstream", ["upstream"],
+    multiprocess_mode="mostrecent"
+)
+
+IN_FLIGHT = Gauge(
+    "canary_in_flight_requests", "Target model and judge requests in progress", ["kind"], multiprocess_mode="livesum"
+)
+QUEUED_TEST_CASES = Gauge(
+    "canary_queued_test_cases", "Test cases waiting for an executor slot", multiprocess_mode="livesum"
+)
+RUNS_IN_PROGRESS = Gauge("canary_runs_in_progress", "Test suites being executed", multiprocess_mode="livesum")
+RUN_THROUGHPUT = Gauge(
+    "canary_run_cases_per_second", "Executed test cases per second of the last finished run",
+    multiprocess_mode="mostrecent"
+)
+
+
+def observe_stages(timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def record_run(summary: Dict[str, Any], executed: int, wall_seconds: float):
+    """Export a finished run's throughput and judge cache hit rate"""
+    if executed and wall_seconds:
+        RUN_THROUGHPUT.set(executed / wall_seconds)
+    if summary.get("judge_cache"):
+        JUDGE_CACHE_HIT_RATIO.set(summary["judge_cache"]["hit_rate"])
+
+
+def latest_metrics() -> bytes:
+    """
+    Metrics in the Prometheus text format. With PROMETHEUS_MULTIPROC_DIR set they
+    are aggregated over every process writing to that directory, so the API also
+    reports runs executed by Celery workers on the same host.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
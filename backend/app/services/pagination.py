@@ -0,0 +1,57 @@
+from typing import List, Dict, Any, Callable, Optional, Iterator
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+import json
+
+
+def parse_fields(fields: Optional[str], columns: Dict[str, Any], default: List[str]) -> List[str]:
+    """
+    Turn a comma-separated `fields` parameter into column names, always including
+    "id" since it is the pagination cursor. Raises ValueError for unknown fields.
+    """
+    if not fields:
+        return list(default)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(columns)}")
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
+def keyset_select(statement: Select, id_column: Any, cursor: Optional[int], limit: int,
+                  descending: bool = False) -> Select:
+    """
+    Limit a SELECT to one page of rows after `cursor` in id order.
+
+    The cursor is the last id of the previous page, so every page is an index range
+    scan no matter how deep the client has paged, unlike OFFSET. The statement runs
+    on either a sync or an async session.
+    """
+    if cursor is not None:
+        statement = statement.where(id_column < cursor if descending else id_column > cursor)
+    return statement.order_by(id_column.desc() if descending else id_column).limit(limit)
+
+
+def next_cursor(rows: List[Dict[str, Any]], limit: int) -> Optional[int]:
+    return rows[-1]["id"] if len(rows) == limit else None
+
+
+def iter_keyset(db: Session, statement: Select, id_column: Any, cursor: Optional[int], batch_size: int,
+                descending: bool = False,
+                page: Optional[Callable[[List[Dict[str, Any]]], Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Every row after `cursor`, fetched one keyset page at a time; `page` may update each page in place"""
+    while True:
+        rows = [dict(row) for row in db.execute(
+            keyset_select(statement, id_column, cursor, batch_size, descending)
+        ).mappings()]
+        if page:
+            page(rows)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        cursor = rows[-1]["id"]
+
+
+def ndjson_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
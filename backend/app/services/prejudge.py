@@ -0,0 +1,247 @@
+from typing import List, Dict, Any, Optional, Iterable
+from app.core.config import PREJUDGE_ENABLED, PREJUDGE_SIMILARITY_THRESHOLD, PREJUDGE_VECTOR_DIMS
+from app.models.test_case_baseline import TestCaseBaseline
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import hashlib
+import numpy as np
+import re
+import unicodedata
+import zlib
+
+NGRAM_SIZE = 3
+BASELINE_COLUMNS = ["output", "output_hash", "normalized_hash", "test_run_id"]
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)*")
+_NEGATIONS = re.compile(r"\b(?:no|not|never|none|nothing|cannot)\b|n't\b", re.IGNORECASE)
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, unicode forms, punctuation and whitespace so cosmetic edits compare equal"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode()).hexdigest()
+
+
+def hashed_ngram_vectors(texts: Iterable[str], dims: int = PREJUDGE_VECTOR_DIMS,
+                         ngram_size: int = NGRAM_SIZE, signed: bool = False) -> np.ndarray:
+    """
+    L2-normalized character n-gram count vectors, one row per text.
+
+    N-grams are hashed into `dims` buckets with CRC32, so vectors are stable across
+    processes and need no fitted vocabulary. With signed=True another bit of the
+    hash makes each n-gram count +1 or -1, so colliding n-grams cancel out rather
+    than add up, which keeps small vectors accurate.
+    """
+    rows, columns, signs = [], [], []
+    for row, text in enumerate(texts):
+        padded = f" {text} "
+        for start in range(max(1, len(padded) - ngram_size + 1)):
+            key = zlib.crc32(padded[start:start + ngram_size].encode())
+            rows.append(row)
+            columns.append(key % dims)
+            if signed:
+                signs.append(1.0 if key >> 31 else -1.0)
+
+    row_count = row + 1 if rows else 0
+    vectors = np.zeros((row_count, dims), dtype=np.float32)
+    np.add.at(vectors, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)),
+              np.array(signs, dtype=np.float32) if signed else 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _severity_label(score: float) -> str:
+    for label, upper in (("none", 0.1), ("low", 0.3), ("medium", 0.6), ("high", 0.85)):
+        if score < upper:
+            return label
+    return "critical"
+
+
+def same_facts(output: str, baseline: str) -> bool:
+    return (_NUMBERS.findall(output) == _NUMBERS.findall(baseline)
+            and len(_NEGATIONS.findall(output)) == len(_NEGATIONS.findall(baseline)))
+
+
+class PreJudge:
+    """
+    Classifies outputs that match the last accepted output of their test case
+    without calling the judge model.
+
+    Checks run cheapest first: exact hash, normalized-text hash, then character
+    n-gram cosine similarity computed for the whole batch at once. A similar
+    output only counts as unchanged if it has the same numbers and negations,
+    since a changed digit or an added "not" is a small edit that can still be
+    a real regression.
+    """
+
+    def __init__(self, enabled: bool = PREJUDGE_ENABLED,
+                 similarity_threshold: float = PREJUDGE_SIMILARITY_THRESHOLD):
+        self.enabled = enabled
+        self.similarity_threshold = similarity_threshold
+        self.baselines: Dict[int, Dict[str, Any]] = {}
+        self.counters = {
+            "checked": 0,
+            "no_baseline": 0,
+            "skipped_exact": 0,
+            "skipped_normalized": 0,
+            "skipped_similar": 0,
+            "sent_to_judge": 0
+        }
+
+    def load_baselines(self, db: Session, test_case_ids: List[int], chunk_size: int = 1000):
+        """Load the accepted outputs for a run's test cases"""
+        if not self.enabled:
+            return
+        for start in range(0, len(test_case_ids), chunk_size):
+            chunk = test_case_ids[start:start + chunk_size]
+            query = db.query(
+                TestCaseBaseline.id, TestCaseBaseline.test_case_id, TestCaseBaseline.output,
+                TestCaseBaseline.output_hash, TestCaseBaseline.normalized_hash
+            ).filter(TestCaseBaseline.test_case_id.in_(chunk))
+            for row in query:
+                self.baselines[row.test_case_id] = dict(row._mapping)
+
+    def classify(self, test_case_ids: List[int], outputs: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Return a local verdict for each output that matches its baseline, or None
+        for outputs that still need the judge
+        """
+        verdicts: List[Optional[Dict[str, Any]]] = [None] * len(outputs)
+        if not self.enabled:
+            return verdicts
+
+        similarity_candidates = []
+        for index, (test_case_id, output) in enumerate(zip(test_case_ids, outputs)):
+            self.counters["checked"] += 1
+            baseline = self.baselines.get(test_case_id)
+            if baseline is None:
+                self.counters["no_baseline"] += 1
+            elif text_hash(output) == baseline["output_hash"]:
+                verdicts[index] = self._verdict("exact", "Output is identical to the accepted baseline")
+            elif text_hash(normalize_text(output)) == baseline["normalized_hash"]:
+                verdicts[index] = self._verdict(
+                    "normalized", "Output matches the accepted baseline apart from case, punctuation or whitespace"
+                )
+            elif same_facts(output, baseline["output"]):
+                similarity_candidates.append(index)
+
+        if similarity_candidates:
+            texts = [normalize_text(outputs[index]) for index in similarity_candidates]
+            texts += [normalize_text(self.baselines[test_case_ids[index]]["output"]) for index in similarity_candidates]
+            vectors = hashed_ngram_vectors(texts)
+            count = len(similarity_candidates)
+            similarities = np.einsum("ij,ij->i", vectors[:count], vectors[count:])
+            for index, similarity in zip(similarity_candidates, similarities):
+                if similarity >= self.similarity_threshold:
+                    verdicts[index] = self._verdict(
+                        "similar", f"Output is near-identical to the accepted baseline (cosine {similarity:.3f})"
+                    )
+
+        for verdict in verdicts:
+            if verdict is None:
+                self.counters["sent_to_judge"] += 1
+            else:
+                self.counters[f"skipped_{verdict['prejudge']}"] += 1
+        return verdicts
+
+    def estimate(self, test_case_ids: List[int], outputs: List[str]) -> List[Dict[str, Any]]:
+        """
+        Rough verdicts for outputs the judge will not see, e.g. once the judge budget
+        is spent. Severity is the n-gram distance from the accepted baseline; outputs
+        without a baseline are marked failed so that someone looks at them.
+        """
+        verdicts = []
+        with_baseline = [index for index, test_case_id in enumerate(test_case_ids) if test_case_id in self.baselines]
+        similarities = {}
+        if with_baseline:
+            texts = [normalize_text(outputs[index]) for index in with_baseline]
+            texts += [normalize_text(self.baselines[test_case_ids[index]]["output"]) for index in with_baseline]
+            vectors = hashed_ngram_vectors(texts)
+            count = len(with_baseline)
+            similarities = dict(zip(with_baseline, np.einsum("ij,ij->i", vectors[:count], vectors[count:])))
+
+        for index in range(len(outputs)):
+            if index in similarities:
+                severity = round(min(1.0, max(0.0, 1.0 - float(similarities[index]))), 3)
+                verdict = {
+                    "severity_score": severity,
+                    "severity_label": _severity_label(severity),
+                    "change_type": "heuristic_estimate",
+                    "reasoning": f"Not judged: estimated from similarity to the accepted baseline "
+                                 f"(cosine {similarities[index]:.3f})"
+                }
+            else:
+                verdict = {
+                    "severity_score": 0.5,
+                    "severity_label": "medium",
+                    "change_type": "budget_exceeded",
+                    "reasoning": "Not judged: the judge budget is spent and there is no accepted baseline to compare with"
+                }
+            verdicts.append(dict(verdict, is_regression=False, cached=False, judge_cost=0.0))
+        return verdicts
+
+    def save_baselines(self, db: Session, results: List[Dict[str, Any]]):
+        """
+        Make judge-accepted outputs the new baselines. `results` are test_results
+        rows; rows decided by the pre-judge itself never replace a baseline.
+        """
+        inserts, updates = {}, {}
+        for result in results:
+            output = result.get("actual_output")
+            if not self.enabled or output is None:
+                continue
+            values = {
+                "output": output,
+                "output_hash": text_hash(output),
+                "normalized_hash": text_hash(normalize_text(output)),
+                "test_run_id": result["test_run_id"]
+            }
+            baseline = self.baselines.get(result["test_case_id"])
+            if baseline is not None and baseline.get("id") is not None:
+                updates[baseline["id"]] = dict(values, id=baseline["id"])
+            else:
+                inserts[result["test_case_id"]] = dict(values, test_case_id=result["test_case_id"])
+            self.baselines[result["test_case_id"]] = dict(values, id=baseline.get("id") if baseline else None)
+
+        if updates:
+            db.execute(update(TestCaseBaseline), list(updates.values()))
+        if inserts:
+            # Another run, or another shard of this one, may accept an output for the same case meanwhile
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            statement = dialect.insert(TestCaseBaseline)
+            statement = statement.on_conflict_do_update(
+                index_elements=["test_case_id"],
+                set_=dict({name: getattr(statement.excluded, name) for name in BASELINE_COLUMNS}, updated_at=func.now())
+            )
+            for row in db.execute(
+                statement.returning(TestCaseBaseline.id, TestCaseBaseline.test_case_id), list(inserts.values())
+            ):
+                self.baselines[row.test_case_id]["id"] = row.id
+
+    def stats(self) -> Dict[str, Any]:
+        skipped = self.counters["skipped_exact"] + self.counters["skipped_normalized"] + self.counters["skipped_similar"]
+        return dict(
+            self.counters,
+            skipped=skipped,
+            skip_rate=skipped / self.counters["checked"] if self.counters["checked"] else 0.0,
+            thresholds={"similarity": self.similarity_threshold, "enabled": self.enabled}
+        )
+
+    def _verdict(self, method: str, reasoning: str) -> Dict[str, Any]:
+        return {
+            "severity_score": 0.0,
+            "severity_label": "none",
+            "change_type": "no_change",
+            "reasoning": reasoning,
+            "is_regression": False,
+            "cached": False,
+            "judge_cost": 0.0,
+            "prejudge": method
+        }
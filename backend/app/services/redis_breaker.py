@@ -0,0 +1,42 @@
+from typing import Callable, Optional
+from app.core.config import REDIS_CIRCUIT_BREAKER_COOLDOWN
+import threading
+import time
+
+
+class RedisCircuitBreaker:
+    """
+    Guards calls to Redis: once one fails, Redis is skipped until `cooldown` seconds
+    have passed, so an outage costs one failed call instead of one per operation.
+    A failed or skipped call returns None and callers fall back to local state.
+    `name` and `fallback` make up the log line, e.g. "Judge budget: Redis
+    unavailable, counting this process's spend only".
+    """
+
+    def __init__(self, name: str, fallback: str, cooldown: float = REDIS_CIRCUIT_BREAKER_COOLDOWN,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self.name = name
+        self.fallback = fallback
+        self.cooldown = cooldown
+        self.on_error = on_error
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def open(self) -> bool:
+        """Whether Redis is being skipped"""
+        return time.monotonic() < self._down_until
+
+    def call(self, operation: Callable):
+        """The result of operation(), or None when it fails or the breaker is open"""
+        if self.open:
+            return None
+        try:
+            return operation()
+        except Exception as e:
+            with self._lock:
+                self._down_until = time.monotonic() + self.cooldown
+            if self.on_error:
+                self.on_error(e)
+            print(f"{self.name}: Redis unavailable, {self.fallback}: {str(e)}")
+            return None
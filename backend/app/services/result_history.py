@@ -0,0 +1,214 @@
+from typing import List, Dict, Any, Optional
+from app.core.config import RESULT_PARTITION_MONTHS_AHEAD, RESULT_RETENTION_MONTHS, RESULT_ARCHIVE_DIR
+from app.core.database import SessionLocal
+from app.models.test_result import TestResult
+from app.services.content_blobs import TEXT_COLUMNS, prune_blobs, resolve_texts
+from app.services.embeddings import prune_embeddings
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+import gzip
+import json
+import os
+import re
+
+PARTITION_NAME = re.compile(r"^test_results_p(\d{4})(\d{2})$")
+DEFAULT_PARTITION = "test_results_default"
+ARCHIVE_BATCH_SIZE = 5000
+
+_partitions_checked_month: Optional[datetime] = None
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'test_results'::regclass"
+    )).scalar())
+
+
+def list_partitions(db: Session) -> Dict[str, datetime]:
+    """Monthly partitions of test_results, by name, with the month they hold"""
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'test_results'::regclass"
+    ))
+    partitions = {}
+    for (name,) in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+    return partitions
+
+
+def ensure_partitions(db: Session, months_ahead: int = RESULT_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Create the partitions for this month and the next `months_ahead`, so new
+    results never land in the default partition.
+
+    Results a month's partition was missing for are in the default partition,
+    and Postgres refuses to create a partition whose rows the default holds, so
+    the default is detached while they are moved into the new partition. An
+    advisory lock keeps concurrent callers from creating the same partition.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('canary:test_results_partitions'))"))
+    existing = list_partitions(db)
+    has_default = db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": DEFAULT_PARTITION}).scalar()
+    created = []
+    this_month = month_start(datetime.now(timezone.utc))
+    for offset in range(months_ahead + 1):
+        month = add_months(this_month, offset)
+        name = f"test_results_p{month:%Y%m}"
+        if name in existing:
+            continue
+        bounds = {"start": month, "end": add_months(month, 1)}
+        stranded = has_default and db.execute(text(
+            f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+        ), bounds).scalar()
+        if stranded:
+            db.execute(text(f"ALTER TABLE test_results DETACH PARTITION {DEFAULT_PARTITION}"))
+        db.execute(text(
+            f"CREATE TABLE {name} PARTITION OF test_results "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        ))
+        if stranded:
+            moved = db.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+                f"RETURNING *) INSERT INTO test_results SELECT * FROM moved"
+            ), bounds).rowcount
+            db.execute(text(f"ALTER TABLE test_results ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+            print(f"Moved {moved} results from {DEFAULT_PARTITION} to {name}")
+        created.append(name)
+    db.commit()
+    return created
+
+
+def ensure_upcoming_partitions(db: Session) -> List[str]:
+    """
+    ensure_partitions on partitioned databases, at most once a month per process.
+
+    Called at API and worker startup and before each run, so partitions keep being
+    created when no Celery beat runs the maintenance task. Failures are logged
+    rather than raised: results then go to the default partition until the next
+    call moves them out.
+    """
+    global _partitions_checked_month
+    this_month = month_start(datetime.now(timezone.utc))
+    if _partitions_checked_month == this_month:
+        return []
+    try:
+        created = ensure_partitions(db) if is_partitioned(db) else []
+    except Exception as e:
+        db.rollback()
+        print(f"Could not create upcoming result partitions: {str(e)}")
+        return []
+    _partitions_checked_month = this_month
+    if created:
+        print(f"Created result partitions {', '.join(created)}")
+    return created
+
+
+def apply_retention(db: Session, retention_months: int = RESULT_RETENTION_MONTHS,
+                    archive_dir: Optional[str] = RESULT_ARCHIVE_DIR) -> Dict[str, Any]:
+    """
+    Remove results older than the last `retention_months` full months, archiving
+    them to `archive_dir` first when it is set.
+
+    Partitioned tables drop whole month partitions, which is instant and leaves no
+    bloat, and delete expired rows that ended up in the default partition in id
+    batches; other databases delete all expired rows that way. Run summaries in
+    test_run_stats are kept either way. Content blobs that only expired results
+    referred to are deleted afterwards, and so are embeddings older than the cutoff.
+    """
+    if retention_months <= 0:
+        return {"cutoff": None, "removed": []}
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+
+    if not is_partitioned(db):
+        archived = _archive(db, "test_results", f"test_results_before_{cutoff:%Y%m}", archive_dir, cutoff)
+        deleted = _delete_before(db, cutoff)
+        return {"cutoff": cutoff.isoformat(), "removed": ["test_results"] if deleted else [],
+                "rows_archived": archived, "rows_deleted": deleted, "blobs_pruned": prune_blobs(db, cutoff),
+                "embeddings_pruned": prune_embeddings(db, cutoff)}
+
+    removed, archived = [], 0
+    for name, month in sorted(list_partitions(db).items(), key=lambda item: item[1]):
+        if month >= cutoff:
+            continue
+        archived += _archive(db, name, name, archive_dir)
+        db.execute(text(f"ALTER TABLE test_results DETACH PARTITION {name}"))
+        db.execute(text(f"DROP TABLE {name}"))
+        db.commit()
+        removed.append(name)
+        print(f"Dropped expired result partition {name}")
+    # Only rows in the default partition can still be older than the cutoff
+    archived += _archive(db, DEFAULT_PARTITION, f"{DEFAULT_PARTITION}_before_{cutoff:%Y%m}", archive_dir, cutoff)
+    deleted = _delete_before(db, cutoff)
+    return {"cutoff": cutoff.isoformat(), "removed": removed, "rows_archived": archived, "rows_deleted": deleted,
+            "blobs_pruned": prune_blobs(db, cutoff), "embeddings_pruned": prune_embeddings(db, cutoff)}
+
+
+def maintain_result_history(db: Session) -> Dict[str, Any]:
+    """Create upcoming partitions and apply the retention policy"""
+    report = {"created": ensure_partitions(db) if is_partitioned(db) else []}
+    report.update(apply_retention(db))
+    return report
+
+
+def _archive(db: Session, table: str, archive_name: str, archive_dir: Optional[str],
+             before: Optional[datetime] = None) -> int:
+    """
+    Write a table's rows, optionally only those created before `before`, as gzipped
+    NDJSON, with their texts read back from content_blobs
+    """
+    if not archive_dir:
+        return 0
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{archive_name}.ndjson.gz")
+    condition = "AND created_at < :before" if before else ""
+
+    count, cursor = 0, 0
+    with gzip.open(path, "wt", encoding="utf-8") as archive:
+        while True:
+            rows = db.execute(text(
+                f"SELECT * FROM {table} WHERE id > :cursor {condition} ORDER BY id LIMIT {ARCHIVE_BATCH_SIZE}"
+            ), {"cursor": cursor, "before": before}).mappings().all()
+            entries = [dict(row, **{name: row[f"{name}_hash"] for name in TEXT_COLUMNS}) for row in rows]
+            for entry in resolve_texts(db, entries):
+                archive.write(json.dumps(entry, default=str) + "\n")
+            count += len(rows)
+            if len(rows) < ARCHIVE_BATCH_SIZE:
+                break
+            cursor = rows[-1]["id"]
+    print(f"Archived {count} results from {table} to {path}")
+    return count
+
+
+def _delete_before(db: Session, cutoff: datetime) -> int:
+    deleted = 0
+    while True:
+        ids = db.execute(text(
+            f"SELECT id FROM test_results WHERE created_at < :cutoff ORDER BY id LIMIT {ARCHIVE_BATCH_SIZE}"
+        ), {"cutoff": cutoff}).scalars().all()
+        if not ids:
+            return deleted
+        db.query(TestResult).filter(TestResult.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        print(maintain_result_history(session))
+    finally:
+        session.close()
@@ -0,0 +1,98 @@
+from typing import List, Dict, Any, Optional, Callable
+from app.core.config import RESULT_WRITE_BATCH_SIZE, RESULT_COMMIT_BATCH_SIZE
+from app.models.test_result import TestResult
+from app.services.content_blobs import TEXT_COLUMNS, store_texts
+from app.services.metrics import STAGE_SECONDS, RESULTS_WRITTEN
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import time
+
+
+class ResultWriter:
+    """
+    Buffers test result rows and writes them with one bulk INSERT per chunk.
+
+    Rows are plain dicts, so nothing accumulates in the session's identity map.
+    Their prompt, expected behavior and output texts are written to content_blobs
+    and the results reference them by hash.
+    The session is committed every `commit_every` rows, so a crashed run keeps
+    the results written up to its last commit. Listeners are called with each
+    written chunk's rows, which now carry their new ids, and their metadata,
+    inside the same transaction; rows keep their texts for them. `write_seconds`
+    is the time spent in INSERTs.
+    """
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None, commit_every: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or RESULT_WRITE_BATCH_SIZE
+        self.commit_every = commit_every or RESULT_COMMIT_BATCH_SIZE
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self._buffer: List[Dict[str, Any]] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._listeners: List[Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]] = []
+        self._uncommitted = 0
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]):
+        self._listeners.append(listener)
+
+    def add(self, row: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None):
+        """Queue a test_results row, writing the buffer once it is full"""
+        self._buffer.append(row)
+        self._metadata.append(metadata or {})
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows, committing if enough have accumulated since the last commit"""
+        if self._buffer:
+            started = time.perf_counter()
+            hashes = store_texts(self.db, [row.get(name) for row in self._buffer for name in TEXT_COLUMNS])
+            values = []
+            for index, row in enumerate(self._buffer):
+                value = {key: item for key, item in row.items() if key not in TEXT_COLUMNS}
+                for offset, name in enumerate(TEXT_COLUMNS):
+                    value[f"{name}_hash"] = hashes[index * len(TEXT_COLUMNS) + offset]
+                values.append(value)
+            ids = self.db.execute(
+                insert(TestResult).returning(TestResult.id, sort_by_parameter_order=True), values
+            ).scalars().all()
+            elapsed = time.perf_counter() - started
+            self.write_seconds += elapsed
+            STAGE_SECONDS.labels("db_write").observe(elapsed)
+            RESULTS_WRITTEN.inc(len(self._buffer))
+            for row, result_id in zip(self._buffer, ids):
+                row["id"] = result_id
+            for listener in self._listeners:
+                listener(self._buffer, self._metadata)
+            self.rows_written += len(self._buffer)
+            self._uncommitted += len(self._buffer)
+            self._buffer = []
+            self._metadata = []
+
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        """Write and commit everything that is still buffered"""
+        self.flush()
+        if self._uncommitted:
+            self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+
+        # Results judged before the failure are still valid, so try to keep them
+        try:
+            self.close()
+        except Exception:
+            self.db.rollback()
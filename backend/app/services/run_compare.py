@@ -0,0 +1,129 @@
+from typing import List, Dict, Any, Iterable
+from app.core.config import PASS_SEVERITY_THRESHOLD, COMPARE_MIN_SEVERITY_DELTA
+from app.models.test_case import TestCase
+from app.models.test_result import TestResult
+from sqlalchemy import Select, and_, case, exists, func, not_, or_, select
+from sqlalchemy.orm import aliased
+
+# How a test case's result in the head run differs from the base run
+COMPARE_STATUSES = ["regressed", "fixed", "severity_changed", "unchanged"]
+DEFAULT_COMPARE_STATUSES = ["regressed", "fixed", "severity_changed"]
+
+
+def _failing(result) -> Any:
+    return or_(
+        func.coalesce(result.is_regression, False) == True,
+        func.coalesce(result.severity_score, 0.0) >= PASS_SEVERITY_THRESHOLD
+    )
+
+
+def compare_select(base_run_id: int, head_run_id: int,
+                   min_severity_delta: float = COMPARE_MIN_SEVERITY_DELTA) -> Select:
+    """
+    One row per test case with a result in both runs, joined on test_case_id.
+
+    The "id" column is the head run's result id, so the statement pages with
+    keyset_select like the other result listings: the head run is read in id
+    order and each of its results finds the base result through the
+    (test_case_id, test_run_id) index. A case is "regressed" when it fails in the
+    head run only, "fixed" when it fails in the base run only, and
+    "severity_changed" when its severity moved by at least `min_severity_delta`
+    or changed label. Outputs are compared by their content hash.
+    """
+    base = aliased(TestResult, name="base")
+    head = aliased(TestResult, name="head")
+    base_failing, head_failing = _failing(base), _failing(head)
+    delta = func.coalesce(head.severity_score, 0.0) - func.coalesce(base.severity_score, 0.0)
+    status = case(
+        (and_(head_failing, not_(base_failing)), "regressed"),
+        (and_(base_failing, not_(head_failing)), "fixed"),
+        (or_(func.abs(delta) >= min_severity_delta, base.severity_label != head.severity_label), "severity_changed"),
+        else_="unchanged"
+    )
+
+    return select(
+        head.id.label("id"),
+        base.id.label("base_result_id"),
+        head.test_case_id,
+        status.label("status"),
+        base.severity_score.label("base_severity_score"),
+        head.severity_score.label("head_severity_score"),
+        delta.label("severity_delta"),
+        base.severity_label.label("base_severity_label"),
+        head.severity_label.label("head_severity_label"),
+        base.change_type.label("base_change_type"),
+        head.change_type.label("head_change_type"),
+        base.is_regression.label("base_is_regression"),
+        head.is_regression.label("head_is_regression"),
+        (func.coalesce(base.actual_output_hash, "") != func.coalesce(head.actual_output_hash, "")).label(
+            "output_changed"
+        )
+    ).select_from(head).join(
+        base, and_(base.test_case_id == head.test_case_id, base.test_run_id == base_run_id)
+    ).where(head.test_run_id == head_run_id)
+
+
+def compare_page_select(base_run_id: int, head_run_id: int, statuses: List[str],
+                        min_severity_delta: float = COMPARE_MIN_SEVERITY_DELTA) -> Select:
+    """compare_select limited to `statuses`, with each test case's name and category"""
+    compared = compare_select(base_run_id, head_run_id, min_severity_delta).subquery()
+    return select(
+        compared, TestCase.name.label("test_case_name"), TestCase.category
+    ).join(TestCase, TestCase.id == compared.c.test_case_id).where(compared.c.status.in_(statuses))
+
+
+def compare_summary_queries(base_run_id: int, head_run_id: int,
+                            min_severity_delta: float = COMPARE_MIN_SEVERITY_DELTA) -> Dict[str, Select]:
+    """
+    Aggregate queries over every compared case, each a single pass over the join;
+    run them on a sync or async session and shape the rows with summarize_comparison
+    """
+    compared = compare_select(base_run_id, head_run_id, min_severity_delta).subquery()
+    totals = select(
+        func.count().label("compared"),
+        *[func.sum(case((compared.c.status == status, 1), else_=0)).label(status) for status in COMPARE_STATUSES],
+        func.sum(case((compared.c.output_changed, 1), else_=0)).label("output_changed"),
+        func.avg(compared.c.severity_delta).label("mean_severity_delta")
+    )
+    transitions = select(
+        compared.c.base_change_type, compared.c.head_change_type, func.count().label("count")
+    ).group_by(compared.c.base_change_type, compared.c.head_change_type)
+
+    def only_in(run_id: int, other_run_id: int) -> Select:
+        other = aliased(TestResult, name="other")
+        return select(func.count(TestResult.id)).where(
+            TestResult.test_run_id == run_id,
+            ~exists().where(other.test_run_id == other_run_id, other.test_case_id == TestResult.test_case_id)
+        )
+
+    return {
+        "totals": totals,
+        "transitions": transitions,
+        "only_in_base": only_in(base_run_id, head_run_id),
+        "only_in_head": only_in(head_run_id, base_run_id)
+    }
+
+
+def summarize_comparison(totals: Any, transitions: Iterable[Any], only_in_base: int,
+                         only_in_head: int) -> Dict[str, Any]:
+    """Counts per status, the mean severity delta and how change types shifted between the runs"""
+    summary = {"compared": totals.compared or 0}
+    summary.update({status: getattr(totals, status) or 0 for status in COMPARE_STATUSES})
+    summary["output_changed"] = totals.output_changed or 0
+    summary["mean_severity_delta"] = float(totals.mean_severity_delta or 0.0)
+    summary["only_in_base"] = only_in_base or 0
+    summary["only_in_head"] = only_in_head or 0
+
+    change_types: Dict[str, Dict[str, int]] = {}
+    shifts = []
+    for row in transitions:
+        base_type, head_type = row.base_change_type or "unknown", row.head_change_type or "unknown"
+        change_types.setdefault(base_type, {"base": 0, "head": 0})["base"] += row.count
+        change_types.setdefault(head_type, {"base": 0, "head": 0})["head"] += row.count
+        if base_type != head_type:
+            shifts.append({"from": base_type, "to": head_type, "count": row.count})
+    for counts in change_types.values():
+        counts["delta"] = counts["head"] - counts["base"]
+    summary["change_types"] = change_types
+    summary["change_type_shifts"] = sorted(shifts, key=lambda shift: -shift["count"])
+    return summary
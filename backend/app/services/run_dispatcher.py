@@ -0,0 +1,263 @@
+from typing import List, Dict, Any, Optional
+from app.core.config import EXECUTION_BACKEND, EXECUTOR_CONCURRENCY, RUN_SHARD_SIZE, PASS_SEVERITY_THRESHOLD
+from app.core.database import SessionLocal
+from app.models.test_case import TestCase
+from app.models.test_run import TestRun
+from app.models.test_result import TestResult
+from app.services.judge_budget import budget_is_limited, prioritize
+from app.services.result_history import ensure_upcoming_partitions
+from app.services.target_llm import build_target_llm
+from app.services.test_executor import TestExecutor
+from fastapi import BackgroundTasks
+from sqlalchemy.orm import Session
+from datetime import datetime
+import asyncio
+import random
+
+SUMMARY_TOTALS = ["total_tests", "passed_tests", "failed_tests", "total_cost"]
+
+
+def dispatch_test_run(test_run_id: int, test_case_ids: List[int], background_tasks: BackgroundTasks,
+                      options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Start executing a test run on the configured backend.
+
+    "background" runs it inside the API process; "celery" splits it into shards of
+    RUN_SHARD_SIZE cases on the task queue and finalizes the run once all are done.
+    `options` are JSON-serializable execution options: concurrency, incremental,
+    model_version, max_cost, stop_after_critical, sprt and the target model
+    settings under "target". Celery shards also get prioritized=True when the
+    ids were put in priority order here.
+    """
+    options = options or {}
+    if EXECUTION_BACKEND == "celery":
+        # Imported here so the API only needs Celery when it is actually used
+        from celery import chord
+        from app.tasks.test_runs import execute_test_run_shard, finalize_test_run, mark_test_run_failed
+
+        if options.get("sprt"):
+            # Shards run at once and share the sequential test, so each must be a random sample
+            test_case_ids = list(test_case_ids)
+            random.Random(test_run_id).shuffle(test_case_ids)
+        elif budget_is_limited(options.get("max_cost")) or options.get("stop_after_critical"):
+            # Shards are picked up in order and share the judge budget, so priority cases go first
+            test_case_ids = prioritize_test_case_ids(test_case_ids)
+            options = dict(options, prioritized=True)
+        shards = shard_test_case_ids(test_case_ids, RUN_SHARD_SIZE)
+        chord(
+            [execute_test_run_shard.s(test_run_id, shard, options) for shard in shards]
+        )(finalize_test_run.s(test_run_id).on_error(mark_test_run_failed.s(test_run_id=test_run_id)))
+        print(f"Queued test run {test_run_id} as {len(shards)} shards")
+        return {"backend": "celery", "shards": len(shards)}
+
+    background_tasks.add_task(execute_tests_background, test_run_id, test_case_ids, options)
+    return {"backend": "background", "shards": 1}
+
+
+def create_test_run(db: Session, test_case_ids: List[int], name: Optional[str] = None, trigger_source: str = "api",
+                    git_commit: Optional[str] = None, git_branch: Optional[str] = None,
+                    selection: Optional[Dict[str, Any]] = None, schedule_name: Optional[str] = None) -> TestRun:
+    """Record a new running test run over `test_case_ids`"""
+    ensure_upcoming_partitions(db)
+    test_run = TestRun(
+        name=name or f"Test Run {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        status="running",
+        trigger_source=trigger_source,
+        git_commit=git_commit,
+        git_branch=git_branch,
+        selection=selection or None,
+        schedule_name=schedule_name,
+        total_tests=len(test_case_ids)
+    )
+    db.add(test_run)
+    db.commit()
+    db.refresh(test_run)
+    print(f"Created test run with ID: {test_run.id}")
+    return test_run
+
+
+def prioritize_test_case_ids(test_case_ids: List[int], chunk_size: int = 1000) -> List[int]:
+    """A run's test case ids in the order prioritize puts them, for the whole run rather than per shard"""
+    db = SessionLocal()
+    try:
+        cases = []
+        for start in range(0, len(test_case_ids), chunk_size):
+            cases.extend(
+                {"id": row.id, "category": row.category} for row in db.query(TestCase.id, TestCase.category)
+                .filter(TestCase.id.in_(test_case_ids[start:start + chunk_size]))
+            )
+        order = {test_case_id: position for position, test_case_id in enumerate(test_case_ids)}
+        cases.sort(key=lambda case: order[case["id"]])
+        return [case["id"] for case in prioritize(db, cases)]
+    finally:
+        db.close()
+
+
+def shard_test_case_ids(test_case_ids: List[int], shard_size: int) -> List[List[int]]:
+    return [test_case_ids[start:start + shard_size] for start in range(0, len(test_case_ids), shard_size)]
+
+
+def load_test_cases(db: Session, test_case_ids: List[int], chunk_size: int = 1000) -> List[TestCase]:
+    """Load test cases by id in order, keeping each IN list to a bounded size"""
+    test_cases = []
+    for start in range(0, len(test_case_ids), chunk_size):
+        chunk = test_case_ids[start:start + chunk_size]
+        test_cases.extend(db.query(TestCase).filter(TestCase.id.in_(chunk)).all())
+    order = {test_case_id: position for position, test_case_id in enumerate(test_case_ids)}
+    return sorted(test_cases, key=lambda test_case: order[test_case.id])
+
+
+def execute_test_cases(db: Session, test_run_id: int, test_case_ids: List[int],
+                       options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Execute the given test cases for a run in this process and return the summary.
+
+    Cases that already have a result for the run are not executed again but
+    counted from their results: a shard redelivered after its worker died keeps
+    what it committed before, without duplicate results or stats.
+    """
+    options = dict(options or {})
+    existing = existing_results(db, test_run_id, test_case_ids)
+    if existing:
+        print(f"Skipping {len(existing)} test cases that already have results in run {test_run_id}")
+        test_case_ids = [test_case_id for test_case_id in test_case_ids if test_case_id not in existing]
+    test_cases = load_test_cases(db, test_case_ids)
+    git_branch = db.query(TestRun.git_branch).filter(TestRun.id == test_run_id).scalar()
+    executor = TestExecutor()
+    llm_client = build_target_llm(db, options.pop("target", None))
+
+    concurrency = options.pop("concurrency", None) or EXECUTOR_CONCURRENCY
+    if concurrency == 1:
+        # Sequential, one case per judge call, as TestExecutor.execute_test_suite runs it
+        options.setdefault("judge_batch_size", 1)
+    print(f"Starting test execution (concurrency={concurrency})...")
+    results = asyncio.run(executor.execute_test_suite_async(
+        db=db,
+        test_cases=test_cases,
+        test_run_id=test_run_id,
+        llm_client=llm_client,
+        concurrency=concurrency,
+        collect_results=False,
+        git_branch=git_branch,
+        **options
+    ))
+    summary = results["summary"]
+    if existing:
+        summary["resumed"] = {"test_cases": len(existing)}
+        for severity_score, judge_cost in existing.values():
+            passed = severity_score is not None and severity_score < PASS_SEVERITY_THRESHOLD
+            summary["total_tests"] += 1
+            summary["passed_tests" if passed else "failed_tests"] += 1
+            summary["total_cost"] += judge_cost or 0.0
+    print(f"✓ Test execution completed: {summary}")
+    return summary
+
+
+def existing_results(db: Session, test_run_id: int, test_case_ids: List[int],
+                     chunk_size: int = 1000) -> Dict[int, tuple]:
+    """Severity and judge cost of the run's results for any of `test_case_ids`, by test case id"""
+    existing = {}
+    for start in range(0, len(test_case_ids), chunk_size):
+        existing.update(
+            (row.test_case_id, (row.severity_score, row.judge_cost)) for row in db.query(
+                TestResult.test_case_id, TestResult.severity_score, TestResult.judge_cost
+            ).filter(
+                TestResult.test_run_id == test_run_id,
+                TestResult.test_case_id.in_(test_case_ids[start:start + chunk_size])
+            )
+        )
+    return existing
+
+
+def merge_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Add up shard summaries. Nested stats counters are summed too, and the rates
+    derived from them are recomputed from the totals.
+    """
+    merged = {key: 0 for key in SUMMARY_TOTALS}
+    merged["total_cost"] = 0.0
+    for summary in summaries:
+        for key in SUMMARY_TOTALS:
+            merged[key] += summary.get(key, 0)
+        for key, value in summary.items():
+            if isinstance(value, dict):
+                merged[key] = _merge_counters(merged.get(key, {}), value)
+
+    prejudge = merged.get("prejudge")
+    if prejudge:
+        prejudge["skip_rate"] = prejudge["skipped"] / prejudge["checked"] if prejudge["checked"] else 0.0
+    judge_cache = merged.get("judge_cache")
+    if judge_cache:
+        lookups = judge_cache["local_hits"] + judge_cache["redis_hits"] + judge_cache["misses"]
+        judge_cache["hit_rate"] = (judge_cache["local_hits"] + judge_cache["redis_hits"]) / lookups if lookups else 0.0
+        judge_cache["redis_latency_avg_ms"] = (
+            judge_cache["redis_latency_total_ms"] / judge_cache["redis_calls"] if judge_cache["redis_calls"] else 0.0
+        )
+    stopped = [summary["early_stop"] for summary in summaries if summary.get("early_stop", {}).get("stopped")]
+    if stopped:
+        merged["early_stop"].update(stopped=True, outcome=stopped[0]["outcome"], reason=stopped[0]["reason"])
+    return merged
+
+
+def _merge_counters(total: Dict[str, Any], counters: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(total)
+    for key, value in counters.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and key in merged:
+            merged[key] += value
+        elif key not in merged:
+            merged[key] = value
+    return merged
+
+
+def complete_test_run(db: Session, test_run_id: int, summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write the combined summary of every shard to the test run and mark it completed,
+    or aborted when it stopped early
+    """
+    summary = merge_summaries(summaries)
+    test_run = db.query(TestRun).filter(TestRun.id == test_run_id).first()
+    if test_run:
+        test_run.status = "aborted" if summary.get("early_stop", {}).get("stopped") else "completed"
+        test_run.passed_tests = summary["passed_tests"]
+        test_run.failed_tests = summary["failed_tests"]
+        test_run.total_cost = summary["total_cost"]
+        test_run.stats = {key: value for key, value in summary.items() if key not in SUMMARY_TOTALS}
+        test_run.completed_at = datetime.now()
+
+        db.commit()
+        print(f"✓ Test run {test_run_id} updated in database")
+
+    print(f"Test run {test_run_id} completed successfully: {summary}")
+    return summary
+
+
+def fail_test_run(db: Session, test_run_id: int):
+    test_run = db.query(TestRun).filter(TestRun.id == test_run_id).first()
+    if test_run:
+        test_run.status = "failed"
+        db.commit()
+        print(f"✓ Test run {test_run_id} marked as failed in database")
+
+
+def execute_tests_background(test_run_id: int, test_case_ids: List[int], options: Optional[Dict[str, Any]] = None):
+    """
+    Execute a whole test run in the API process, with its own session
+    """
+    print(f"Starting background test execution for run {test_run_id} with {len(test_case_ids)} test cases")
+
+    db = SessionLocal()
+    try:
+        summary = execute_test_cases(db, test_run_id, test_case_ids, options)
+        complete_test_run(db, test_run_id, [summary])
+
+    except Exception as e:
+        print(f"✗ Test run {test_run_id} failed with error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+        # Update test run as failed
+        db.rollback()
+        fail_test_run(db, test_run_id)
+
+    finally:
+        db.close()
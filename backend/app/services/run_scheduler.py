@@ -0,0 +1,333 @@
+"""
+Scheduled and continuous canary runs, started in-process.
+
+Schedules are a JSON list in RUN_SCHEDULES_FILE, each with a unique name and
+either a cron expression or a trickle interval:
+
+    [
+      {"name": "nightly", "cron": "0 2 * * *"},
+      {"name": "smoke", "cron": "*/30 * * * *", "selection": {"tags": ["smoke"]},
+       "options": {"incremental": true}, "git_branch": "main"},
+      {"name": "drift", "trickle": {"every_minutes": 5, "sample_size": 25},
+       "selection": {"categories": ["safety"]}, "options": {"max_cost": 0.25}}
+    ]
+
+`selection` takes the keys of TestRun.selection (categories, tags, name_glob,
+shard_index, shard_count, sample_size, seed) and `options` the execution options
+of a run (concurrency, incremental, model_version, max_cost, stop_after_critical,
+sprt, target).
+
+Cron expressions are in UTC. Each schedule starts a fixed offset after its
+nominal time, derived from its name and below spread_seconds (default
+SCHEDULE_SPREAD_SECONDS), so schedules sharing an hour do not all start at once.
+A trickle schedule runs the next window of sample_size cases every interval,
+walking the selection in a fixed shuffled order so every case is re-checked
+once per cycle. A schedule is skipped while its previous run is still running;
+fires missed while no scheduler was up are not caught up.
+
+Run it in the API process with SCHEDULER_ENABLED=true, or as its own process
+next to API replicas that leave it disabled:
+
+    python -m app.services.run_scheduler
+"""
+from typing import List, Dict, Any, Optional, Set
+from app.core.config import (
+    REDIS_URL, REDIS_SOCKET_TIMEOUT, RUN_SCHEDULES_FILE, SCHEDULER_TICK_SECONDS, SCHEDULE_SPREAD_SECONDS,
+    SCHEDULE_STALE_AFTER_HOURS
+)
+from app.core.database import SessionLocal
+from app.models.test_run import TestRun
+from app.services.early_stop import validate_early_stop
+from app.services.run_dispatcher import create_test_run, dispatch_test_run
+from app.services.test_selection import SELECTOR_KEYS, select_test_case_ids, validate_selection
+from fastapi import BackgroundTasks
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
+import json
+import math
+import redis
+
+CRON_ALIASES = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *"}
+CRON_FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7)]
+SCHEDULE_KEYS = ["name", "cron", "trickle", "selection", "options", "git_branch", "spread_seconds"]
+SCHEDULE_OPTIONS = [
+    "concurrency", "incremental", "model_version", "max_cost", "stop_after_critical", "sprt", "target"
+]
+CLAIM_TTL_SECONDS = 86400
+
+
+def _parse_cron_field(text: str, name: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in text.split(","):
+        span, _, step = part.partition("/")
+        try:
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(value) for value in span.split("-", 1))
+            else:
+                start = int(span)
+                end = high if step else start
+            step = int(step) if step else 1
+        except ValueError:
+            raise ValueError(f"Invalid cron {name} field {text!r}")
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Cron {name} field {text!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSpec:
+    """A five-field cron expression (minute hour day month weekday) with *, ranges, lists and steps"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"Cron expression {expression!r} needs 5 fields: minute hour day month weekday")
+        self.values = {
+            name: _parse_cron_field(text, name, low, high) for text, (name, low, high) in zip(fields, CRON_FIELDS)
+        }
+        if 7 in self.values["weekday"]:
+            self.values["weekday"].add(0)  # Both 0 and 7 are Sunday
+        # As in cron, when both day and weekday are restricted either one matching is enough
+        self.day_or_weekday = fields[2] != "*" and fields[4] != "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        if moment.month not in self.values["month"]:
+            return False
+        day = moment.day in self.values["day"]
+        weekday = (moment.weekday() + 1) % 7 in self.values["weekday"]
+        return day or weekday if self.day_or_weekday else day and weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute after `moment`"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 8)
+        while moment < limit:
+            if not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.values["hour"]:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.values["minute"]:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+
+class Schedule:
+    """One configured schedule, validated"""
+
+    def __init__(self, config: Dict[str, Any]):
+        if not isinstance(config, dict) or not config.get("name"):
+            raise ValueError("Every schedule needs a name")
+        self.name = str(config["name"])
+        unknown = [key for key in config if key not in SCHEDULE_KEYS]
+        if unknown:
+            raise ValueError(f"Schedule {self.name}: unknown keys {', '.join(unknown)}")
+        if ("cron" in config) == ("trickle" in config):
+            raise ValueError(f"Schedule {self.name}: give either cron or trickle")
+
+        self.selection = dict(config.get("selection") or {})
+        self.options = dict(config.get("options") or {})
+        self.git_branch = config.get("git_branch")
+        unknown = [key for key in self.selection if key not in SELECTOR_KEYS]
+        unknown += [key for key in self.options if key not in SCHEDULE_OPTIONS]
+        if unknown:
+            raise ValueError(f"Schedule {self.name}: unknown selectors or options {', '.join(unknown)}")
+        try:
+            validate_selection(self.selection)
+            validate_early_stop(self.options.get("stop_after_critical"), self.options.get("sprt"))
+        except ValueError as e:
+            raise ValueError(f"Schedule {self.name}: {str(e)}")
+
+        self.cron = None
+        self.every_seconds = None
+        self.sample_size = None
+        if "cron" in config:
+            try:
+                self.cron = CronSpec(str(config["cron"]))
+                self.cron.next_after(datetime.now(timezone.utc))
+            except ValueError as e:
+                raise ValueError(f"Schedule {self.name}: {str(e)}")
+            window = SCHEDULE_SPREAD_SECONDS
+        else:
+            trickle = config["trickle"] or {}
+            self.every_seconds = int(float(trickle.get("every_minutes", 0)) * 60)
+            self.sample_size = int(trickle.get("sample_size", 0))
+            if self.every_seconds < 60 or self.sample_size < 1:
+                raise ValueError(f"Schedule {self.name}: trickle needs every_minutes >= 1 and sample_size >= 1")
+            window = min(SCHEDULE_SPREAD_SECONDS, self.every_seconds)
+
+        # A stable offset per schedule, so every scheduler process agrees on the start times
+        window = int(config.get("spread_seconds", window))
+        digest = int(hashlib.sha256(self.name.encode("utf-8")).hexdigest()[:8], 16)
+        self.offset_seconds = digest % window if window > 0 else 0
+
+    def next_run_after(self, moment: datetime) -> datetime:
+        offset = timedelta(seconds=self.offset_seconds)
+        if self.cron:
+            return self.cron.next_after(moment - offset) + offset
+        slot = math.floor((moment.timestamp() - self.offset_seconds) / self.every_seconds) + 1
+        return datetime.fromtimestamp(slot * self.every_seconds + self.offset_seconds, timezone.utc)
+
+    def describe(self) -> Dict[str, Any]:
+        described = {"name": self.name}
+        if self.cron:
+            described["cron"] = self.cron.expression
+        else:
+            described["trickle"] = {"every_minutes": self.every_seconds / 60, "sample_size": self.sample_size}
+        described.update(selection=self.selection, options=self.options, git_branch=self.git_branch,
+                         offset_seconds=self.offset_seconds)
+        return described
+
+
+def load_schedules(path: str = RUN_SCHEDULES_FILE) -> List[Schedule]:
+    """The schedules in the JSON file at `path`; raises ValueError when any is invalid"""
+    if not path:
+        return []
+    try:
+        with open(path) as source:
+            configs = json.load(source)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Cannot read schedules from {path}: {str(e)}")
+    if not isinstance(configs, list):
+        raise ValueError(f"{path} must hold a JSON list of schedules")
+
+    schedules = [Schedule(config) for config in configs]
+    names = [schedule.name for schedule in schedules]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate schedule names: {', '.join(duplicates)}")
+    return schedules
+
+
+def schedule_is_running(db: Session, name: str) -> bool:
+    """Whether a run of the schedule is still running; runs stuck for SCHEDULE_STALE_AFTER_HOURS do not count"""
+    since = datetime.now(timezone.utc) - timedelta(hours=SCHEDULE_STALE_AFTER_HOURS)
+    return db.execute(select(TestRun.id).where(
+        TestRun.schedule_name == name, TestRun.status == "running", TestRun.created_at >= since
+    ).limit(1)).first() is not None
+
+
+def trickle_window(schedule: Schedule, test_case_ids: List[int], runs_so_far: int) -> Dict[str, Any]:
+    """
+    The cases of the schedule's next trickle run. Cases are ordered by a hash of the
+    schedule name and case id, which mixes categories within a window and keeps each
+    case's place when others are added, and the windows are taken in turn.
+    """
+    ordered = sorted(test_case_ids, key=lambda test_case_id: hashlib.sha256(
+        f"{schedule.name}:{test_case_id}".encode("utf-8")
+    ).digest())
+    windows = max(1, math.ceil(len(ordered) / schedule.sample_size))
+    window = runs_so_far % windows
+    return {
+        "test_case_ids": sorted(ordered[window * schedule.sample_size:(window + 1) * schedule.sample_size]),
+        "window": window,
+        "windows": windows
+    }
+
+
+def start_scheduled_run(db: Session, schedule: Schedule, run_at: datetime,
+                        background_tasks: BackgroundTasks) -> Optional[Dict[str, Any]]:
+    """Start a run of `schedule` unless its previous run is still going; returns None when skipped"""
+    if schedule_is_running(db, schedule.name):
+        print(f"Schedule {schedule.name}: previous run still running, skipping {run_at.isoformat()}")
+        return None
+
+    test_case_ids = select_test_case_ids(db, schedule.selection)
+    name = f"{schedule.name} {run_at.strftime('%Y-%m-%d %H:%M')}"
+    if schedule.sample_size and test_case_ids:
+        runs_so_far = db.execute(
+            select(func.count()).select_from(TestRun).where(TestRun.schedule_name == schedule.name)
+        ).scalar()
+        trickle = trickle_window(schedule, test_case_ids, runs_so_far)
+        test_case_ids = trickle["test_case_ids"]
+        name += f" ({trickle['window'] + 1}/{trickle['windows']})"
+    if not test_case_ids:
+        print(f"Schedule {schedule.name}: no active test cases match, skipping")
+        return None
+
+    test_run = create_test_run(db, test_case_ids, name, "scheduled", git_branch=schedule.git_branch,
+                               selection=schedule.selection, schedule_name=schedule.name)
+    dispatch = dispatch_test_run(test_run.id, test_case_ids, background_tasks, schedule.options)
+    print(f"Schedule {schedule.name}: started test run {test_run.id} with {len(test_case_ids)} test cases")
+    return {"test_run_id": test_run.id, "total_tests": len(test_case_ids), **dispatch}
+
+
+class RunScheduler:
+    """
+    Starts the runs of the given schedules from an asyncio task. Several scheduler
+    processes can run side by side: each start is claimed in Redis first, so only
+    one of them starts it. While Redis is unreachable every process starts runs,
+    and only the running-run check keeps them from overlapping.
+    """
+
+    def __init__(self, schedules: List[Schedule], redis_client=None):
+        self.schedules = schedules
+        self.redis_client = redis_client or redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+        self._task = None
+        self._runs = set()  # Background runs in progress, referenced until they finish
+
+    def start(self):
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run_forever(self):
+        now = datetime.now(timezone.utc)
+        next_runs = {schedule.name: schedule.next_run_after(now) for schedule in self.schedules}
+        print(f"Scheduler started with {len(self.schedules)} schedules")
+        while True:
+            now = datetime.now(timezone.utc)
+            for schedule in self.schedules:
+                run_at = next_runs[schedule.name]
+                if now >= run_at:
+                    next_runs[schedule.name] = schedule.next_run_after(now)
+                    await self._run(schedule, run_at)
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+    async def _run(self, schedule: Schedule, run_at: datetime):
+        background_tasks = BackgroundTasks()
+        try:
+            await asyncio.to_thread(self._start, schedule, run_at, background_tasks)
+        except Exception as e:
+            print(f"✗ Schedule {schedule.name} failed to start a run: {str(e)}")
+            return
+        if background_tasks.tasks:
+            task = asyncio.create_task(background_tasks())
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+
+    def _start(self, schedule: Schedule, run_at: datetime, background_tasks: BackgroundTasks):
+        if not self._claim(schedule, run_at):
+            return
+        db = SessionLocal()
+        try:
+            start_scheduled_run(db, schedule, run_at, background_tasks)
+        finally:
+            db.close()
+
+    def _claim(self, schedule: Schedule, run_at: datetime) -> bool:
+        key = f"canary:schedule:{schedule.name}:{int(run_at.timestamp())}"
+        try:
+            return bool(self.redis_client.set(key, 1, nx=True, ex=CLAIM_TTL_SECONDS))
+        except redis.RedisError as e:
+            print(f"⚠ Redis unavailable, starting schedule {schedule.name} unclaimed: {str(e)}")
+            return True
+
+
+if __name__ == "__main__":
+    asyncio.run(RunScheduler(load_schedules()).run_forever())
@@ -0,0 +1,151 @@
+from typing import List, Dict, Any, Tuple, Iterable
+from app.core.config import PASS_SEVERITY_THRESHOLD
+from app.models.test_case import TestCase
+from app.models.test_result import TestResult
+from app.models.test_run_stat import TestRunStat
+from sqlalchemy import Select, case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+DIMENSIONS = ["severity_label", "change_type", "category"]
+AGGREGATES = ["result_count", "passed_count", "regression_count", "total_cost"]
+
+
+class RunStatsRecorder:
+    """
+    Keeps test_run_stats up to date as a ResultWriter listener.
+
+    Each written chunk is folded into per-dimension deltas and applied with one
+    INSERT ... ON CONFLICT DO UPDATE that adds to the stored counters, so shards
+    writing to the same run concurrently never lose an update.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def __call__(self, rows: List[Dict[str, Any]], metadata: List[Dict[str, Any]]):
+        deltas: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+        for row, meta in zip(rows, metadata):
+            values = {
+                "total": "all",
+                "severity_label": row.get("severity_label"),
+                "change_type": row.get("change_type"),
+                "category": meta.get("category")
+            }
+            for dimension, value in values.items():
+                delta = deltas.setdefault(
+                    (row["test_run_id"], dimension, value or "unknown"),
+                    {"result_count": 0, "passed_count": 0, "regression_count": 0, "total_cost": 0.0}
+                )
+                delta["result_count"] += 1
+                # Unscored results count as failed, as in rebuild_run_stats
+                severity = row.get("severity_score")
+                delta["passed_count"] += int(severity is not None and severity < PASS_SEVERITY_THRESHOLD)
+                delta["regression_count"] += int(bool(row.get("is_regression")))
+                delta["total_cost"] += row.get("judge_cost") or 0.0
+
+        if deltas:
+            self.db.execute(_increment_statement(self.db), [
+                dict(delta, test_run_id=test_run_id, dimension=dimension, value=value)
+                for (test_run_id, dimension, value), delta in deltas.items()
+            ])
+
+
+def _increment_statement(db: Session):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(TestRunStat)
+    return statement.on_conflict_do_update(
+        index_elements=["test_run_id", "dimension", "value"],
+        set_={
+            name: getattr(TestRunStat, name) + getattr(statement.excluded, name)
+            for name in AGGREGATES
+        }
+    )
+
+
+def rebuild_run_stats(db: Session, test_run_id: int):
+    """
+    Recompute a run's stats from its results with one GROUP BY per dimension, for
+    runs written before the table existed or whose results were changed later
+    """
+    db.query(TestRunStat).filter(TestRunStat.test_run_id == test_run_id).delete(synchronize_session=False)
+
+    aggregates = [
+        func.count(TestResult.id),
+        func.sum(case((TestResult.severity_score < PASS_SEVERITY_THRESHOLD, 1), else_=0)),
+        func.sum(case((TestResult.is_regression == True, 1), else_=0)),
+        func.sum(TestResult.judge_cost)
+    ]
+    groupings = {
+        "total": None,
+        "severity_label": TestResult.severity_label,
+        "change_type": TestResult.change_type,
+        "category": TestCase.category
+    }
+
+    stats = []
+    for dimension, column in groupings.items():
+        query = db.query(*aggregates) if column is None else db.query(column, *aggregates)
+        query = query.filter(TestResult.test_run_id == test_run_id)
+        if dimension == "category":
+            query = query.join(TestCase, TestCase.id == TestResult.test_case_id)
+        if column is not None:
+            query = query.group_by(column)
+
+        for row in query:
+            value = "all" if column is None else (row[0] or "unknown")
+            count, passed, regressions, cost = row[-4:]
+            if count:
+                stats.append(TestRunStat(
+                    test_run_id=test_run_id, dimension=dimension, value=value, result_count=count,
+                    passed_count=passed or 0, regression_count=regressions or 0, total_cost=cost or 0.0
+                ))
+
+    db.add_all(stats)
+    db.commit()
+
+
+def run_summary_query(test_run_id: int) -> Select:
+    return select(
+        TestRunStat.dimension, TestRunStat.value, TestRunStat.result_count, TestRunStat.passed_count,
+        TestRunStat.regression_count, TestRunStat.total_cost
+    ).where(TestRunStat.test_run_id == test_run_id)
+
+
+def get_run_summary(db: Session, test_run_id: int) -> Dict[str, Any]:
+    """A run's totals and breakdowns, read from its handful of stats rows"""
+    return summarize_run_stats(db.execute(run_summary_query(test_run_id)).all())
+
+
+def summarize_run_stats(rows: Iterable[Any]) -> Dict[str, Any]:
+    """Shape the rows of run_summary_query, fetched on a sync or async session"""
+    summary = {
+        "total_results": 0,
+        "passed_count": 0,
+        "failed_count": 0,
+        "regression_count": 0,
+        "total_cost": 0.0,
+        "severity_counts": {},
+        "change_type_counts": {},
+        "category_counts": {},
+        "breakdowns": {dimension: {} for dimension in DIMENSIONS}
+    }
+    for row in rows:
+        if row.dimension == "total":
+            summary["total_results"] = row.result_count
+            summary["passed_count"] = row.passed_count
+            summary["failed_count"] = row.result_count - row.passed_count
+            summary["regression_count"] = row.regression_count
+            summary["total_cost"] = row.total_cost
+        elif row.dimension in DIMENSIONS:
+            summary["breakdowns"][row.dimension][row.value] = {
+                "count": row.result_count,
+                "passed": row.passed_count,
+                "regressions": row.regression_count,
+                "cost": row.total_cost
+            }
+
+    for dimension, key in [("severity_label", "severity_counts"), ("change_type", "change_type_counts"),
+                           ("category", "category_counts")]:
+        summary[key] = {value: stats["count"] for value, stats in summary["breakdowns"][dimension].items()}
+    return summary
@@ -0,0 +1,228 @@
+from typing import List, Dict, Any, Optional
+from app.core.config import CLUSTER_SIMILARITY_THRESHOLD, CLUSTER_REASONING_WEIGHT, NEAR_DUPLICATE_THRESHOLD
+from app.models.test_case import TestCase
+from app.models.test_result import TestResult
+from app.services.content_blobs import content_hash, load_texts
+from app.services.embeddings import EMBEDDING_MODEL, get_embeddings
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from collections import Counter
+import numpy as np
+
+BLOCK_SIZE = 256  # Rows of the prompt similarity matrix held at a time
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def cluster_vectors(vectors: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Cluster labels for unit vectors, numbered in order of each cluster's first member.
+
+    Each vector joins the cluster whose centroid it is most similar to when that
+    cosine is at least `threshold`, and starts a new cluster otherwise; a second
+    pass then moves every vector to its nearest final centroid. Both passes cost
+    rows x clusters dot products, with no rows x rows matrix.
+    """
+    count, dims = vectors.shape
+    labels = np.zeros(count, dtype=np.int64)
+    sums = np.zeros((count, dims), dtype=np.float32)
+    centroids = np.zeros((count, dims), dtype=np.float32)
+    clusters = 0
+    for index, vector in enumerate(vectors):
+        if clusters:
+            similarities = centroids[:clusters] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                labels[index] = best
+                sums[best] += vector
+                centroids[best] = sums[best] / max(float(np.linalg.norm(sums[best])), 1e-12)
+                continue
+        labels[index] = clusters
+        sums[clusters] = vector
+        centroids[clusters] = vector
+        clusters += 1
+
+    if clusters > 1:
+        labels = np.argmax(vectors @ centroids[:clusters].T, axis=1)
+        # Renumber, dropping clusters the second pass left empty
+        _, first = np.unique(labels, return_index=True)
+        renumber = {int(label): number for number, label in enumerate(labels[np.sort(first)])}
+        labels = np.array([renumber[int(label)] for label in labels], dtype=np.int64)
+    return labels
+
+
+def cluster_regressions(db: Session, test_run_id: int, threshold: float = CLUSTER_SIMILARITY_THRESHOLD,
+                        reasoning_weight: float = CLUSTER_REASONING_WEIGHT, by_change_type: bool = True,
+                        limit: Optional[int] = None, members: int = 20) -> Dict[str, Any]:
+    """
+    Group a run's regressions by what went wrong, largest clusters first.
+
+    Each regression is embedded from its output and its judge reasoning, weighted
+    by `reasoning_weight`, and clustered by cosine at `threshold`, separately per
+    change type unless by_change_type is false. The most severe regressions seed
+    the clusters. Each cluster has its change types, categories and severities,
+    the member closest to its centroid with its texts as representative and up to
+    `members` members, most typical first.
+    """
+    rows = [dict(row) for row in db.execute(
+        select(
+            TestResult.id.label("result_id"), TestResult.test_case_id, TestCase.name.label("test_case_name"),
+            TestCase.category, TestResult.change_type, TestResult.severity_score, TestResult.severity_label,
+            TestResult.reasoning, TestResult.actual_output_hash
+        )
+        .outerjoin(TestCase, TestCase.id == TestResult.test_case_id)
+        .where(TestResult.test_run_id == test_run_id, TestResult.is_regression == True)
+        .order_by(TestResult.severity_score.desc(), TestResult.id)
+    ).mappings()]
+
+    reasoning_hashes = [content_hash(row["reasoning"]) if row["reasoning"] else None for row in rows]
+    outputs = get_embeddings(db, [row["actual_output_hash"] for row in rows])
+    reasonings = get_embeddings(db, reasoning_hashes, texts={
+        key: row["reasoning"] for key, row in zip(reasoning_hashes, rows) if key
+    })
+    # Concatenated so the dot product is the weighted sum of both cosines
+    vectors = _normalize_rows(np.hstack([
+        np.sqrt(1 - reasoning_weight) * outputs, np.sqrt(reasoning_weight) * reasonings
+    ]))
+
+    groups: Dict[Optional[str], List[int]] = {}
+    for index, row in enumerate(rows):
+        groups.setdefault(row["change_type"] if by_change_type else None, []).append(index)
+
+    clusters = []
+    for indices in groups.values():
+        labels = cluster_vectors(vectors[indices], threshold)
+        for label in range(int(labels.max()) + 1 if len(labels) else 0):
+            member_indices = [index for index, member_label in zip(indices, labels) if member_label == label]
+            clusters.append(_describe_cluster(rows, vectors, member_indices, members))
+
+    clusters.sort(key=lambda cluster: (-cluster["size"], -cluster["max_severity"]))
+    shown = clusters[:limit] if limit else clusters
+    outputs = load_texts(db, [cluster["representative"]["actual_output_hash"] for cluster in shown])
+    for number, cluster in enumerate(shown, start=1):
+        cluster["cluster"] = number
+        representative = cluster["representative"]
+        representative["actual_output"] = outputs.get(representative.pop("actual_output_hash"))
+
+    return {
+        "test_run_id": test_run_id,
+        "regressions": len(rows),
+        "cluster_count": len(clusters),
+        "clusters": shown,
+        "threshold": threshold,
+        "reasoning_weight": reasoning_weight,
+        "embedding_model": EMBEDDING_MODEL
+    }
+
+
+def _describe_cluster(rows: List[Dict[str, Any]], vectors: np.ndarray, indices: List[int],
+                      members: int) -> Dict[str, Any]:
+    centroid = vectors[indices].mean(axis=0)
+    centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+    similarities = vectors[indices] @ centroid
+    order = np.argsort(-similarities, kind="stable")
+    representative = rows[indices[int(order[0])]]
+    severities = [rows[index]["severity_score"] or 0.0 for index in indices]
+    return {
+        "size": len(indices),
+        "change_types": dict(Counter(rows[index]["change_type"] for index in indices).most_common()),
+        "categories": dict(Counter(rows[index]["category"] for index in indices).most_common()),
+        "mean_severity": sum(severities) / len(severities),
+        "max_severity": max(severities),
+        "cohesion": float(similarities.mean()),
+        "representative": {
+            key: representative[key] for key in [
+                "result_id", "test_case_id", "test_case_name", "change_type", "severity_score", "reasoning",
+                "actual_output_hash"
+            ]
+        },
+        "members": [
+            {
+                "result_id": rows[indices[position]]["result_id"],
+                "test_case_id": rows[indices[position]]["test_case_id"],
+                "test_case_name": rows[indices[position]]["test_case_name"],
+                "severity_score": rows[indices[position]]["severity_score"],
+                "similarity": float(similarities[position])
+            }
+            for position in order[:members]
+        ]
+    }
+
+
+def _prompt_vectors(db: Session, category: Optional[str] = None):
+    """Active test cases in id order with the embeddings of their prompts"""
+    query = select(TestCase.id, TestCase.name, TestCase.category, TestCase.input_prompt).where(
+        TestCase.is_active == True
+    )
+    if category:
+        query = query.where(TestCase.category == category)
+    rows = db.execute(query.order_by(TestCase.id)).all()
+    hashes = [content_hash(row.input_prompt) for row in rows]
+    return rows, get_embeddings(db, hashes, texts=dict(zip(hashes, (row.input_prompt for row in rows))))
+
+
+def near_duplicate_groups(db: Session, threshold: float = NEAR_DUPLICATE_THRESHOLD, category: Optional[str] = None,
+                          limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Groups of active test cases whose prompts are near-duplicates, largest first.
+
+    Cases are taken in id order and each one not yet grouped keeps the later ones
+    whose prompt cosine to it is at least `threshold`, so every duplicate is close
+    to the case it would be retired for rather than chained through others. The
+    similarity matrix is computed BLOCK_SIZE rows at a time.
+    """
+    rows, vectors = _prompt_vectors(db, category)
+    grouped = np.zeros(len(rows), dtype=bool)
+    groups = []
+    for start in range(0, len(rows), BLOCK_SIZE):
+        similarities = vectors[start:start + BLOCK_SIZE] @ vectors.T
+        for offset, row_similarities in enumerate(similarities):
+            keep = start + offset
+            if grouped[keep]:
+                continue
+            duplicates = np.nonzero(row_similarities >= threshold)[0]
+            duplicates = duplicates[(duplicates > keep) & ~grouped[duplicates]]
+            if not len(duplicates):
+                continue
+            grouped[duplicates] = True
+            groups.append({
+                "size": len(duplicates) + 1,
+                "keep": {"id": rows[keep].id, "name": rows[keep].name, "category": rows[keep].category},
+                "duplicates": [
+                    {"id": rows[index].id, "name": rows[index].name, "category": rows[index].category,
+                     "similarity": float(row_similarities[index])}
+                    for index in duplicates
+                ]
+            })
+    groups.sort(key=lambda group: -group["size"])
+
+    return {
+        "test_cases": len(rows),
+        "group_count": len(groups),
+        "redundant_cases": sum(group["size"] - 1 for group in groups),
+        "groups": groups[:limit] if limit else groups,
+        "threshold": threshold,
+        "embedding_model": EMBEDDING_MODEL
+    }
+
+
+def similar_test_cases(db: Session, test_case_id: int, limit: int = 10,
+                       min_similarity: float = 0.0) -> Optional[List[Dict[str, Any]]]:
+    """The active test cases with the prompts most similar to a test case's, or None when it does not exist"""
+    prompt = db.execute(select(TestCase.input_prompt).where(TestCase.id == test_case_id)).scalar()
+    if prompt is None:
+        return None
+    rows, vectors = _prompt_vectors(db)
+    target = get_embeddings(db, [content_hash(prompt)], texts={content_hash(prompt): prompt})[0]
+    similarities = vectors @ target
+    similar = []
+    for index in np.argsort(-similarities, kind="stable"):
+        if len(similar) >= limit or similarities[index] < min_similarity:
+            break
+        if rows[index].id != test_case_id:
+            similar.append({"id": rows[index].id, "name": rows[index].name, "category": rows[index].category,
+                            "similarity": float(similarities[index])})
+    return similar
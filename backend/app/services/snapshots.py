@@ -0,0 +1,98 @@
+from typing import List, Dict, Any, Optional
+from app.models.test_case_snapshot import TestCaseSnapshot
+from app.models.test_result import TestResult
+from app.services.content_blobs import resolve_texts, text_column
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+import hashlib
+
+# Judgement columns copied when an unchanged result is carried forward
+CARRIED_COLUMNS = [
+    TestResult.id,
+    TestResult.test_case_id,
+    text_column("input_prompt"),
+    text_column("actual_output"),
+    text_column("expected_behavior"),
+    TestResult.severity_score,
+    TestResult.severity_label,
+    TestResult.change_type,
+    TestResult.reasoning,
+    TestResult.is_regression,
+    TestResult.diff_hash,
+    TestResult.carried_from_result_id
+]
+
+
+def input_fingerprint(input_prompt: str, expected_behavior: str, llm_model: str,
+                      model_version: Optional[str] = None) -> str:
+    """Hash of everything a result depends on; model_version covers prompt templates or code under test"""
+    content = "\x1f".join([input_prompt or "", expected_behavior or "", llm_model or "", model_version or ""])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class SnapshotStore:
+    """
+    Latest executed result per test case for one git branch and model.
+
+    An incremental run compares each case's fingerprint with its snapshot and
+    reuses the snapshot's result when nothing it depends on has changed.
+    """
+
+    def __init__(self, db: Session, git_branch: Optional[str], llm_model: str):
+        self.db = db
+        self.git_branch = git_branch or ""
+        self.llm_model = llm_model
+        self.snapshots: Dict[int, Dict[str, Any]] = {}
+
+    def load(self, test_case_ids: List[int], chunk_size: int = 1000):
+        for start in range(0, len(test_case_ids), chunk_size):
+            query = self.db.query(
+                TestCaseSnapshot.id, TestCaseSnapshot.test_case_id, TestCaseSnapshot.input_hash,
+                TestCaseSnapshot.result_id
+            ).filter(
+                TestCaseSnapshot.test_case_id.in_(test_case_ids[start:start + chunk_size]),
+                TestCaseSnapshot.git_branch == self.git_branch,
+                TestCaseSnapshot.llm_model == self.llm_model
+            )
+            for row in query:
+                self.snapshots[row.test_case_id] = dict(row._mapping)
+
+    def unchanged_result_id(self, test_case_id: int, input_hash: str) -> Optional[int]:
+        snapshot = self.snapshots.get(test_case_id)
+        if snapshot and snapshot["input_hash"] == input_hash:
+            return snapshot["result_id"]
+        return None
+
+    def load_results(self, result_ids: List[int], chunk_size: int = 1000) -> Dict[int, Dict[str, Any]]:
+        """Previous results to carry forward, keyed by test case id"""
+        results = {}
+        for start in range(0, len(result_ids), chunk_size):
+            query = self.db.query(*CARRIED_COLUMNS).filter(TestResult.id.in_(result_ids[start:start + chunk_size]))
+            for row in resolve_texts(self.db, [dict(row._mapping) for row in query]):
+                results[row["test_case_id"]] = row
+        return results
+
+    def save(self, rows: List[Dict[str, Any]]):
+        """Point snapshots at newly executed results; rows need their inserted ids"""
+        inserts, updates = {}, {}
+        for row in rows:
+            if row.get("carried_from_result_id") or row.get("id") is None:
+                continue
+            values = {"input_hash": row["input_hash"], "result_id": row["id"], "test_run_id": row["test_run_id"]}
+            snapshot = self.snapshots.get(row["test_case_id"])
+            if snapshot is not None and snapshot.get("id") is not None:
+                updates[snapshot["id"]] = dict(values, id=snapshot["id"])
+            else:
+                inserts[row["test_case_id"]] = dict(
+                    values, test_case_id=row["test_case_id"], git_branch=self.git_branch, llm_model=self.llm_model
+                )
+            self.snapshots[row["test_case_id"]] = dict(values, id=snapshot.get("id") if snapshot else None)
+
+        if updates:
+            self.db.execute(update(TestCaseSnapshot), list(updates.values()))
+        if inserts:
+            for row in self.db.execute(
+                insert(TestCaseSnapshot).returning(TestCaseSnapshot.id, TestCaseSnapshot.test_case_id),
+                list(inserts.values())
+            ):
+                self.snapshots[row.test_case_id]["id"] = row.id
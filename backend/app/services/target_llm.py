@@ -0,0 +1,205 @@
+from typing import Dict, Any, Callable, Optional
+from app.core.config import (
+    TARGET_LLM_PROVIDER, TARGET_LLM_MODEL, TARGET_LLM_BASE_URL, TARGET_LLM_API_KEY, TARGET_LLM_TIMEOUT_SECONDS,
+    TARGET_LLM_STREAM, TARGET_LLM_MAX_TOKENS, TARGET_LLM_TEMPERATURE, TARGET_LLM_CALLABLE, TARGET_LLM_REPLAY_PATH
+)
+from app.models.test_result import TestResult
+from app.services.content_blobs import resolve_texts, text_column
+from app.services.llm_clients import get_openai_client, get_rate_limiter, call_with_retries
+from sqlalchemy.orm import Session
+import importlib
+import json
+import time
+
+PROVIDERS = ["mock", "openai", "callable", "replay"]
+
+
+class TargetLLM:
+    """
+    The model under test. Adapters take a prompt and return the model's full
+    output; they are called from executor threads, so they must be thread-safe.
+    """
+    provider = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+
+class MockTargetLLM(TargetLLM):
+    """Canned answers for a few demo prompts"""
+    provider = "mock"
+
+    RESPONSES = {
+        "What is the capital of France?": "Paris is the capital of France.",
+        "What is 2+2?": "The answer is 4.",
+        "Tell me about quantum computing": "Quantum computing uses quantum bits to process information in ways classical computers cannot."
+    }
+
+    def generate(self, prompt: str) -> str:
+        return self.RESPONSES.get(prompt, "I don't have a response for that question.")
+
+
+class OpenAITargetLLM(TargetLLM):
+    """
+    Any OpenAI-compatible chat completions endpoint, on the shared client pool.
+
+    `timeout` bounds each request as a whole; with stream=True the output is
+    assembled from the streamed deltas and the deadline is checked between them.
+    """
+    provider = "openai"
+
+    def __init__(self, model: str, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 timeout: float = TARGET_LLM_TIMEOUT_SECONDS, stream: bool = False,
+                 max_tokens: Optional[int] = None, temperature: Optional[float] = None):
+        super().__init__(model)
+        self.client = get_openai_client(base_url, api_key)
+        self.rate_limiter = get_rate_limiter(f"target:{base_url or 'openai'}")
+        self.timeout = timeout
+        self.stream = stream
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def generate(self, prompt: str) -> str:
+        return call_with_retries(lambda: self._request(prompt), self.rate_limiter)
+
+    def _request(self, prompt: str) -> str:
+        params: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "timeout": self.timeout
+        }
+        if self.max_tokens:
+            params["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+
+        if not self.stream:
+            response = self.client.chat.completions.create(**params)
+            return response.choices[0].message.content or ""
+
+        deadline = time.monotonic() + self.timeout
+        parts = []
+        stream = self.client.chat.completions.create(stream=True, **params)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Streamed response took longer than {self.timeout}s")
+        finally:
+            stream.response.close()
+        return "".join(parts)
+
+
+class CallableTargetLLM(TargetLLM):
+    """A Python function in this process, e.g. the application's own prompt pipeline"""
+    provider = "callable"
+
+    def __init__(self, function: Callable[[str], str], model: Optional[str] = None):
+        super().__init__(model or getattr(function, "__name__", "callable"))
+        self.function = function
+
+    @classmethod
+    def from_path(cls, path: str, model: Optional[str] = None) -> "CallableTargetLLM":
+        """Load a "package.module:function" reference"""
+        if not path:
+            raise ValueError("The callable target needs TARGET_LLM_CALLABLE set to 'package.module:function'")
+        module_name, _, attribute = path.partition(":")
+        if not attribute:
+            raise ValueError(f"Callable target must look like 'package.module:function', got '{path}'")
+        return cls(getattr(importlib.import_module(module_name), attribute), model or path)
+
+    def generate(self, prompt: str) -> str:
+        return self.function(prompt)
+
+
+class ReplayTargetLLM(TargetLLM):
+    """
+    Recorded outputs, looked up by prompt: from a JSONL file of
+    {"prompt": ..., "output": ...} lines or from an earlier test run's results.
+    Prompts without a recording raise KeyError.
+    """
+    provider = "replay"
+
+    def __init__(self, responses: Dict[str, str], model: str = "replay"):
+        super().__init__(model)
+        self.responses = responses
+
+    @classmethod
+    def from_file(cls, path: str) -> "ReplayTargetLLM":
+        responses = {}
+        with open(path) as recording:
+            for line in recording:
+                if line.strip():
+                    entry = json.loads(line)
+                    responses[entry["prompt"]] = entry["output"]
+        return cls(responses, model=f"replay:{path}")
+
+    @classmethod
+    def from_test_run(cls, db: Session, test_run_id: int) -> "ReplayTargetLLM":
+        rows = resolve_texts(db, [dict(row._mapping) for row in db.query(
+            text_column("input_prompt"), text_column("actual_output")
+        ).filter(TestResult.test_run_id == test_run_id)])
+        return cls({row["input_prompt"]: row["actual_output"] or "" for row in rows}, model=f"replay:run-{test_run_id}")
+
+    def generate(self, prompt: str) -> str:
+        if prompt not in self.responses:
+            raise KeyError(f"No recorded response for prompt: {prompt[:80]}")
+        return self.responses[prompt]
+
+
+def build_target_llm(db: Session, target: Optional[Dict[str, Any]] = None) -> TargetLLM:
+    """
+    Build the adapter for a run from its JSON-serializable `target` options,
+    falling back to the TARGET_LLM_* settings
+    """
+    target = target or {}
+    provider = target.get("provider") or TARGET_LLM_PROVIDER
+    model = target.get("model") or TARGET_LLM_MODEL
+
+    if provider == "mock":
+        return MockTargetLLM(model)
+    if provider == "openai":
+        return OpenAITargetLLM(
+            model,
+            base_url=target.get("base_url") or TARGET_LLM_BASE_URL,
+            api_key=TARGET_LLM_API_KEY,
+            timeout=target.get("timeout") or TARGET_LLM_TIMEOUT_SECONDS,
+            stream=target.get("stream", TARGET_LLM_STREAM),
+            max_tokens=target.get("max_tokens") or TARGET_LLM_MAX_TOKENS,
+            temperature=target.get("temperature", TARGET_LLM_TEMPERATURE)
+        )
+    if provider == "callable":
+        return CallableTargetLLM.from_path(target.get("callable") or TARGET_LLM_CALLABLE, target.get("model"))
+    if provider == "replay":
+        if target.get("replay_run_id"):
+            return ReplayTargetLLM.from_test_run(db, target["replay_run_id"])
+        path = target.get("replay_path") or TARGET_LLM_REPLAY_PATH
+        if not path:
+            raise ValueError("The replay target needs replay_run_id or TARGET_LLM_REPLAY_PATH")
+        return ReplayTargetLLM.from_file(path)
+    raise ValueError(f"Unknown target LLM provider '{provider}', expected one of {PROVIDERS}")
+
+
+def check_target(db: Session, target: Optional[Dict[str, Any]] = None):
+    """
+    Raise ValueError when a run's `target` options cannot build an adapter, so the
+    run is refused up front instead of failing, or failing every case, once started
+    """
+    target = target or {}
+    provider = target.get("provider") or TARGET_LLM_PROVIDER
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown target LLM provider '{provider}', expected one of {PROVIDERS}")
+    if provider == "callable":
+        path = target.get("callable") or TARGET_LLM_CALLABLE
+        if not path or not path.partition(":")[2]:
+            raise ValueError("The callable target needs TARGET_LLM_CALLABLE set to 'package.module:function'")
+    if provider == "replay":
+        if target.get("replay_run_id"):
+            if db.query(TestResult.id).filter(TestResult.test_run_id == target["replay_run_id"]).first() is None:
+                raise ValueError(f"Test run {target['replay_run_id']} has no results to replay")
+        elif not (target.get("replay_path") or TARGET_LLM_REPLAY_PATH):
+            raise ValueError("The replay target needs replay_run_id or TARGET_LLM_REPLAY_PATH")
@@ -0,0 +1,100 @@
+from typing import List, Dict, Any, Optional
+from app.models.test_case import TestCase
+from sqlalchemy import Select, cast, exists, func, select
+from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.orm import Session
+import random
+
+# Keys of a run's selection, as accepted by select_test_case_ids and stored on TestRun.selection
+SELECTOR_KEYS = ["categories", "tags", "name_glob", "shard_index", "shard_count", "sample_size", "seed"]
+
+
+def parse_list(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def glob_to_like(pattern: str) -> str:
+    """A name glob (* and ?) as a LIKE pattern escaped with backslash"""
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+def validate_selection(selection: Dict[str, Any]):
+    """Raise ValueError for selectors that cannot be applied"""
+    shard_index, shard_count = selection.get("shard_index"), selection.get("shard_count")
+    if (shard_index is None) != (shard_count is None):
+        raise ValueError("shard_index and shard_count must be given together")
+    if shard_count is not None and not (shard_count >= 1 and 0 <= shard_index < shard_count):
+        raise ValueError("shard_index must be between 0 and shard_count - 1")
+    if selection.get("sample_size") is not None and selection["sample_size"] < 1:
+        raise ValueError("sample_size must be at least 1")
+
+
+def _tag_filter(dialect: str, tags: List[str]):
+    """Test cases whose metadata "tags" list has any of `tags`"""
+    if dialect == "postgresql":
+        # Served by the GIN index on (metadata::jsonb -> 'tags'), see migration 010
+        return cast(TestCase.metadata_, JSONB)["tags"].has_any(array(tags))
+    entries = func.json_each(TestCase.metadata_, "$.tags").table_valued("value")
+    return exists(select(1).select_from(entries).where(entries.c.value.in_(tags)))
+
+
+def selection_query(dialect: str, selection: Dict[str, Any]) -> Select:
+    """
+    Ids and categories of the active test cases matching every given selector, in
+    id order: categories (any of), tags (any of), a name glob and shard k of n by
+    id modulo, so parallel CI jobs get disjoint shards that together cover the suite
+    """
+    query = select(TestCase.id, TestCase.category).where(TestCase.is_active == True)
+    if selection.get("categories"):
+        query = query.where(TestCase.category.in_(selection["categories"]))
+    if selection.get("tags"):
+        query = query.where(_tag_filter(dialect, selection["tags"]))
+    if selection.get("name_glob"):
+        query = query.where(TestCase.name.like(glob_to_like(selection["name_glob"]), escape="\\"))
+    if selection.get("shard_count"):
+        query = query.where(TestCase.id % selection["shard_count"] == selection["shard_index"])
+    return query.order_by(TestCase.id)
+
+
+def stratified_sample(rows: List[Any], sample_size: int, seed: Optional[int] = None) -> List[int]:
+    """
+    `sample_size` ids drawn at random within each category, in proportion to its
+    size and with at least one per category while the sample allows. The same
+    seed picks the same cases.
+    """
+    if sample_size >= len(rows):
+        return [row.id for row in rows]
+    strata: Dict[Optional[str], List[int]] = {}
+    for row in rows:
+        strata.setdefault(row.category, []).append(row.id)
+
+    # Largest remainders, so the quotas add up to exactly sample_size
+    shares = {category: sample_size * len(ids) / len(rows) for category, ids in strata.items()}
+    quotas = {category: int(share) for category, share in shares.items()}
+    if sample_size >= len(strata):
+        quotas = {category: max(1, quota) for category, quota in quotas.items()}
+    for category in sorted(strata, key=lambda category: quotas[category] - shares[category]):
+        if sum(quotas.values()) >= sample_size:
+            break
+        quotas[category] += 1
+    while sum(quotas.values()) > sample_size:
+        largest = max(quotas, key=lambda category: quotas[category])
+        quotas[largest] -= 1
+
+    generator = random.Random(seed)
+    sample = []
+    for category in sorted(strata, key=str):
+        sample.extend(generator.sample(strata[category], min(quotas[category], len(strata[category]))))
+    return sorted(sample)
+
+
+def select_test_case_ids(db: Session, selection: Optional[Dict[str, Any]] = None) -> List[int]:
+    """Ids of the active test cases a run with `selection` executes; no selection means all of them"""
+    selection = selection or {}
+    validate_selection(selection)
+    rows = db.execute(selection_query(db.get_bind().dialect.name, selection)).all()
+    if selection.get("sample_size"):
+        return stratified_sample(rows, selection["sample_size"], selection.get("seed"))
+    return [row.id for row in rows]
+
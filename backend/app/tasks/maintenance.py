@@ -0,0 +1,27 @@
+from typing import Dict, Any
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal
+from app.services.result_history import ensure_upcoming_partitions, maintain_result_history
+from celery.signals import worker_ready
+
+
+@celery_app.task(name="canary.maintain_result_history")
+def maintain_result_history_task() -> Dict[str, Any]:
+    """
+    Create upcoming test_results partitions and archive/drop expired ones
+    """
+    db = SessionLocal()
+    try:
+        return maintain_result_history(db)
+    finally:
+        db.close()
+
+
+@worker_ready.connect
+def create_result_partitions(**kwargs):
+    """Create upcoming partitions when a worker starts, in case no beat runs the task above"""
+    db = SessionLocal()
+    try:
+        ensure_upcoming_partitions(db)
+    finally:
+        db.close()
@@ -0,0 +1,41 @@
+from typing import List, Dict, Any, Optional
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal
+from app.services.run_dispatcher import execute_test_cases, complete_test_run, fail_test_run
+
+
+@celery_app.task(name="canary.execute_test_run_shard")
+def execute_test_run_shard(test_run_id: int, test_case_ids: List[int],
+                           options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Execute one shard of a test run in this worker and return its summary
+    """
+    db = SessionLocal()
+    try:
+        return execute_test_cases(db, test_run_id, test_case_ids, options)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="canary.finalize_test_run")
+def finalize_test_run(shard_summaries: List[Dict[str, Any]], test_run_id: int) -> Dict[str, Any]:
+    """
+    Combine the shard summaries into the test run once every shard has finished
+    """
+    db = SessionLocal()
+    try:
+        return complete_test_run(db, test_run_id, shard_summaries)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="canary.fail_test_run")
+def mark_test_run_failed(*args, test_run_id: int):
+    """
+    Error callback for a failed shard
+    """
+    db = SessionLocal()
+    try:
+        fail_test_run(db, test_run_id)
+    finally:
+        db.close()
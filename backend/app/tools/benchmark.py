@@ -0,0 +1,393 @@
+"""
+End-to-end benchmark for test run throughput, the judge cache and the results API.
+
+    python -m app.tools.benchmark --cases 10000 --runs 2 --output report.json
+    python -m app.tools.benchmark --cases 10000 --runs 2 --compare report.json
+
+Generates a synthetic golden set, then executes it `--runs` times against
+in-process stand-ins for the target model and the judge with seeded, injected
+latency. Later runs change `--change-rate` of the outputs, exercising the
+pre-judge filter and the judge cache. Reports cases/sec, p50/p99 per stage
+(target model, judge, result INSERTs), the DB write rate and results-API latency
+as JSON. With --compare, exits non-zero when throughput or a p99 is worse than
+the baseline report by more than --max-regression.
+
+Runs against --database-url, by default BENCHMARK_DATABASE_URL, or else a
+temporary SQLite database. On SQLite the batched result INSERT ... RETURNING
+runs one row at a time, so its DB write figures say little about PostgreSQL.
+The real judge cache runs on an in-memory Redis stand-in unless --use-redis is set.
+"""
+from typing import Dict, Any, List, Optional
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+
+class StageTimer:
+    """Thread-safe latency samples per stage"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        import numpy as np
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "mean_ms": float(np.mean(values)) * 1000,
+                "p50_ms": float(np.percentile(values, 50)) * 1000,
+                "p99_ms": float(np.percentile(values, 99)) * 1000,
+                "total_s": float(np.sum(values))
+            }
+            for stage, values in samples.items() if values
+        }
+
+
+class _MemoryRedis:
+    """Just enough of redis-py for the judge cache"""
+
+    def __init__(self):
+        self.values = {}
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+
+def _latency(rng: random.Random, latency_ms: float, jitter_ms: float) -> float:
+    return max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+
+
+def make_stub_target(timer: StageTimer, latency_ms: float, jitter_ms: float, seed: int):
+    from app.services.target_llm import TargetLLM
+
+    class StubTargetLLM(TargetLLM):
+        provider = "benchmark"
+
+        def __init__(self):
+            super().__init__("benchmark-target")
+            self.generation = 0  # Outputs of changed cases differ per generation
+            self.change_rate = 0.0
+            self._rng = random.Random(seed)
+            self._lock = threading.Lock()
+
+        def generate(self, prompt: str) -> str:
+            with self._lock:
+                delay = _latency(self._rng, latency_ms, jitter_ms)
+            started = time.perf_counter()
+            time.sleep(delay)
+            changed = self.change_rate and random.Random(f"{seed}:{prompt}").random() < self.change_rate
+            output = f"Answer to {prompt}" + (f" (revision {self.generation})" if changed else "")
+            timer.record("target_llm", time.perf_counter() - started)
+            return output
+
+    return StubTargetLLM()
+
+
+def make_stub_judge_client(timer: StageTimer, latency_ms: float, jitter_ms: float, seed: int):
+    rng = random.Random(seed + 1)
+    lock = threading.Lock()
+    verdict = {"severity_score": 0.1, "severity_label": "low", "change_type": "style_change",
+               "reasoning": "Benchmark verdict", "is_regression": False}
+
+    def create(**params):
+        with lock:
+            delay = _latency(rng, latency_ms, jitter_ms)
+        started = time.perf_counter()
+        time.sleep(delay)
+        content = params["messages"][-1]["content"]
+        if "CASES:" in content:
+            cases = json.loads(content.split("CASES:", 1)[1])
+            body = {"results": [dict(verdict, id=case["id"]) for case in cases]}
+        else:
+            body = verdict
+        timer.record("judge", time.perf_counter() - started)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=json.dumps(body)))],
+            usage=types.SimpleNamespace(total_tokens=len(content) // 4 + 50)
+        )
+
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+
+def track_result_inserts(engine, timer: StageTimer) -> Dict[str, int]:
+    """Time every INSERT into test_results and count the statements"""
+    from sqlalchemy import event
+    counters = {"statements": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["benchmark_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO TEST_RESULTS"):
+            timer.record("db_insert", time.perf_counter() - conn.info.pop("benchmark_started", time.perf_counter()))
+            counters["statements"] += 1
+
+    return counters
+
+
+def seed_test_cases(db, count: int, tag: str) -> List[int]:
+    """Bulk-insert a synthetic golden set and return its ids"""
+    from app.models.test_case import TestCase
+    from sqlalchemy import insert
+    categories = ["factual", "creative", "safety", "reasoning", "format"]
+    ids = []
+    for start in range(0, count, 1000):
+        rows = [
+            {
+                "name": f"bench-{tag}-{index}",
+                "input_prompt": f"Benchmark question {index}: explain topic {index % 997} in two sentences.",
+                "expected_behavior": f"A concise, correct explanation of topic {index % 997}.",
+                "category": categories[index % len(categories)],
+                "is_active": True
+            }
+            for index in range(start, min(count, start + 1000))
+        ]
+        ids.extend(db.execute(insert(TestCase).returning(TestCase.id, sort_by_parameter_order=True), rows).scalars())
+        db.commit()
+    return ids
+
+
+def measure_api(test_run_id: int, requests: int, page_size: int) -> Dict[str, Any]:
+    """Latency of the results, summary and runs endpoints, including deep result pages"""
+    import numpy as np
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    endpoints = {
+        "results_first_page": f"/api/v1/test-runs/{test_run_id}/results?limit={page_size}",
+        "results_projected": f"/api/v1/test-runs/{test_run_id}/results?limit={page_size}&fields=test_case_id,severity_score",
+        "summary": f"/api/v1/test-runs/{test_run_id}/summary",
+        "runs": "/api/v1/test-runs/?limit=50"
+    }
+    report = {}
+    with TestClient(app) as client:
+        # The last page shows whether deep paging stays as fast as the first
+        cursor, pages = None, 0
+        while True:
+            response = client.get(endpoints["results_projected"] + (f"&cursor={cursor}" if cursor else "")).json()
+            pages += 1
+            if not response["next_cursor"]:
+                break
+            cursor = response["next_cursor"]
+        endpoints["results_last_page"] = endpoints["results_projected"] + (f"&cursor={cursor}" if cursor else "")
+
+        for name, url in endpoints.items():
+            latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+            report[name] = {
+                "requests": requests,
+                "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+                "p99_ms": float(np.percentile(latencies, 99)) * 1000
+            }
+
+        started = time.perf_counter()
+        with client.stream("GET", f"/api/v1/test-runs/{test_run_id}/results?format=ndjson") as response:
+            lines = sum(1 for line in response.iter_lines() if line)
+        elapsed = time.perf_counter() - started
+        report["ndjson_export"] = {"rows": lines, "seconds": elapsed, "rows_per_sec": lines / elapsed if elapsed else 0.0}
+        report["results_pages"] = pages
+    return report
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    import asyncio
+    import app.services.judge_cache as judge_cache
+    from app.core.database import SessionLocal, engine
+    from app.models.base import Base
+    from app.models.test_result import TestResult
+    from app.models.test_run import TestRun
+    from app.services.run_dispatcher import load_test_cases, complete_test_run
+    from app.services.test_executor import TestExecutor
+
+    Base.metadata.create_all(engine)
+    if not args.use_redis:
+        judge_cache._judge_cache = judge_cache.JudgeCache(redis_client=_MemoryRedis())
+
+    timer = StageTimer()
+    inserts = track_result_inserts(engine, timer)
+    target = make_stub_target(timer, args.llm_latency_ms, args.jitter_ms, args.seed)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        test_case_ids = seed_test_cases(db, args.cases, f"{int(time.time())}-{os.getpid()}")
+        seed_seconds = time.perf_counter() - started
+
+        runs = []
+        for run_number in range(args.runs):
+            timer.reset()
+            inserts.update(statements=0)
+            target.generation = run_number
+            target.change_rate = args.change_rate if run_number else 0.0
+
+            test_run = TestRun(name=f"Benchmark run {run_number + 1}", status="running", trigger_source="benchmark",
+                               total_tests=len(test_case_ids))
+            db.add(test_run)
+            db.commit()
+            test_run_id = test_run.id
+
+            executor = TestExecutor()
+            executor.judge_service.client = make_stub_judge_client(
+                timer, args.judge_latency_ms, args.jitter_ms, args.seed + run_number
+            )
+            started = time.perf_counter()
+            test_cases = load_test_cases(db, test_case_ids)
+            result = asyncio.run(executor.execute_test_suite_async(
+                db=db, test_cases=test_cases, test_run_id=test_run_id, llm_client=target,
+                concurrency=args.concurrency, judge_batch_size=args.judge_batch_size, collect_results=False
+            ))
+            wall_seconds = time.perf_counter() - started
+            complete_test_run(db, test_run_id, [result["summary"]])
+
+            stages = timer.report()
+            insert_seconds = stages.get("db_insert", {}).get("total_s", 0.0)
+            rows = db.query(TestResult).filter(TestResult.test_run_id == test_run_id).count()
+            runs.append({
+                "run": run_number + 1,
+                "test_run_id": test_run_id,
+                "cases": len(test_cases),
+                "wall_seconds": wall_seconds,
+                "cases_per_sec": len(test_cases) / wall_seconds if wall_seconds else 0.0,
+                "stages": stages,
+                "db_writes": dict(inserts, rows=rows, rows_per_sec=rows / insert_seconds if insert_seconds else 0.0),
+                "judge_cache": result["summary"]["judge_cache"],
+                "prejudge": result["summary"]["prejudge"]
+            })
+            print(f"Run {run_number + 1}: {len(test_cases)} cases in {wall_seconds:.1f}s "
+                  f"({runs[-1]['cases_per_sec']:.1f} cases/sec)")
+
+        api = measure_api(runs[-1]["test_run_id"], args.api_requests, args.page_size) if args.api_requests else {}
+    finally:
+        db.close()
+
+    return {
+        "benchmark": "canary-e2e",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "seed_seconds": seed_seconds,
+        "runs": runs,
+        "api": api
+    }
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Describe every metric that is worse than the baseline by more than max_regression"""
+    regressions = []
+    databases = (current.get("environment", {}).get("database"), baseline.get("environment", {}).get("database"))
+    if databases[0] != databases[1]:
+        print(f"Warning: comparing a {databases[0]} run with a {databases[1]} baseline")
+
+    def check(name: str, now: Optional[float], before: Optional[float], higher_is_better: bool):
+        if not now or not before:
+            return
+        change = (before - now) / before if higher_is_better else (now - before) / before
+        marker = "REGRESSION" if change > max_regression else "ok"
+        print(f"{marker:>10}  {name}: {before:.2f} -> {now:.2f} ({-change if higher_is_better else change:+.1%})")
+        if change > max_regression:
+            regressions.append(name)
+
+    for run, base_run in zip(current["runs"], baseline["runs"]):
+        prefix = f"run{run['run']}"
+        check(f"{prefix}.cases_per_sec", run["cases_per_sec"], base_run["cases_per_sec"], True)
+        check(f"{prefix}.db_rows_per_sec", run["db_writes"]["rows_per_sec"], base_run["db_writes"]["rows_per_sec"], True)
+        for stage, stats in run["stages"].items():
+            check(f"{prefix}.{stage}.p99_ms", stats["p99_ms"], base_run["stages"].get(stage, {}).get("p99_ms"), False)
+    for endpoint, stats in current.get("api", {}).items():
+        if isinstance(stats, dict) and "p99_ms" in stats:
+            check(f"api.{endpoint}.p99_ms", stats["p99_ms"],
+                  baseline.get("api", {}).get(endpoint, {}).get("p99_ms"), False)
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canary end-to-end benchmark")
+    parser.add_argument("--cases", type=int, default=1000, help="Synthetic test cases to generate")
+    parser.add_argument("--runs", type=int, default=2, help="Runs over the same cases; later ones hit the caches")
+    parser.add_argument("--change-rate", type=float, default=0.1, help="Fraction of outputs that change after run 1")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--judge-batch-size", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--judge-latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--api-requests", type=int, default=50, help="Requests per endpoint, 0 to skip the API")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--database-url", default=os.getenv("BENCHMARK_DATABASE_URL"),
+                        help="Database to benchmark against, e.g. a scratch PostgreSQL database; "
+                             "default BENCHMARK_DATABASE_URL, else a temporary SQLite file")
+    parser.add_argument("--use-redis", action="store_true", help="Use REDIS_URL for the judge cache")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="Allowed relative slowdown with --compare")
+    args = parser.parse_args()
+
+    # The app reads its settings at import time, so point it at the database first
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/canary-benchmark.db"
+    if os.environ["DATABASE_URL"].startswith("sqlite"):
+        print("Warning: benchmarking on SQLite, which inserts results one row at a time; set --database-url "
+              "or BENCHMARK_DATABASE_URL to a PostgreSQL database for DB write figures", file=sys.stderr)
+    os.environ.setdefault("LLM_MAX_IN_FLIGHT", str(args.concurrency))
+    # At least the default of 4, enough judge batches in flight for the concurrency
+    os.environ.setdefault("JUDGE_MAX_IN_FLIGHT", str(max(4, math.ceil(args.concurrency / args.judge_batch_size))))
+
+    report = run_benchmark(args)
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output)
+        print(f"Report written to {args.output}")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare_reports(report, json.load(baseline_file), args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
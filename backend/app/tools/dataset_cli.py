@@ -0,0 +1,76 @@
+"""
+Bulk import and export of golden datasets without going through the API.
+
+    python -m app.tools.dataset_cli import golden.jsonl
+    python -m app.tools.dataset_cli import golden.csv --dry-run
+    python -m app.tools.dataset_cli export-cases cases.parquet --category safety
+    python -m app.tools.dataset_cli export-results history.parquet --since 2026-01-01
+
+The format follows the file extension (.jsonl/.ndjson, .csv or .parquet) unless
+--format is given; Parquet needs the pyarrow package. Imports validate every row
+like POST /api/v1/test-cases/ and upsert by name in batches.
+"""
+from app.core.database import SessionLocal
+from app.services.datasets import (
+    FORMATS, TEST_CASE_COLUMNS, RESULT_COLUMNS, export_to_file, import_test_cases, iter_file_records,
+    iter_result_rows, iter_test_case_rows
+)
+from datetime import datetime
+import argparse
+import json
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canary dataset import and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Upsert test cases by name from a file")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=FORMATS)
+    importer.add_argument("--batch-size", type=int, help="Test cases per commit, default DATASET_IMPORT_BATCH_SIZE")
+    importer.add_argument("--dry-run", action="store_true", help="Only validate")
+
+    cases = commands.add_parser("export-cases", help="Write test cases to a file")
+    cases.add_argument("path")
+    cases.add_argument("--format", choices=FORMATS)
+    cases.add_argument("--category")
+    cases.add_argument("--active-only", action="store_true")
+
+    results = commands.add_parser("export-results", help="Write result history, with prompts and outputs, to a file")
+    results.add_argument("path")
+    results.add_argument("--format", choices=FORMATS)
+    results.add_argument("--test-run-id", type=int)
+    results.add_argument("--test-case-id", type=int)
+    results.add_argument("--since", type=datetime.fromisoformat, help="ISO date or datetime")
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            options = {"batch_size": args.batch_size} if args.batch_size else {}
+            report = import_test_cases(db, iter_file_records(args.path, args.format), dry_run=args.dry_run, **options)
+        elif args.command == "export-cases":
+            export_to_file(iter_test_case_rows(db, args.category, args.active_only), TEST_CASE_COLUMNS, args.path,
+                           args.format)
+            report = {"path": args.path}
+        else:
+            export_to_file(iter_result_rows(db, args.test_run_id, args.test_case_id, args.since), RESULT_COLUMNS,
+                           args.path, args.format)
+            report = {"path": args.path}
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        db.close()
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(report, indent=2))
+    if report.get("invalid"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local OpenAI-compatible stand-in for the target model and the judge, for
+benchmarking the executor offline.
+
+    python -m app.tools.mock_llm_server --port 8100 --latency-ms 300 --jitter-ms 100 --error-rate 0.01
+
+Point TARGET_LLM_BASE_URL and/or JUDGE_BASE_URL at http://localhost:8100/v1.
+Requests asking for a JSON object get a valid judge verdict (or one per case for
+batched judge requests); anything else gets a deterministic answer, streamed
+when requested.
+"""
+from typing import Dict, Any, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+
+
+def create_app(latency_ms: float = 200.0, jitter_ms: float = 50.0, error_rate: float = 0.0,
+               rate_limit_rate: float = 0.0, max_rps: float = 0.0, tokens_per_second: float = 0.0,
+               responses: Optional[Dict[str, str]] = None, seed: Optional[int] = None) -> FastAPI:
+    """
+    `error_rate` and `rate_limit_rate` are the fractions of requests answered
+    with a 500 or a 429; `max_rps` additionally rejects requests above that rate
+    with 429s, like a provider's rate limit. `tokens_per_second` paces streamed
+    responses. `responses` maps prompts to fixed answers.
+    """
+    app = FastAPI(title="Canary mock LLM")
+    rng = random.Random(seed)
+    counters = {"requests": 0, "errors": 0, "rate_limited": 0, "streamed": 0}
+    window: List[float] = []
+
+    def rate_limited() -> bool:
+        if rng.random() < rate_limit_rate:
+            return True
+        if max_rps:
+            now = time.monotonic()
+            while window and now - window[0] >= 1.0:
+                window.pop(0)
+            if len(window) >= max_rps:
+                return True
+            window.append(now)
+        return False
+
+    def answer(body: Dict[str, Any]) -> str:
+        prompt = body["messages"][-1]["content"]
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps(_judge_verdicts(prompt))
+        if responses and prompt in responses:
+            return responses[prompt]
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f"Mock answer {digest} to: {prompt}"
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "canary"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+
+        if rate_limited():
+            counters["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429, headers={"retry-after": "1"}
+            )
+        await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+        if rng.random() < error_rate:
+            counters["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}},
+                                status_code=500)
+
+        content = answer(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock")
+        prompt_tokens = sum(len(message.get("content") or "") for message in body["messages"]) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4 + 1,
+                 "total_tokens": prompt_tokens + len(content) // 4 + 1}
+
+        if body.get("stream"):
+            counters["streamed"] += 1
+            return StreamingResponse(
+                _stream_chunks(completion_id, model, content, tokens_per_second), media_type="text/event-stream"
+            )
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+
+    return app
+
+
+def _judge_verdicts(prompt: str) -> Dict[str, Any]:
+    verdict = {
+        "severity_score": 0.1,
+        "severity_label": "low",
+        "change_type": "style_change",
+        "reasoning": "Mock judge verdict",
+        "is_regression": False
+    }
+    if "CASES:" not in prompt:
+        return verdict
+    try:
+        cases = json.loads(prompt.split("CASES:", 1)[1])
+    except ValueError:
+        return {"results": []}
+    return {"results": [dict(verdict, id=case["id"]) for case in cases]}
+
+
+async def _stream_chunks(completion_id: str, model: str, content: str, tokens_per_second: float):
+    words = content.split(" ")
+    for index, word in enumerate(words):
+        delta = word if index == len(words) - 1 else word + " "
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        if tokens_per_second:
+            await asyncio.sleep(1 / tokens_per_second)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def _load_responses(path: Optional[str]) -> Optional[Dict[str, str]]:
+    if not path:
+        return None
+    with open(path) as recording:
+        return {entry["prompt"]: entry["output"] for entry in map(json.loads, filter(str.strip, recording))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Latency varies uniformly by up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with 429")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Reject requests above this rate with 429")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Pace of streamed responses")
+    parser.add_argument("--responses", help="JSONL of {\"prompt\", \"output\"} answers to return")
+    parser.add_argument("--seed", type=int, help="Seed for latency and error injection")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, max_rps=args.max_rps, tokens_per_second=args.tokens_per_second,
+        responses=_load_responses(args.responses), seed=args.seed
+    ), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ const TestRunDetail = () => {
   const { id } = useParams()
   const [testRun, setTestRun] = useState(null)
   const [results, setResults] = useState([])
+  const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(true)
   const [severityFilter, setSeverityFilter] = useState('all')
 
@@ -26,9 +27,20 @@ const TestRunDetail = () => {
 
   const fetchTestRunDetails = async () => {
     try {
-      const response = await axios.get(`/api/v1/test-runs/${id}/results`)
+      // Results come in pages; the summary covers the whole run and is on the first page only
+      let response = await axios.get(`/api/v1/test-runs/${id}/results`)
       setTestRun(response.data.test_run)
-      setResults(response.data.results || [])
+      setSummary(response.data.summary || null)
+      let allResults = response.data.results || []
+      setResults(allResults)
+      setLoading(false)
+      while (response.data.next_cursor != null) {
+        response = await axios.get(`/api/v1/test-runs/${id}/results`, {
+          params: { cursor: response.data.next_cursor }
+        })
+        allResults = allResults.concat(response.data.results || [])
+        setResults(allResults)
+      }
     } catch (error) {
       console.error('Error fetching test run details:', error)
     } finally {
@@ -80,7 +92,7 @@ const TestRunDetail = () => {
     severityFilter === 'all' || result.severity_label === severityFilter
   )
 
-  const severityCounts = results.reduce((acc, result) => {
+  const severityCounts = summary?.total_results ? summary.severity_counts : results.reduce((acc, result) => {
     const severity = result.severity_label || 'unknown'
     acc[severity] = (acc[severity] || 0) + 1
     return acc